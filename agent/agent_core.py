@@ -0,0 +1,802 @@
+import pandas as pd
+import json
+import os
+from typing import Tuple, Dict, Any, List
+import streamlit as st # Import Streamlit to access the global session_state
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import plotly.graph_objects as go
+import plotly.express as px
+
+from openai import OpenAI
+from langchain_core.utils.function_calling import convert_to_openai_function
+from config.settings import OPENAI_API_KEY, ARCHETYPES_PATH, SYNONYM_LIBRARY_PATH, NLU_MAPPINGS_PATH, TREND_ROLLING_WINDOW
+from config.settings import CONTEXT_HISTORY_TOKEN_BUDGET, INTENT_CONTEXT_TOKEN_BUDGET, AGENT_PIPELINE_WORKERS, NOTE_PREWARM_TOP_N
+from config.settings import DEFAULT_NORMALIZATION, LARGE_SEARCH_TOP_K
+from agent.context_manager import trim_to_budget
+from insights.insight_engine import InsightEngine
+from agent.similarity_index import SimilarityIndex
+from agent.scoring_tables import score_rows, get_normalizer, get_fit_score_table, NORMALIZATION_MODES
+from agent.parallel_scoring import should_parallelize
+from insights.percentile_cube import get_percentile_cube
+from utils.snapshot_store import get_snapshot_store, is_trend_column
+from utils.player_index import get_player_index, resolve_player
+from utils.derived_features import get_position_rows, describe_derived_features
+
+from utils.logbook_handler import get_all_logbook_schemas, get_logbook_schema, apply_logbook_schema
+from utils.dataset_store import get_dataset_artifact
+
+
+def _load_data() -> Tuple[dict, dict, dict]:
+    """
+    Loads all foundational knowledge assets (Archetypes, Synonyms, NLU Mappings) from disk at startup.
+    """
+    try:
+        with open(ARCHETYPES_PATH, 'r') as f:
+            archetypes = json.load(f)
+
+        with open(SYNONYM_LIBRARY_PATH, 'r') as f:
+            synonym_library = json.load(f)
+        
+        with open(NLU_MAPPINGS_PATH, 'r') as f:
+            nlu_mappings = json.load(f)
+
+        return archetypes, synonym_library, nlu_mappings
+    except FileNotFoundError as e:
+        raise RuntimeError(f"A required data file was not found. This is a fatal error. Please check your setup. Details: {e}")
+    except json.JSONDecodeError as e:
+        raise RuntimeError(f"A JSON knowledge file is corrupted. Please validate the file. Details: {e}")
+    except Exception as e:
+        raise RuntimeError(f"An unexpected error occurred while loading foundational knowledge files: {e}")
+
+ARCHETYPES, SYNONYM_LIBRARY, NLU_MAPPINGS = _load_data()
+
+ARCHETYPE_TO_POSITION_CATEGORY = {
+    "Ball-Playing Defender": "Defender", "Stopper": "Defender", "Overlapping Full-Back": "Defender", "Inverted Full-Back": "Defender",
+    "Anchor Man / Defensive Midfielder": "Midfielder", "Regista / Deep-Lying Playmaker": "Midfielder", "Box-to-Box Midfielder": "Midfielder",
+    "Mezzala / Attacking 8": "Midfielder", "Advanced Playmaker / Number 10": "Midfielder",
+    "Winger": "Forward", "Inside Forward": "Forward", "Pressing Forward": "Forward", "Target Man": "Forward",
+    "Poacher / Goal Hanger": "Forward", "False Nine": "Forward",
+    "Sweeper Keeper": "Goalkeeper", "Shot Stopper": "Goalkeeper"
+}
+
+POSITION_GROUPINGS = {
+    'Forward': ['Striker', 'Attacking Midfielder', 'Winger', 'Pressing Forward'],
+    'Midfielder': ['Attacking Midfielder', 'Defensive Midfielder', 'Center Midfielder'],
+    'Defender': ['Center Back', 'Full Back'],
+    'Goalkeeper': ['Goalkeeper']
+}
+
+
+def _fit_score_column_name(archetype_name: str) -> str:
+    """Returns the column name used for an archetype's fit score, e.g. 'fit_score_pressing_forward'."""
+    return f"fit_score_{archetype_name.lower().replace(' ', '_').replace('/', '_')}"
+
+def _normalization_for(archetype_name: str, normalization: str = None) -> str:
+    """
+    Returns the normalization mode of a fit score: the query's choice, else the archetype's
+    'normalization' in archetypes.json, else DEFAULT_NORMALIZATION.
+
+    Raises:
+        ValueError: If the chosen mode is not one of NORMALIZATION_MODES.
+    """
+    mode = normalization or ARCHETYPES.get(archetype_name, {}).get('normalization') or DEFAULT_NORMALIZATION
+    if mode not in NORMALIZATION_MODES:
+        raise ValueError(f"Unknown normalization '{mode}'. Valid modes are: {list(NORMALIZATION_MODES)}")
+    return mode
+
+def _calculate_fit_score(df: pd.DataFrame, normalization_context_df: pd.DataFrame, archetype_name: str, normalization: str = None) -> pd.Series:
+    """Calculates a fit score for a given archetype and returns it as a Series."""
+    if archetype_name not in ARCHETYPES:
+        return None
+    
+    recipe = ARCHETYPES[archetype_name]['key_metrics']
+    normalization = _normalization_for(archetype_name, normalization)
+    if should_parallelize(len(df)) and df.index.isin(normalization_context_df.index).all():
+        # Rows of a very large dataset: its scores are computed once, in parallel, and looked up.
+        return get_fit_score_table(normalization_context_df, archetype_name, recipe, normalization).scores.reindex(df.index)
+    # Min/max bounds and ECDF tables of the context dataset are computed once per dataset, not per query.
+    return score_rows(df, recipe, get_normalizer(normalization_context_df, normalization))
+
+def _internal_create_plot(df: pd.DataFrame, full_df: pd.DataFrame, x_axis: str, y_axis: str, title: str) -> go.Figure:
+    """Creates a Plotly scatter plot with globally scaled axes."""
+    for col in [x_axis, y_axis]:
+        if col not in df.columns:
+            raise ValueError(f"Error: Column '{col}' not found in the data for plotting. Current columns are: {df.columns.to_list()}")
+
+    x_min_global = full_df[x_axis].min()
+    x_max_global = full_df[x_axis].max()
+    x_range_buffer = (x_max_global - x_min_global) * 0.05
+    x_range = [x_min_global - x_range_buffer, x_max_global + x_range_buffer]
+
+    y_min_global = full_df[y_axis].min()
+    y_max_global = full_df[y_axis].max()
+    y_range_buffer = (y_max_global - y_min_global) * 0.05
+    y_range = [y_min_global - y_range_buffer, y_max_global + y_range_buffer]
+
+    fig = px.scatter(
+        df, x=x_axis, y=y_axis, title=title,
+        hover_data=['full_name', 'age', 'primary_position'] + [c for c in df.columns if 'fit_score' in c],
+        labels={x_axis: x_axis.replace('_', ' ').title(), y_axis: y_axis.replace('_', ' ').title()},
+        template="plotly_white"
+    )
+    fig.update_layout(
+        title_font_size=22,
+        xaxis_title_font_size=16,
+        yaxis_title_font_size=16,
+        xaxis=dict(range=x_range),
+        yaxis=dict(range=y_range)
+    )
+    fig.update_traces(marker=dict(size=12, opacity=0.8, line=dict(width=1, color='DarkSlateGrey')))
+    return fig
+
+def _execute_search_and_filter(
+    df: pd.DataFrame,
+    normalization_context_df: pd.DataFrame,
+    filters: List[Dict[str, Any]] = None,
+    sort_by: str = None,
+    sort_ascending: bool = True,
+    add_archetype_as_column: str = None,
+    normalization: str = None,
+    snapshot_series: str = None
+) -> pd.DataFrame:
+    """Internal logic to perform filtering and sorting on a given DataFrame. Trend columns come from the snapshots of `snapshot_series`."""
+    # A shallow, copy-on-write view: new columns stay local to this result and the
+    # (possibly shared) input frame is never written to or duplicated up front.
+    working_df = df.copy(deep=False)
+
+    if add_archetype_as_column and add_archetype_as_column in ARCHETYPES:
+        fit_score_col_name = _fit_score_column_name(add_archetype_as_column)
+        working_df[fit_score_col_name] = _calculate_fit_score(working_df, normalization_context_df, add_archetype_as_column, normalization)
+        print(f"DIAGNOSTIC: Added new fit score column '{fit_score_col_name}' for archetype '{add_archetype_as_column}'.")
+
+    # Trend columns (e.g. 'delta_progressive_passes_p90') come from the dataset's snapshot series and
+    # are only materialized when a filter or the sort actually references them.
+    requested_cols = [f.get("column") for f in filters or []] + [sort_by]
+    trend_cols = [c for c in dict.fromkeys(requested_cols) if is_trend_column(c) and c not in working_df.columns]
+    if trend_cols and snapshot_series and 'player_id' in working_df.columns:
+        store = get_snapshot_store(snapshot_series)
+        for col in trend_cols:
+            try:
+                working_df[col] = working_df['player_id'].map(store.trend_column(col))
+                print(f"DIAGNOSTIC: Added trend column '{col}' from {len(store.snapshot_dates)} dataset snapshot(s).")
+            except ValueError as e:
+                print(f"DIAGNOSTIC: Could not add trend column '{col}': {e}")
+
+    if filters:
+        for f in filters:
+            col = f.get("column")
+            op = f.get("operator")
+            val = f.get("value")
+
+            if not all([col, op]) or val is None:
+                print(f"DIAGNOSTIC: Skipping invalid filter: {f}")
+                continue
+
+            if col not in working_df.columns:
+                print(f"DIAGNOSTIC: Skipping filter, column '{col}' not found.")
+                continue
+
+            try:
+                if op == 'greater_than':
+                    working_df = working_df[working_df[col] > float(val)]
+                elif op == 'less_than':
+                    working_df = working_df[working_df[col] < float(val)]
+                elif op == 'equal_to':
+                    working_df = working_df[working_df[col] == val]
+                elif op == 'contains':
+                    working_df = working_df[working_df[col].str.contains(val, case=False, na=False)]
+                elif op == 'is_in':
+                    working_df = working_df[working_df[col].isin(val)]
+                elif op == 'top_percent':
+                    # e.g. "top 10% in his league": percentile within the player's cohort, precomputed per dataset.
+                    cohort_percentiles = get_percentile_cube(normalization_context_df, POSITION_GROUPINGS).metric_percentiles(f.get("cohort", "all"), col)
+                    working_df = working_df[cohort_percentiles.reindex(working_df.index) >= 100 - float(val)]
+            except Exception as e:
+                print(f"DIAGNOSTIC: Error applying filter {f}: {e}")
+
+    if sort_by and sort_by in working_df.columns:
+        working_df = working_df.sort_values(by=sort_by, ascending=sort_ascending)
+    
+    return working_df
+
+def _execute_new_search(full_df: pd.DataFrame, archetype_name: str, filters: List[Dict[str, Any]] = None, normalization: str = None,
+                        top_k: int = None, snapshot_series: str = None) -> pd.DataFrame:
+    """
+    Internal logic for the `new_search` tool: restricts the dataset to the archetype's position group,
+    scores every player against the archetype (normalized over the full dataset, min-max or ECDF
+    as chosen by the query or the archetype), applies the filters
+    and ranks the result by fit score. It has no LLM or session dependencies, so it is shared by the
+    chat agent and the headless batch tooling.
+
+    If top_k is given, only the K best-ranked players are returned: the filters run on the columns
+    they reference, and only the K selected rows are taken from the dataset and sorted.
+    """
+    if archetype_name not in ARCHETYPES:
+        raise ValueError(f"Unknown archetype '{archetype_name}'. Valid archetypes are: {list(ARCHETYPES.keys())}")
+
+    category = ARCHETYPE_TO_POSITION_CATEGORY.get(archetype_name)
+    # The rows of each position group are looked up once per dataset, not scanned per search.
+    rows = get_position_rows(full_df, category, POSITION_GROUPINGS) if category else None
+    fit_score_col_name = _fit_score_column_name(archetype_name)
+    candidate_df = full_df
+    if top_k:
+        filter_cols = [f.get("column") for f in filters or []]
+        candidate_df = full_df[[c for c in dict.fromkeys(['player_id'] + filter_cols) if c in full_df.columns]]
+    initial_df = candidate_df.take(rows) if rows is not None else candidate_df
+    # full_df is shared read-only across sessions; take a copy-on-write view before adding the score column.
+    initial_df = initial_df.copy(deep=False)
+    # Scores for the whole dataset are computed once per archetype and dataset (and refreshed
+    # incrementally on new dataset versions); a search only selects its rows.
+    normalization = _normalization_for(archetype_name, normalization)
+    fit_scores = get_fit_score_table(full_df, archetype_name, ARCHETYPES[archetype_name]['key_metrics'], normalization).scores
+    initial_df[fit_score_col_name] = fit_scores.take(rows) if rows is not None else fit_scores
+    if not top_k:
+        return _execute_search_and_filter(df=initial_df, normalization_context_df=full_df, filters=filters or [], sort_by=fit_score_col_name, sort_ascending=False,
+                                          snapshot_series=snapshot_series)
+
+    candidates = _execute_search_and_filter(df=initial_df, normalization_context_df=full_df, filters=filters or [], snapshot_series=snapshot_series)
+    best = candidates[fit_score_col_name].nlargest(top_k)
+    result_df = full_df.loc[best.index].copy(deep=False)
+    # Keep the columns added while filtering (the fit score and any trend column), as the full ranking does.
+    for col in candidates.columns.difference(result_df.columns, sort=False):
+        result_df[col] = candidates.loc[best.index, col]
+    print(f"DIAGNOSTIC: Kept the top {len(result_df)} of {len(candidates)} matching players.")
+    return result_df
+
+def _build_display_df(result_df: pd.DataFrame, archetype_name: str, used_cols: List[str] = None) -> pd.DataFrame:
+    """Selects and formats the columns shown to the scout for a player search result."""
+    base_cols = ['full_name', 'age', 'primary_position']
+    fit_score_cols = sorted([c for c in result_df.columns if 'fit_score' in c])
+    key_metric_cols = list(ARCHETYPES.get(archetype_name, {}).get('key_metrics', {}).keys())
+    final_display_cols = list(dict.fromkeys([col for col in base_cols + fit_score_cols + key_metric_cols + (used_cols or []) if col in result_df.columns]))
+    final_display_df = result_df[final_display_cols].copy()
+    for col in fit_score_cols:
+        final_display_df[col] = final_display_df[col].round(3)
+    return final_display_df
+
+def new_search(archetype_name: str, filters: List[Dict[str, Any]] = None, normalization: str = None) -> None:
+    """Use this tool to start a completely new search from the entire dataset, anchored by a primary player archetype."""
+    pass
+
+def filter_and_sort(filters: List[Dict[str, Any]] = None, sort_by: str = None, sort_ascending: bool = True, add_archetype_as_column: str = None, normalization: str = None) -> None:
+    """Use this tool to filter, sort, or add a new archetype context to the results of the MOST RECENT search."""
+    pass
+
+def create_plot(x_axis: str, y_axis: str, title: str) -> None:
+    """Use this tool to create a plot of the players from the most recent search results."""
+    pass
+
+def add_log_entry(logbook_name: str, data: Dict[str, Any]) -> None:
+    """
+    Use this tool to add a new row of data to a specified custom logbook. You must provide the exact
+    logbook_name from the <AVAILABLE_LOGBOOKS> context and a dictionary of data where keys are the exact
+    column names. If a date is not specified by the user for a 'date' column, you MUST use today's date
+    in 'YYYY-MM-DD' format.
+    """
+    # This function is a schema placeholder for the OpenAI tools integration.
+    # The actual implementation is handled by `_internal_add_log_entry` to keep the tool
+    # definition clean and separate from the execution logic.
+    pass
+
+# Logbook columns that name a player, in order of preference; entries are linked to the player dataset through them.
+LOGBOOK_PLAYER_COLUMNS = ['player_name', 'player', 'full_name']
+
+def _internal_add_log_entry(logbook_name: str, data: Dict[str, Any]) -> pd.DataFrame:
+    """
+    The internal implementation for adding an entry to a logbook DataFrame stored in st.session_state.
+    This function performs the actual data manipulation, ensuring safety and consistency.
+    """
+    if 'logbooks' not in st.session_state or not st.session_state.get('logbooks'):
+        raise ValueError("No logbooks have been loaded into the session yet.")
+        
+    if logbook_name not in st.session_state['logbooks']:
+        raise ValueError(f"Logbook '{logbook_name}' not found. Available logbooks are: {list(st.session_state['logbooks'].keys())}")
+
+    logbook_df = st.session_state['logbooks'][logbook_name]
+
+    # Create a new dictionary for the row, ensuring it respects the original DataFrame's columns.
+    new_entry = {}
+    for col in logbook_df.columns:
+        new_entry[col] = data.get(col)
+
+    # Link the entry to the player dataset: a player named in the entry is stored under its canonical
+    # name (and id, if the logbook has that column), so the logbook joins cleanly with the players.
+    full_df = st.session_state.get('full_df')
+    player_col = next((c for c in LOGBOOK_PLAYER_COLUMNS if c in logbook_df.columns and new_entry.get(c)), None)
+    if full_df is not None and player_col:
+        row_label = get_player_index(full_df).resolve(new_entry[player_col])
+        if row_label is not None:
+            new_entry[player_col] = full_df.at[row_label, 'full_name']
+            if 'player_id' in logbook_df.columns and 'player_id' in full_df.columns:
+                new_entry['player_id'] = full_df.at[row_label, 'player_id']
+
+    # Convert the single-row dictionary into a one-row DataFrame.
+    new_row_df = pd.DataFrame([new_entry])
+
+    # Append the new row to the existing DataFrame in the session state.
+    # `ignore_index=True` is crucial to ensure the new combined DataFrame has a clean, continuous index.
+    updated_df = pd.concat([logbook_df, new_row_df], ignore_index=True)
+    # Restore the logbook's declared compact types (e.g. parse the entry's date once, here).
+    updated_df = apply_logbook_schema(updated_df, get_logbook_schema(logbook_name, updated_df))
+    
+    # Overwrite the old DataFrame in the session state with the updated one, making the change persistent for the session.
+    st.session_state['logbooks'][logbook_name] = updated_df
+
+    print(f"DIAGNOSTIC: Successfully added entry to '{logbook_name}'. New shape: {updated_df.shape}")
+    return updated_df
+
+# --- SPRINT 3 NEW FEATURE: LOGBOOK Q&A TOOL ---
+def query_logbook(logbook_name: str, question: str) -> None:
+    """
+    Use this tool to answer questions about the data INSIDE a specific custom logbook.
+    Use it for queries like "who is the striker in trials?", "what is Tianco's email?",
+    "how many players are in the wellness log?", or "remove the 3rd row".
+    """
+    # This is the placeholder schema for the agent.
+    pass
+
+def find_similar_players(player_name: str, k: int = 10, archetype_name: str = None) -> None:
+    """
+    Use this tool when the user asks for players who are statistically similar to a specific player,
+    e.g. "find players like Kevin Müller" or "who plays like player 1042?". `player_name` is the player's
+    full name (or player_id). Optionally pass an `archetype_name` to compare only on that archetype's key
+    metrics, weighted by its recipe; otherwise the full metric profile is compared.
+    """
+    pass
+
+def find_surprising_profiles(filters: List[Dict[str, Any]] = None, cohort: str = 'all') -> None:
+    """
+    Use this tool when the user asks for players with surprising, unusual or hybrid profiles, e.g.
+    "show me players with surprising profiles" or "which defenders do something unexpected?". It searches the
+    entire dataset for players who excel (top 10%) in the signature metric of an archetype outside their own
+    position group, ranked by how many such anomalies they have. Optional `filters` narrow the search and
+    `cohort` sets who the percentiles are measured against ('all', 'position_group', 'league' or 'age_band').
+    """
+    pass
+
+# Every metric that appears in at least one archetype recipe: the canonical performance profile
+# used for unweighted "players like X" comparisons.
+SIMILARITY_METRICS = list(dict.fromkeys(m for details in ARCHETYPES.values() for m in details.get('key_metrics', {})))
+
+def _get_similarity_index(full_df: pd.DataFrame, archetype_name: str = None) -> SimilarityIndex:
+    """Returns the similarity index for a dataset (optionally archetype-weighted), building it once per dataset."""
+    if archetype_name:
+        recipe = ARCHETYPES[archetype_name]['key_metrics']
+        return get_dataset_artifact(full_df, f"similarity_index:{archetype_name}", lambda df: SimilarityIndex(df, list(recipe), recipe))
+    return get_dataset_artifact(full_df, "similarity_index", lambda df: SimilarityIndex(df, SIMILARITY_METRICS))
+
+def _internal_find_similar_players(full_df: pd.DataFrame, player_name: str, k: int = 10, archetype_name: str = None) -> pd.DataFrame:
+    """
+    The internal implementation of `find_similar_players`. Returns the k most similar players from full_df,
+    ordered by 'similarity_distance', with a 'biggest_differences' column naming the metrics that
+    contribute most to each player's distance from the reference player.
+    """
+    if archetype_name and archetype_name not in ARCHETYPES:
+        raise ValueError(f"Unknown archetype '{archetype_name}'. Valid archetypes are: {list(ARCHETYPES.keys())}")
+
+    row_label = resolve_player(full_df, player_name)
+    index = _get_similarity_index(full_df, archetype_name)
+    neighbours = index.query(row_label, k=int(k))
+
+    contributions = neighbours[index.metrics]
+    top_metrics = contributions.to_numpy().argsort(axis=1)[:, ::-1][:, :3]
+    biggest_differences = [
+        ", ".join(f"{index.metrics[j]} ({row[j]:.0%})" for j in order if row[j] > 0)
+        for row, order in zip(contributions.to_numpy(), top_metrics)
+    ]
+
+    result_df = full_df.loc[neighbours.index].copy(deep=False)
+    result_df['similarity_distance'] = neighbours['similarity_distance'].round(4)
+    result_df['biggest_differences'] = biggest_differences
+    return result_df
+
+def _internal_find_surprising_profiles(full_df: pd.DataFrame, insight_engine: InsightEngine, filters: List[Dict[str, Any]] = None, cohort: str = 'all',
+                                       snapshot_series: str = None) -> pd.DataFrame:
+    """
+    The internal implementation of `find_surprising_profiles`: joins the dataset-wide anomaly table onto the
+    players that have anomalies, applies the filters and ranks them by anomaly count and strength.
+    """
+    summary = insight_engine.scan_anomalies(full_df, cohort).summary
+    candidates_df = full_df.loc[summary.index].copy(deep=False)
+    for col in summary.columns:
+        candidates_df[col] = summary[col]
+    result_df = _execute_search_and_filter(df=candidates_df, normalization_context_df=full_df, filters=filters or [], snapshot_series=snapshot_series)
+    return result_df.sort_values(['anomaly_count', 'top_anomaly_percentile'], ascending=False)
+
+# The OpenAI client is synchronous and thread-safe; the pipeline's concurrent stages are network-bound,
+# so a small thread pool shared by all sessions is enough.
+_PIPELINE_EXECUTOR = ThreadPoolExecutor(max_workers=AGENT_PIPELINE_WORKERS, thread_name_prefix="agent-pipeline")
+
+_TOOL_SCHEMAS = None
+
+def _get_tool_schemas() -> List[Dict[str, Any]]:
+    """Returns the OpenAI tool schemas of the agent's tools, converted once per process."""
+    global _TOOL_SCHEMAS
+    if _TOOL_SCHEMAS is None:
+        # --- SPRINT 2 MODIFICATION: The new `add_log_entry` tool is now available to the agent ---
+        all_tools = [new_search, filter_and_sort, create_plot, add_log_entry, query_logbook, find_similar_players, find_surprising_profiles]
+        _TOOL_SCHEMAS = [{"type": "function", "function": convert_to_openai_function(f)} for f in all_tools]
+    return _TOOL_SCHEMAS
+
+def _guess_intent(query: str) -> str:
+    """A cheap guess of the intent classifier's answer: mentioning an archetype usually starts a new search."""
+    query = query.lower()
+    archetype_terms = {term.strip().lower() for name in ARCHETYPES for term in name.split('/')}
+    return 'new_search' if any(term and term in query for term in archetype_terms) else 'refinement'
+
+
+class ScoutAgent:
+    def __init__(self):
+        self.client = OpenAI(api_key=OPENAI_API_KEY)
+        self.model_name = "gpt-4.1-nano-2025-04-14"
+        # Runs the independent LLM calls of process_query concurrently (see process_query).
+        self.pipeline_executor = _PIPELINE_EXECUTOR
+        self.insight_engine = InsightEngine(archetypes=ARCHETYPES, position_groupings=POSITION_GROUPINGS, archetype_categories=ARCHETYPE_TO_POSITION_CATEGORY)
+
+    # PASTE THE NEW METHOD HERE
+    def _internal_query_logbook(self, logbook_name: str, question: str) -> str:
+        """
+        Internal implementation for querying a logbook DataFrame using an LLM for comprehension.
+        """
+        if 'logbooks' not in st.session_state or logbook_name not in st.session_state['logbooks']:
+            return f"Error: The logbook '{logbook_name}' was not found in the current session."
+
+        logbook_df = st.session_state['logbooks'][logbook_name]
+
+        if logbook_df.empty:
+            return f"The '{logbook_name}' logbook is currently empty."
+
+        # Convert the DataFrame to a simple, clean Markdown string for the LLM.
+        # This transforms the problem from "data analysis" to "reading comprehension".
+        df_as_markdown = logbook_df.to_markdown(index=False)
+
+        # Create a focused, lightweight prompt for the Q&A task.
+        qa_prompt = f"""You are a data analysis assistant. Your sole task is to answer a user's question based ONLY on the data provided below.
+        If the user asks to modify the data (e.g., "remove a row"), state that you cannot modify the data but provide the information they need to do it themselves.
+
+        <data_context>
+        {df_as_markdown}
+        </data_context>
+
+        Question: {question}
+
+        Answer:"""
+
+        try:
+            # Use self.client and self.model_name, which are defined in __init__
+            response = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": qa_prompt}],
+                temperature=0.0
+            )
+            answer = response.choices[0].message.content
+            return answer
+        except Exception as e:
+            print(f"ERROR: Logbook Q&A LLM call failed: {e}")
+            return "Sorry, I had a problem analyzing that logbook."
+    
+    def _classify_intent(self, query: str, chat_history: list) -> str:
+        # ... (This method's logic is unchanged but remains part of the class) ...
+        valid_archetypes = list(ARCHETYPES.keys())
+        archetype_list_for_prompt = "\n".join(f"- '{name}'" for name in valid_archetypes)
+        classifier_prompt = f"You are an intent classifier. Your only job is to determine if the user's request is for a 'new_search' or a 'refinement'.\n- A 'new_search' happens when the user explicitly mentions a player archetype, signalling they want to start over.\n- A 'refinement' happens when the user asks to filter, sort, plot, or add information to the players they are already looking at.\n\nValid Archetypes:\n{archetype_list_for_prompt}\n\nBased on the user's latest query, classify the intent as 'new_search' or 'refinement'. Your response MUST be one word: either 'new_search' or 'refinement'."
+        messages = [{"role": "system", "content": classifier_prompt}] + chat_history + [{"role": "user", "content": query}]
+        try:
+            response = self.client.chat.completions.create(model="gpt-4.1-nano-2025-04-14", messages=messages, temperature=0, max_tokens=10)
+            intent = response.choices[0].message.content.strip().lower()
+            return 'refinement' if intent not in ['new_search', 'refinement'] else intent
+        except Exception as e:
+            print(f"DIAGNOSTIC: Intent classification failed: {e}")
+            return 'refinement'
+
+    def _summarize_tool_calls(self, query: str, tool_calls: List[Tuple[str, Dict[str, Any]]]) -> str:
+        """Writes the brief confirmation message shown after a successful plan of one or more tool calls."""
+        summary_prompt = "You are an AI Football Scout. Your tool calls were successful. Based on the original query and the tools called (in order), write a brief, friendly confirmation message explaining what you did."
+        tools_description = json.dumps([{"tool": name, "args": args} for name, args in tool_calls])
+        summary_response = self.client.chat.completions.create(
+            model=self.model_name, messages=[{"role": "system", "content": summary_prompt}, {"role": "user", "content": f"Query: {query}, Tools: {tools_description}"}]
+        )
+        return summary_response.choices[0].message.content
+
+    def process_query(self, query: str, chat_history: list, full_df: pd.DataFrame, last_result_df: pd.DataFrame, active_archetype: str,
+                      snapshot_series: str = None) -> Dict[str, Any]:
+        
+        # Initialize variables for the response at the beginning of the function.
+        result_df = None
+        plotly_fig = None
+        display_df = None
+
+        # --- DYNAMIC PROMPT ENGINEERING ---
+        # Before every query, get the real-time schemas of all loaded custom logbooks.
+        logbook_schemas = get_all_logbook_schemas()
+        
+        # This block of text is dynamically generated. If no logbooks are loaded, it will be empty.
+        logbook_context_prompt = ""
+        if logbook_schemas:
+            logbook_context_prompt = f"""<section name="AVAILABLE_LOGBOOKS">
+     You have access to the following custom logbooks. When the user asks to log data, you MUST use the `add_log_entry` tool. When they ask a question about the data in a logbook, you MUST use the `query_logbook` tool.
+     {logbook_schemas}
+     </section>
+     """
+
+        valid_archetypes = list(ARCHETYPES.keys())
+        archetype_list_for_prompt = "\n".join(f"- '{name}'" for name in valid_archetypes)
+        column_list_for_prompt = json.dumps(list(full_df.columns)) if full_df is not None else "[]"
+
+        derived_rule_for_prompt = ""
+        derived_features = describe_derived_features(full_df) if full_df is not None else ""
+        if derived_features:
+            derived_rule_for_prompt = f"""- Derived columns are precomputed for every player; use them in filters and `sort_by` like any other column instead of asking for raw fields: {derived_features}. e.g. "contract ending within a year" is `{{"column": "contract_months_left", "operator": "less_than", "value": 12}}`."""
+
+        # Trends are computed over the snapshots of the dataset's own series only.
+        snapshot_dates = get_snapshot_store(snapshot_series).snapshot_dates if snapshot_series else []
+        trend_rule_for_prompt = ""
+        if len(snapshot_dates) > 1:
+            trend_rule_for_prompt = f"""- Trend questions ("improved his progressive passes this season", "in form") use trend columns, which can be used in filters and `sort_by` like any other column: 'delta_<metric>' is the change since the player's earliest snapshot and 'rolling_avg_<metric>' is the average of the latest {TREND_ROLLING_WINDOW} snapshots, e.g. `{{"column": "delta_progressive_passes_p90", "operator": "greater_than", "value": 0}}`. Snapshots available: {', '.join(snapshot_dates)}."""
+
+        # --- FINAL SYSTEM PROMPT ---
+        # This version includes the full rule hierarchy for all tools.
+        system_prompt = f"""You are an expert AI assistant and data entry specialist for a football scout. Your primary job is to translate natural language user requests into precise tool calls.
+
+        {logbook_context_prompt}
+
+        <rules>
+     <rule name="Tool Choice Hierarchy - TOP PRIORITY">
+     1.  First, check if the user is asking a question ABOUT a custom logbook (e.g., "who is in trials?", "what is player X's email?", "summarize the wellness log"). If so, you MUST use the `query_logbook` tool. The user's `question` for this tool should be their full, original query.
+     2.  If it is not a question, check if the user wants to ADD data to a custom logbook (e.g., "log wellness data," "add RPE score"). If so, you MUST use the `add_log_entry` tool.
+     3.  If the query is not related to custom logbooks, then proceed to the player search tools (`new_search`, `filter_and_sort`, `create_plot`, `find_similar_players`, `find_surprising_profiles`).
+     </rule>
+
+        <rule name="CRITICAL: Log Entry Construction">
+     - You MUST NOT call the `add_log_entry` tool unless the user's query provides BOTH a specific `logbook_name` AND the `data` to be logged.
+     - The `logbook_name` MUST EXACTLY match one of the names provided in the `<AVAILABLE_LOGBOOKS>` schema.
+     - The keys in the `data` dictionary MUST EXACTLY match the column names from that logbook's schema.
+     - If a 'date' column exists and the user does not specify a date, you MUST infer it as today's date: {datetime.date.today().strftime('%Y-%m-%d')}.
+     - Example Query: "add an entry to trials, log name, position, age, number - Tianco, ST, 21, 99"
+     - Correct Tool Call: `add_log_entry(logbook_name="trials", data={{"name": "Tianco", "position": "ST", "age": 21, "number": 99}})`
+     </rule>
+
+     - **NEW EXAMPLE:** The user might provide data in a "list of columns, list of values" format. You must correctly map them.
+     - **User Query:** "add an entry to trials, log name, position, age, number - Tianco, ST, 21, 99"
+     - **Your Logic:**
+     1. Identify the logbook: `trials`.
+     2. Identify the columns: `name`, `position`, `age`, `number`.
+     3. Identify the values: `Tianco`, `ST`, `21`, `99`.
+     4. Map them correctly.
+      - **Correct Tool Call:** `add_log_entry(logbook_name="trials", data={{"name": "Tianco", "position": "ST", "age": 21, "number": 99}})`
+     </rule>
+
+        <rule name="Filters">
+        - Each filter is a dictionary with a `column`, an `operator` and a `value`. Valid operators are: 'greater_than', 'less_than', 'equal_to', 'contains', 'is_in' and 'top_percent'.
+        - Use 'top_percent' for percentile questions such as "top 10% for progressive passes in his league": `{{"column": "progressive_passes_p90", "operator": "top_percent", "value": 10, "cohort": "league"}}`.
+        - The optional `cohort` sets who the player is ranked against: 'all' (default), 'position_group', 'league' or 'age_band'.
+        {derived_rule_for_prompt}
+        {trend_rule_for_prompt}
+        </rule>
+
+        <rule name="Normalization">
+        - Fit scores normalize each metric by its range in the dataset unless the archetype specifies otherwise. Only if the user asks for outlier-robust or percentile-based scoring, set `normalization` to 'ecdf' (on `new_search`, or on `filter_and_sort` together with `add_archetype_as_column`); 'minmax' forces range scaling.
+        </rule>
+
+        <rule name="General">
+        - Your ONLY output MUST be valid tool calls based on the user's most recent query. Do not add any conversational text.
+        - Use a single tool call for a single action. For a compound request (e.g. "find Pressing Forwards under 24 and plot pressures against goals"), return one tool call per step, in the order they must run; each step works on the result of the previous one.
+        </rule>
+        </rules>
+        """
+        
+        # Enforce the per-call token budgets, whatever history the caller passes in.
+        chat_history = trim_to_budget(chat_history, CONTEXT_HISTORY_TOKEN_BUDGET)
+        has_current_view = last_result_df is not None and not last_result_df.empty
+        is_log_request = "log" in query.lower() or "entry" in query.lower() or "add" in query.lower()
+
+        def build_messages(intent: str) -> list:
+            messages = [{"role": "system", "content": system_prompt}] + chat_history
+            if intent != 'new_search' and has_current_view:
+                messages.append({"role": "system", "content": f"<context>The user is viewing players with these columns: {json.dumps(list(last_result_df.columns))}</context>"})
+            messages.append({"role": "user", "content": query})
+            return messages
+
+        def select_tool(messages: list):
+            return self.client.chat.completions.create(model=self.model_name, messages=messages, tools=_get_tool_schemas(), tool_choice="auto")
+
+        try:
+            # The intent only decides whether the current columns are shown to the model, so without a
+            # current view (or for a log request) the classifier is skipped. Otherwise tool selection
+            # runs speculatively on the likely intent while the classifier runs, and is only repeated
+            # if the classifier disagrees.
+            if is_log_request or not has_current_view:
+                response = select_tool(build_messages("log_entry" if is_log_request else "refinement"))
+            else:
+                guessed_intent = _guess_intent(query)
+                intent_future = self.pipeline_executor.submit(self._classify_intent, query, trim_to_budget(chat_history, INTENT_CONTEXT_TOKEN_BUDGET))
+                response = select_tool(build_messages(guessed_intent))
+                intent = intent_future.result()
+                if (intent == 'new_search') != (guessed_intent == 'new_search'):
+                    print(f"DIAGNOSTIC: Speculative intent '{guessed_intent}' was wrong ('{intent}'), repeating tool selection.")
+                    response = select_tool(build_messages(intent))
+            response_message = response.choices[0].message
+        except Exception as e:
+            return {"summary_text": f"Error contacting AI service: {e}", "dataframe": None, "raw_dataframe": None, "plotly_fig": None, "tool_call": None, "tool_calls": []}
+
+        if not response_message.tool_calls:
+            return {"summary_text": "I'm sorry, I couldn't determine the next action. Please rephrase.", "dataframe": None, "raw_dataframe": None, "plotly_fig": None, "tool_call": None, "tool_calls": []}
+
+        # The model may answer a compound request ("find Pressing Forwards under 24 and plot pressures
+        # against goals") with several tool calls; they are executed in order as one plan.
+        tool_calls = [(tc.function.name, json.loads(tc.function.arguments)) for tc in response_message.tool_calls]
+
+        # --- NEW: Pre-emptive Argument Validation ---
+        for function_name, function_args in tool_calls:
+            if function_name == 'add_log_entry':
+                if 'data' not in function_args or 'logbook_name' not in function_args:
+                    # This catches cases where the LLM fails to provide all necessary arguments.
+                    error_message = "I can do that, but I need you to specify both the logbook name and the data to add. For example: 'Add an entry to the wellness_log with 8 hours sleep and a soreness of 3.'"
+                    return {"summary_text": error_message, "dataframe": None, "raw_dataframe": None, "plotly_fig": None, "tool_call": None, "tool_calls": []}
+
+        for function_name, function_args in tool_calls:
+            print(f"DEBUG: LLM chose tool '{function_name}' with args: {function_args}")
+
+        # The confirmation message depends only on the query and the chosen tools, so it is generated
+        # while the plan runs and the display frame is built. ('query_logbook' answers directly.)
+        summarized_calls = [(name, args) for name, args in tool_calls if name != 'query_logbook']
+        summary_future = None
+        if summarized_calls:
+            summary_future = self.pipeline_executor.submit(self._summarize_tool_calls, query, summarized_calls)
+
+        result_df = None
+        plotly_fig = None
+        display_df = None
+        logbook_df = None
+        answers = []
+        # Each step works on the result of the previous one, starting from the players on screen.
+        current_df = last_result_df
+        archetype_for_this_turn = active_archetype
+        used_cols = []
+        # Steps already applied stay applied if a later one fails (e.g. a logbook entry was written),
+        # so the response reports them and shows their result.
+        completed_calls = []
+        failure_text = None
+
+        try:
+            for function_name, function_args in tool_calls:
+                step_df = None
+                if function_name == 'new_search':
+                    step_df = _execute_new_search(full_df=full_df, archetype_name=function_args.get("archetype_name"), filters=function_args.get("filters", []), normalization=function_args.get("normalization"),
+                                                  top_k=LARGE_SEARCH_TOP_K if should_parallelize(len(full_df)) else None, snapshot_series=snapshot_series)
+                    archetype_for_this_turn, used_cols = function_args.get("archetype_name"), []
+                elif function_name == 'filter_and_sort':
+                    step_df = _execute_search_and_filter(df=current_df, normalization_context_df=full_df, snapshot_series=snapshot_series, **function_args)
+                    archetype_for_this_turn = function_args.get('add_archetype_as_column') or archetype_for_this_turn
+                elif function_name == 'create_plot':
+                    plotly_fig = _internal_create_plot(df=current_df, full_df=full_df, **function_args)
+                elif function_name == 'find_similar_players':
+                    step_df = _internal_find_similar_players(full_df=full_df, **function_args)
+                    archetype_for_this_turn = function_args.get('archetype_name') or archetype_for_this_turn
+                    used_cols = ['similarity_distance', 'biggest_differences']
+                elif function_name == 'find_surprising_profiles':
+                    step_df = _internal_find_surprising_profiles(full_df=full_df, insight_engine=self.insight_engine, snapshot_series=snapshot_series, **function_args)
+                    used_cols = ['anomaly_count', 'surprising_profiles']
+
+                # --- SPRINT 2 MODIFICATION: Execution logic for the new tool ---
+                elif function_name == 'add_log_entry':
+                    # The result to be displayed is the entire, updated logbook.
+                    logbook_df = _internal_add_log_entry(**function_args)
+
+                elif function_name == 'query_logbook':
+                    # The internal function returns a simple string answer, delivered directly to the UI.
+                    answers.append(self._internal_query_logbook(**function_args))
+
+                if step_df is not None:
+                    current_df = result_df = step_df
+                used_cols += [col for col in [function_args.get('sort_by')] + [f.get('column') for f in function_args.get('filters') or []] if col]
+                completed_calls.append((function_name, function_args))
+
+        except (ValueError, KeyError) as e:
+            # The confirmation describes the whole plan, which did not run to the end.
+            if summary_future is not None:
+                summary_future.cancel()
+                summary_future = None
+            failure_text = f"I couldn't complete that request: step {len(completed_calls) + 1} of {len(tool_calls)} ({function_name}) failed: {e}"
+            if not completed_calls:
+                return {"summary_text": failure_text, "dataframe": None, "raw_dataframe": None, "plotly_fig": None, "tool_call": None, "tool_calls": []}
+            failure_text += f"\n\nCompleted before it: {', '.join(name for name, _ in completed_calls)}."
+
+        # --- SPRINT 2 MODIFICATION: Final Response Handling ---
+        # The display is built once, from the final result of the plan. If no player search was
+        # performed, an updated logbook is shown instead.
+        if result_df is not None:
+            display_df = _build_display_df(result_df, archetype_for_this_turn, used_cols)
+        elif logbook_df is not None:
+            display_df = logbook_df
+
+        # Tools like 'add_log_entry' or 'new_search' get the generic confirmation message started above.
+        summary_parts = [summary_future.result()] if summary_future is not None else []
+        if failure_text:
+            summary_parts.append(failure_text)
+        summary_text = "\n\n".join(summary_parts + answers)
+
+        executed_calls = [{"name": name, "arguments": args} for name, args in completed_calls]
+        return {
+            "summary_text": summary_text, 
+            "dataframe": display_df, 
+            "plotly_fig": plotly_fig, 
+            "raw_dataframe": result_df,
+            # 'tool_call' is the last step of the plan; 'tool_calls' lists every step that ran, in order.
+            "tool_call": executed_calls[-1],
+            "tool_calls": executed_calls,
+        }
+
+    # ---------------------- CHANGE 1.2: ADDITION START ---------------------
+    def generate_on_demand_insight(self, player_name: str, full_df: pd.DataFrame, active_archetype: str, cohort: str = 'all') -> str:
+        """
+        Generates an "Analyst's Note" for a single, specific player chosen by the user.
+
+        This method serves as a dedicated entry point for the on-demand UI feature. It bypasses
+        the main chat and tool-use pipeline for a faster, more direct response.
+
+        Args:
+            player_name (str): The player to be analyzed: a player_id or a (full, short or partial) name.
+            full_df (pd.DataFrame): The complete, unfiltered dataset, required for percentile calculations.
+            active_archetype (str): The primary archetype context for the analysis.
+            cohort (str): The comparison cohort for percentiles ('all', 'position_group', 'league' or 'age_band').
+
+        Returns:
+            str: A formatted Markdown string containing the "Analyst's Note", 
+                 or an error message if the analysis could not be completed.
+        """
+        print(f"DEBUG: Received on-demand insight request for '{player_name}' with archetype '{active_archetype}'.")
+        try:
+            # Find the specific player's data from the full dataset.
+            # It's crucial to use full_df to get the complete, original data for the player.
+            # The per-dataset player index resolves ids, accents, casing and short names in O(1).
+            row_label = get_player_index(full_df).resolve(player_name)
+            if row_label is None:
+                print(f"ERROR: Could not find player '{player_name}' in generate_on_demand_insight.")
+                return f"**Analysis Error:** Could not find player '{player_name}' in the dataset."
+            player_series = full_df.loc[row_label]
+
+            if player_series.empty:
+                return "**Analysis Error:** Could not find the specified player in the dataset."
+            
+            if not active_archetype:
+                 return "**Analysis Error:** An active archetype is required to generate an analyst note."
+
+            # Call the insight engine with the required context; notes are served from the shared note cache when possible.
+            analyst_note = self.insight_engine.get_analyst_note(
+                player_data=player_series,
+                full_dataset=full_df,
+                active_archetype=active_archetype,
+                cohort=cohort
+            )
+            return analyst_note
+
+        except IndexError:
+            # This error occurs if the player_name is not found in the dataframe.
+            print(f"ERROR: Could not find player '{player_name}' in generate_on_demand_insight.")
+            return f"**Analysis Error:** Could not find player '{player_name}' in the dataset."
+        except Exception as e:
+            # Catch any other unexpected errors during insight generation.
+            print(f"ERROR: An unexpected error occurred in generate_on_demand_insight: {e}")
+            return f"**Analysis Error:** An unexpected problem occurred while generating the note. Details: {e}"
+    # ---------------------- CHANGE 1.2: ADDITION END -----------------------
+
+    def prewarm_analyst_notes(self, result_df: pd.DataFrame, full_df: pd.DataFrame, active_archetype: str, cohort: str = 'all') -> int:
+        """
+        Starts generating the Analyst's Notes of the top players of a search result in the background.
+
+        Args:
+            result_df (pd.DataFrame): The ranked search result (rows labelled as in full_df).
+            full_df (pd.DataFrame): The complete, unfiltered dataset.
+            active_archetype (str): The archetype of the search.
+            cohort (str): The comparison cohort the scout currently has selected.
+
+        Returns:
+            int: The number of notes queued (already cached notes are skipped).
+        """
+        top_labels = [label for label in result_df.index[:NOTE_PREWARM_TOP_N] if label in full_df.index]
+        queued = self.insight_engine.prewarm_analyst_notes(top_labels, full_df, active_archetype, cohort)
+        print(f"DIAGNOSTIC: Prewarming {queued} analyst note(s) for the top {len(top_labels)} '{active_archetype}' players.")
+        return queued
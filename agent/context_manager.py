@@ -0,0 +1,141 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from config.settings import CONTEXT_HISTORY_TOKEN_BUDGET, CONTEXT_RECENT_MESSAGES
+
+# Average characters per token of English chat text for OpenAI tokenizers. An estimate is enough to
+# enforce a budget and avoids a tokenizer dependency on the hot path.
+_CHARS_PER_TOKEN = 4
+# Fixed per-message overhead (role and separators) charged by the chat completions format.
+_TOKENS_PER_MESSAGE = 4
+
+
+def count_tokens(text: str) -> int:
+    """Returns the estimated number of tokens in a piece of text."""
+    return -(-len(text or "") // _CHARS_PER_TOKEN)
+
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Returns the estimated number of prompt tokens of a list of chat messages."""
+    return sum(_TOKENS_PER_MESSAGE + count_tokens(m.get("content")) for m in messages)
+
+
+def trim_to_budget(messages: List[Dict[str, Any]], token_budget: int) -> List[Dict[str, Any]]:
+    """
+    Returns the longest suffix of `messages` that fits in `token_budget`.
+
+    Leading system messages (the state summary) are always kept; the oldest turns are dropped first.
+    """
+    pinned = [m for m in messages[:1] if m.get("role") == "system"]
+    turns = messages[len(pinned):]
+    remaining = token_budget - count_message_tokens(pinned)
+    kept = []
+    for message in reversed(turns):
+        cost = count_message_tokens([message])
+        if cost > remaining:
+            break
+        kept.append(message)
+        remaining -= cost
+    return pinned + kept[::-1]
+
+
+class ConversationState:
+    """
+    The structured state of a scouting conversation, derived from the tool calls of its turns.
+
+    This is what older turns are compacted into: instead of replaying every message to the model,
+    the agent receives the active archetype, the filters and sort currently applied and the
+    columns on screen, which is all that later refinements depend on.
+    """
+
+    def __init__(self):
+        self.active_archetype: Optional[str] = None
+        self.filters: List[Dict[str, Any]] = []
+        self.sort_by: Optional[str] = None
+        self.sort_ascending: bool = True
+        self.added_archetypes: List[str] = []
+        self.last_action: Optional[str] = None
+        self.turns_compacted = 0
+
+    def apply(self, tool_call: Dict[str, Any]) -> None:
+        """Updates the state with one executed tool call."""
+        name, args = tool_call.get("name"), tool_call.get("arguments") or {}
+        if name == "new_search":
+            self.active_archetype = args.get("archetype_name")
+            self.filters = list(args.get("filters") or [])
+            self.sort_by, self.sort_ascending, self.added_archetypes = None, True, []
+        elif name == "filter_and_sort":
+            self.filters += list(args.get("filters") or [])
+            if args.get("sort_by"):
+                self.sort_by, self.sort_ascending = args["sort_by"], args.get("sort_ascending", True)
+            if args.get("add_archetype_as_column"):
+                self.active_archetype = args["add_archetype_as_column"]
+                self.added_archetypes.append(args["add_archetype_as_column"])
+        elif name in ("find_similar_players", "find_surprising_profiles"):
+            self.filters = list(args.get("filters") or [])
+            self.sort_by, self.sort_ascending, self.added_archetypes = None, True, []
+            if args.get("archetype_name"):
+                self.active_archetype = args["archetype_name"]
+        self.last_action = f"{name}({json.dumps(args)})"
+
+    def to_message(self, current_columns: List[str] = None) -> Dict[str, str]:
+        """Renders the state as a single system message."""
+        lines = [f"Earlier turns summarized: {self.turns_compacted}"]
+        lines.append(f"Active archetype: {self.active_archetype or 'none'}")
+        lines.append(f"Filters applied: {json.dumps(self.filters) if self.filters else 'none'}")
+        if self.sort_by:
+            lines.append(f"Sorted by: {self.sort_by} ({'ascending' if self.sort_ascending else 'descending'})")
+        if self.added_archetypes:
+            lines.append(f"Archetype score columns added: {', '.join(self.added_archetypes)}")
+        if self.last_action:
+            lines.append(f"Last action: {self.last_action}")
+        if current_columns:
+            lines.append(f"Columns on screen: {json.dumps(list(current_columns))}")
+        return {"role": "system", "content": "<conversation_state>\n" + "\n".join(lines) + "\n</conversation_state>"}
+
+
+class ContextManager:
+    """
+    Bounds the chat history sent to the model.
+
+    The most recent `recent_messages` messages are sent verbatim; every older turn is folded,
+    once, into a ConversationState. The result is trimmed to a per-call token budget, so the
+    prompt size (and latency) of a late-session turn is the same as that of an early one.
+    """
+
+    def __init__(self, recent_messages: int = CONTEXT_RECENT_MESSAGES, token_budget: int = CONTEXT_HISTORY_TOKEN_BUDGET):
+        self.recent_messages = recent_messages
+        self.token_budget = token_budget
+        self.state = ConversationState()
+        self._compacted_upto = 0
+
+    def build(self, messages: List[Dict[str, Any]], current_columns: List[str] = None) -> List[Dict[str, str]]:
+        """
+        Returns the bounded chat history for the next model call.
+
+        Args:
+            messages: The full stored history (oldest first). Assistant messages may carry the
+                      'tool_calls' they executed, in order, which is what compaction reads.
+            current_columns: The columns of the result the user is currently looking at.
+
+        Returns:
+            A list of {'role', 'content'} messages: a state summary (once any turn has been
+            compacted) followed by the most recent turns, within the token budget.
+        """
+        if len(messages) < self._compacted_upto:
+            # The history was reset (e.g. a new dataset was uploaded).
+            self.state, self._compacted_upto = ConversationState(), 0
+
+        window_start = max(0, len(messages) - self.recent_messages)
+        # Fold every message that left the window into the state; each is compacted exactly once.
+        for message in messages[self._compacted_upto:window_start]:
+            if message.get("role") == "assistant":
+                self.state.turns_compacted += 1
+                for tool_call in message.get("tool_calls") or []:
+                    self.state.apply(tool_call)
+        self._compacted_upto = max(self._compacted_upto, window_start)
+
+        recent = [{"role": m["role"], "content": m["content"]} for m in messages[window_start:]]
+        if self._compacted_upto == 0:
+            return trim_to_budget(recent, self.token_budget)
+        return trim_to_budget([self.state.to_message(current_columns)] + recent, self.token_budget)
@@ -0,0 +1,313 @@
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import PARALLEL_SCORING_MIN_ROWS, PARALLEL_SCORING_WORKERS, PARALLEL_SCORING_SHARD_ROWS
+from utils.dataset_store import get_dataset_artifact
+
+# Percentiles are packed as whole numbers in uint8 (as in insights.percentile_cube); 255 marks a missing one.
+_MISSING_PERCENTILE = np.uint8(255)
+
+# A shared array is passed to workers by reference: (shared memory name, shape, dtype name).
+SharedRef = Tuple[str, Tuple[int, ...], str]
+
+
+class SharedArray:
+    """
+    A numpy array in POSIX shared memory, readable and writable by the scoring workers without copying.
+
+    The creating process owns the segment and unlinks it when the object is garbage-collected (or
+    at exit); workers attach to it by reference (see `ref`) and never pickle its contents.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype: str = 'float64'):
+        nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+        self.ref: SharedRef = (self.shm.name, tuple(shape), str(np.dtype(dtype)))
+        self._finalizer = weakref.finalize(self, SharedArray._release, self.shm)
+
+    @staticmethod
+    def _release(shm: shared_memory.SharedMemory) -> None:
+        try:
+            shm.close()
+        except BufferError:
+            # A view is still alive; the mapping goes with it, unlinking below frees the segment's name.
+            pass
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def release(self) -> None:
+        """Frees the shared memory now rather than at garbage collection."""
+        self.array = None
+        self._finalizer()
+
+
+class SharedMetricBlock:
+    """
+    The numeric columns of a dataset in shared memory, one float64 segment per column, so that
+    every row shard of a metric is contiguous and workers read it without any copy.
+
+    Built once per dataset (see get_shared_metric_block) and reused by every parallel scoring
+    call on it. A column is only copied into shared memory the first time it is scored, so the
+    block holds the archetype metrics in use rather than every column. Missing values are NaN.
+    Lookup arrays derived from the columns (the sorted values of ECDF normalization) are shared
+    the same way, see shared_copy.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = weakref.ref(df)
+        self.numeric_columns = set(df.select_dtypes(include='number').columns)
+        self.n_rows = len(df)
+        self._lock = threading.Lock()
+        self._columns: Dict[str, SharedArray] = {}
+        self._derived: Dict[str, Tuple[np.ndarray, SharedArray]] = {}
+
+    def column_ref(self, column: str) -> Optional[SharedRef]:
+        """Returns the shared array of a numeric column (copying it on first use), or None if it is not numeric."""
+        if column not in self.numeric_columns:
+            return None
+        with self._lock:
+            shared = self._columns.get(column)
+            if shared is None:
+                shared = self._columns[column] = SharedArray((self.n_rows,))
+                shared.array[:] = self._df()[column].to_numpy(dtype='float64', na_value=np.nan)
+        return shared.ref
+
+    def shared_copy(self, name: str, values: np.ndarray) -> SharedRef:
+        """Returns a shared copy of a derived float64 array, copied on first use and reused while the same array is passed."""
+        with self._lock:
+            cached = self._derived.get(name)
+            if cached is None or cached[0] is not values:
+                shared = SharedArray((len(values),))
+                shared.array[:] = values
+                cached = self._derived[name] = (values, shared)
+        return cached[1].ref
+
+
+def get_shared_metric_block(df: pd.DataFrame) -> SharedMetricBlock:
+    """Returns the shared-memory metric block of a dataset, built once per dataset."""
+    return get_dataset_artifact(df, "shared_metric_block", SharedMetricBlock)
+
+
+# --- Worker pool ---
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+def scoring_workers() -> int:
+    """Returns the number of scoring processes (PARALLEL_SCORING_WORKERS, or every core if 0)."""
+    return PARALLEL_SCORING_WORKERS or os.cpu_count() or 1
+
+
+def _pool(workers: int = None) -> ProcessPoolExecutor:
+    """Returns the shared scoring pool, (re)starting it with `workers` processes if that number changed."""
+    global _POOL, _POOL_WORKERS
+    workers = workers or scoring_workers()
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=True)
+            # 'spawn' rather than 'fork': the server process runs many threads, which forking does not support safely.
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+def _shards(n_rows: int, workers: int) -> List[Tuple[int, int]]:
+    """Splits [0, n_rows) into contiguous row ranges: at least one per worker, at most PARALLEL_SCORING_SHARD_ROWS rows each."""
+    n_shards = max(workers, -(-n_rows // PARALLEL_SCORING_SHARD_ROWS))
+    edges = np.linspace(0, n_rows, min(n_shards, max(n_rows, 1)) + 1).astype(int)
+    return [(int(start), int(end)) for start, end in zip(edges[:-1], edges[1:]) if end > start]
+
+
+# Segments attached by this worker process, most recent last. A few are kept mapped so the tasks of
+# one call do not re-map the block; older ones (from finished calls) are closed.
+_ATTACHED: Dict[str, shared_memory.SharedMemory] = {}
+_MAX_ATTACHED = 64
+
+
+def _attach(ref: SharedRef) -> np.ndarray:
+    name, shape, dtype = ref
+    shm = _ATTACHED.pop(name, None) or shared_memory.SharedMemory(name=name)
+    _ATTACHED[name] = shm
+    while len(_ATTACHED) > _MAX_ATTACHED:
+        stale = _ATTACHED.pop(next(iter(_ATTACHED)))
+        try:
+            stale.close()
+        except BufferError:
+            pass
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+# --- Worker tasks (run in the scoring processes) ---
+def _score_shard(out_ref: SharedRef, start: int, end: int, terms: List[Tuple[str, SharedRef, Any, float]]) -> None:
+    """
+    Scores rows [start, end) into the shared output.
+
+    `terms` holds (kind, shared metric column, normalization, weight) for every scorable recipe
+    metric, in recipe order, so the sums match score_rows exactly. The normalization is
+    (min, max - min) for kind 'minmax', and the shared sorted values of the column for 'ecdf'.
+    """
+    out = _attach(out_ref)
+    scores = np.zeros(end - start)
+    for kind, column_ref, normalization, weight in terms:
+        values = _attach(column_ref)[start:end]
+        if kind == 'ecdf':
+            sorted_values = _attach(normalization)
+            normalized = np.searchsorted(sorted_values, values, side='right') / len(sorted_values)
+            normalized[np.isnan(values)] = np.nan
+        else:
+            low, span = normalization
+            normalized = (values - low) / span
+        scores += np.where(np.isnan(normalized), 0.0, normalized) * weight
+    out[start:end] = scores
+
+
+def _group_percentiles(values: np.ndarray, codes: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Returns the percentile rank (0-1) of every value within its group, exactly as pandas'
+    rank(pct=True) (average rank for ties, divided by the group's count of non-missing values).
+
+    One lexicographic sort by (group, value) replaces a grouped rank, which factorizes the
+    groups again for every column. Missing values, and rows with group code -1, get NaN.
+    """
+    valid = ~np.isnan(values) if codes is None else ~np.isnan(values) & (codes >= 0)
+    rows = np.flatnonzero(valid)
+    result = np.full(len(values), np.nan)
+    if not len(rows):
+        return result
+    x = values[rows]
+    g = np.zeros(len(rows), dtype=np.int64) if codes is None else codes[rows].astype(np.int64)
+    order = np.lexsort((x, g))
+    x, g = x[order], g[order]
+
+    n = len(order)
+    new_group = np.r_[True, g[1:] != g[:-1]]
+    group_id = np.cumsum(new_group) - 1
+    group_start = np.flatnonzero(new_group)
+    group_size = np.diff(np.r_[group_start, n])
+    # Runs of equal values within a group share the average of their 1-based positions.
+    new_run = new_group | np.r_[True, x[1:] != x[:-1]]
+    run_id = np.cumsum(new_run) - 1
+    run_start = np.flatnonzero(new_run)
+    run_end = np.r_[run_start[1:], n] - 1
+    offset = group_start[group_id[run_start]]
+    average_rank = (run_start - offset + run_end - offset) / 2 + 1
+    result[rows[order]] = average_rank[run_id] / group_size[group_id]
+    return result
+
+
+def _rank_column(staging_ref: SharedRef, slot: int, out_ref: SharedRef, column: int, codes_ref: Optional[SharedRef]) -> None:
+    """Writes the packed percentile ranks of one staged column (within each cohort, if cohort codes are given)."""
+    # Code -1 marks a player without a cohort; like the single-process cube, they get no percentile.
+    codes = _attach(codes_ref) if codes_ref is not None else None
+    packed = np.rint(_group_percentiles(_attach(staging_ref)[slot], codes) * 100)
+    _attach(out_ref)[:, column] = np.where(np.isnan(packed), _MISSING_PERCENTILE, packed).astype(np.uint8)
+
+
+# --- Parallel scoring API ---
+def should_parallelize(n_rows: int) -> bool:
+    """Tells whether a frame is large enough for scoring to be dispatched to the process pool."""
+    return PARALLEL_SCORING_MIN_ROWS > 0 and n_rows >= PARALLEL_SCORING_MIN_ROWS
+
+
+def parallel_score(df: pd.DataFrame, recipe: Dict[str, float], stats, workers: int = None) -> pd.Series:
+    """
+    Scores every row of a dataset against an archetype recipe across the scoring processes.
+
+    The dataset's rows are split into shards; each worker scores its shards straight from the
+    shared metric columns into a shared output array. Results are identical to score_rows.
+    Only call it for a registered dataset (see score_rows): its shared metric block is cached
+    with the dataset, whereas a short-lived frame would copy its columns to shared memory per call.
+
+    Args:
+        df: The dataset to score (its shared metric block is built on first use).
+        recipe: The archetype's key_metrics, mapping metric name to weight.
+        stats: The normalization of the context dataset (NormalizationStats or EcdfNormalizer).
+        workers: The number of processes to use (default: scoring_workers()).
+
+    Returns:
+        The fit scores, aligned with df's index.
+    """
+    block = get_shared_metric_block(df)
+    terms = []
+    for stat, weight in recipe.items():
+        if stat not in block.numeric_columns:
+            continue
+        if stats.mode == 'ecdf':
+            sorted_values = stats.sorted_values(stat)
+            if sorted_values is not None and len(sorted_values):
+                terms.append(('ecdf', block.column_ref(stat), block.shared_copy(f"ecdf:{stat}", sorted_values), float(weight)))
+            continue
+        bounds = stats.bounds(stat)
+        if bounds is None:
+            continue
+        low, high = float(bounds[0]), float(bounds[1])
+        if (high - low) > 0:
+            terms.append(('minmax', block.column_ref(stat), (low, high - low), float(weight)))
+
+    out = SharedArray((block.n_rows,))
+    pool = _pool(workers)
+    futures = [pool.submit(_score_shard, out.ref, start, end, terms)
+               for start, end in _shards(block.n_rows, workers or scoring_workers())]
+    for future in futures:
+        future.result()
+    scores = pd.Series(out.array.copy(), index=df.index)
+    out.release()
+    return scores
+
+
+def parallel_percentile_ranks(numeric_df: pd.DataFrame, group_keys: Optional[pd.Series] = None,
+                              workers: int = None) -> np.ndarray:
+    """
+    Percentile-ranks (0-100, packed as uint8 with 255 for missing) every column of a numeric frame,
+    optionally within groups, with the columns split across the scoring processes.
+
+    Ranking needs a whole column, so work is sharded by column rather than by row. Columns are
+    copied into a shared staging block a batch at a time (one column per worker), which bounds
+    the extra memory to a few columns; workers write their ranks into a shared output.
+
+    Args:
+        numeric_df: The numeric columns to rank.
+        group_keys: The cohort of every row (e.g. their league), or None to rank against all rows.
+        workers: The number of processes to use (default: scoring_workers()).
+
+    Returns:
+        A (rows x columns) uint8 array, as built by PercentileCube.
+    """
+    n_rows, n_columns = numeric_df.shape
+    workers = workers or scoring_workers()
+    batch_size = max(min(workers, n_columns), 1)
+    staging = SharedArray((batch_size, n_rows))
+    out = SharedArray((n_rows, n_columns), dtype='uint8')
+    codes = None
+    if group_keys is not None:
+        codes = SharedArray((n_rows,), dtype='int32')
+        codes.array[:] = pd.Categorical(group_keys).codes
+
+    pool = _pool(workers)
+    for batch_start in range(0, n_columns, batch_size):
+        batch = range(batch_start, min(batch_start + batch_size, n_columns))
+        for slot, column in enumerate(batch):
+            staging.array[slot] = numeric_df.iloc[:, column].to_numpy(dtype='float64', na_value=np.nan)
+        futures = [pool.submit(_rank_column, staging.ref, slot, out.ref, column, codes.ref if codes else None)
+                   for slot, column in enumerate(batch)]
+        for future in futures:
+            future.result()
+
+    packed = out.array.copy()
+    for shared in (staging, out, codes):
+        if shared is not None:
+            shared.release()
+    return packed
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple, Union
+
+from agent.parallel_scoring import parallel_score, should_parallelize
+from utils.dataset_store import get_dataset_artifact, dataset_key_of
+
+# How a metric is scaled to 0-1 before weighting: 'minmax' divides by the dataset's range (fast, but one
+# outlier compresses everyone else towards zero); 'ecdf' uses the share of players at or below the value.
+NORMALIZATION_MODES = ('minmax', 'ecdf')
+
+
+def score_rows(df: pd.DataFrame, recipe: Dict[str, float], stats: Union["NormalizationStats", "EcdfNormalizer"]) -> pd.Series:
+    """
+    Scores rows against an archetype recipe using precomputed normalization tables.
+
+    Args:
+        df: The rows to score.
+        recipe: The archetype's key_metrics, mapping metric name to weight.
+        stats: The normalization of the context dataset (see get_normalizer).
+
+    Returns:
+        A Series of fit scores aligned with df's index.
+    """
+    if should_parallelize(len(df)) and dataset_key_of(df) is not None:
+        # A very large registered dataset is scored in row shards across all cores (same results), from
+        # its cached shared-memory columns. Other frames (e.g. filtered subsets) are scored here.
+        return parallel_score(df, recipe, stats)
+    fit_score = pd.Series(0.0, index=df.index)
+    for stat, weight in recipe.items():
+        if stat not in df.columns or not pd.api.types.is_numeric_dtype(df[stat]):
+            continue
+        normalized_stat = stats.normalize(stat, df[stat])
+        if normalized_stat is not None:
+            fit_score += normalized_stat.fillna(0) * weight
+    return fit_score
+
+
+class NormalizationStats:
+    """Per-column min/max bounds of a dataset's numeric columns, used for min-max normalization."""
+
+    mode = 'minmax'
+
+    def __init__(self, df: pd.DataFrame):
+        numeric_df = df.select_dtypes(include='number')
+        # Bounds are kept as float64 (NaN for an all-missing column) whatever the columns' dtypes; a
+        # nullable column would otherwise make every bound a nullable <NA>-propagating Float64.
+        self.minimums = numeric_df.min().astype('float64')
+        self.maximums = numeric_df.max().astype('float64')
+
+    def same_bounds(self, other: "NormalizationStats", column: str) -> bool:
+        """Tells whether a column has the same bounds in both stats (missing bounds compare equal)."""
+        bounds, other_bounds = self.bounds(column), other.bounds(column)
+        if bounds is None or other_bounds is None:
+            return bounds is None and other_bounds is None
+        return np.array_equal(np.asarray(bounds, dtype=np.float64), np.asarray(other_bounds, dtype=np.float64), equal_nan=True)
+
+    def bounds(self, column: str) -> Optional[Tuple[float, float]]:
+        """Returns (min, max) for a column, or None if it is not a numeric column of the dataset."""
+        if column not in self.minimums.index:
+            return None
+        return self.minimums[column], self.maximums[column]
+
+    def normalize(self, column: str, values: pd.Series) -> Optional[pd.Series]:
+        """Min-max scales values of a column to 0-1, or returns None if the column has no range in the dataset."""
+        bounds = self.bounds(column)
+        if bounds is None:
+            return None
+        min_val, max_val = bounds
+        if (max_val - min_val) > 0:
+            return (values - min_val) / (max_val - min_val)
+        return None
+
+    def refresh(self, old_df: pd.DataFrame, new_df: pd.DataFrame, diff) -> "NormalizationStats":
+        """
+        Derives the bounds of a new dataset version from these bounds and the diff.
+
+        Untouched columns keep their bounds. For touched columns, the bounds only need the
+        incoming values of changed/added rows, unless a withdrawn value (a removed row or
+        the old value of a changed row) was itself the column's min or max; only those
+        columns are rescanned in full.
+        """
+        numeric_columns = new_df.select_dtypes(include='number').columns
+        refreshed = object.__new__(NormalizationStats)
+        refreshed.minimums = self.minimums.reindex(numeric_columns)
+        refreshed.maximums = self.maximums.reindex(numeric_columns)
+
+        touched = [c for c in numeric_columns if c in diff.changed_columns or c not in self.minimums.index]
+        if diff.added_ids or diff.removed_ids:
+            touched = list(numeric_columns)
+        if not touched:
+            return refreshed
+
+        key = diff.key
+        withdrawn = old_df.loc[old_df[key].isin(diff.removed_ids + diff.changed_ids), [c for c in touched if c in old_df.columns]]
+        incoming = new_df.loc[new_df[key].isin(diff.touched_ids), touched]
+
+        rescan = set(c for c in touched if c not in self.minimums.index)
+        for col in withdrawn.columns:
+            if col in self.minimums.index and (withdrawn[col].eq(self.minimums[col]) | withdrawn[col].eq(self.maximums[col])).any():
+                rescan.add(col)
+
+        # With no incoming rows (an update that only removes players) the kept bounds stand as they are.
+        incremental = [c for c in touched if c not in rescan]
+        if incremental and not incoming.empty:
+            refreshed.minimums[incremental] = np.fmin(self.minimums[incremental], incoming[incremental].min().astype('float64'))
+            refreshed.maximums[incremental] = np.fmax(self.maximums[incremental], incoming[incremental].max().astype('float64'))
+        if rescan:
+            rescan = list(rescan)
+            refreshed.minimums[rescan] = new_df[rescan].min().astype('float64')
+            refreshed.maximums[rescan] = new_df[rescan].max().astype('float64')
+        return refreshed
+
+
+class EcdfTable:
+    """
+    The sorted non-missing values of one numeric column: the lookup table of its empirical CDF.
+
+    A value's normalized score is the share of players at or below it, found by binary search,
+    so a single outlier only moves the top of the scale instead of compressing everyone else.
+    """
+
+    def __init__(self, df: pd.DataFrame, column: str):
+        self.column = column
+        values = np.sort(df[column].to_numpy(dtype=np.float64, na_value=np.nan))
+        # np.sort puts NaN last.
+        self.sorted_values = values[:len(values) - np.isnan(values).sum()]
+
+    def normalize(self, values: pd.Series) -> Optional[pd.Series]:
+        """Returns the ECDF (0-1] of each value, NaN for missing values, or None if the column has no values."""
+        if not len(self.sorted_values):
+            return None
+        lookup = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        ecdf = np.searchsorted(self.sorted_values, lookup, side='right') / len(self.sorted_values)
+        ecdf[np.isnan(lookup)] = np.nan
+        return pd.Series(ecdf, index=values.index)
+
+    def refresh(self, old_df: pd.DataFrame, new_df: pd.DataFrame, diff) -> Optional["EcdfTable"]:
+        """Carries the table over if the column's values are unchanged; otherwise it is rebuilt on next use."""
+        if diff.added_ids or diff.removed_ids or self.column in diff.changed_columns or self.column not in new_df.columns:
+            return None
+        return self
+
+
+class EcdfNormalizer:
+    """ECDF normalization against a context dataset, using its per-column EcdfTable artifacts (built on first use)."""
+
+    mode = 'ecdf'
+
+    def __init__(self, context_df: pd.DataFrame):
+        self.context_df = context_df
+
+    def sorted_values(self, column: str) -> Optional[np.ndarray]:
+        """Returns the sorted non-missing values of a column in the context dataset, or None if it is not a numeric column of it."""
+        if column not in self.context_df.columns or not pd.api.types.is_numeric_dtype(self.context_df[column]):
+            return None
+        return get_ecdf_table(self.context_df, column).sorted_values
+
+    def normalize(self, column: str, values: pd.Series) -> Optional[pd.Series]:
+        """Returns the ECDF of values of a column in the context dataset, or None if it is not a numeric column of it."""
+        if self.sorted_values(column) is None:
+            return None
+        return get_ecdf_table(self.context_df, column).normalize(values)
+
+
+class FitScoreTable:
+    """The fit score of every player in a dataset for one archetype, normalized over the full dataset."""
+
+    def __init__(self, df: pd.DataFrame, archetype_name: str, recipe: Dict[str, float], normalization: str = 'minmax'):
+        self.archetype_name = archetype_name
+        self.recipe = recipe
+        self.normalization = normalization
+        self.scores = score_rows(df, recipe, get_normalizer(df, normalization))
+
+    def refresh(self, old_df: pd.DataFrame, new_df: pd.DataFrame, diff) -> "FitScoreTable":
+        """
+        Derives the fit-score table of a new dataset version from this one and the diff.
+
+        If the normalization bounds of any recipe metric moved, every score changes and the
+        table is recomputed (vectorized). Otherwise existing scores are carried over by player_id
+        and only changed and added players are scored. Under ECDF normalization any added,
+        removed or changed value of a recipe metric moves the ECDF of every player.
+        """
+        new_stats = get_normalizer(new_df, self.normalization)
+        if self.normalization == 'ecdf':
+            moved = bool(diff.added_ids or diff.removed_ids or diff.changed_columns & set(self.recipe))
+        else:
+            old_stats = get_normalization_stats(old_df)
+            moved = not all(old_stats.same_bounds(new_stats, m) for m in self.recipe)
+        if moved:
+            return FitScoreTable(new_df, self.archetype_name, self.recipe, self.normalization)
+
+        key = diff.key
+        refreshed = object.__new__(FitScoreTable)
+        refreshed.archetype_name = self.archetype_name
+        refreshed.recipe = self.recipe
+        refreshed.normalization = self.normalization
+        scores_by_id = pd.Series(self.scores.to_numpy(), index=old_df[key].to_numpy())
+        refreshed.scores = pd.Series(scores_by_id.reindex(new_df[key].to_numpy()).to_numpy(), index=new_df.index)
+
+        recipe_touched = diff.changed_columns & set(self.recipe)
+        rescore_ids = diff.touched_ids if recipe_touched else diff.added_ids
+        if rescore_ids:
+            rows = new_df[new_df[key].isin(rescore_ids)]
+            refreshed.scores.loc[rows.index] = score_rows(rows, self.recipe, new_stats)
+        return refreshed
+
+
+def get_normalization_stats(df: pd.DataFrame) -> NormalizationStats:
+    """Returns the normalization bounds of a dataset, computed once per dataset."""
+    return get_dataset_artifact(df, "normalization_stats", NormalizationStats)
+
+
+def get_ecdf_table(df: pd.DataFrame, column: str) -> EcdfTable:
+    """Returns the ECDF lookup table of a numeric column of a dataset, computed once per dataset and column."""
+    return get_dataset_artifact(df, f"ecdf:{column}", lambda d: EcdfTable(d, column))
+
+
+def get_normalizer(df: pd.DataFrame, normalization: str = 'minmax') -> Union[NormalizationStats, EcdfNormalizer]:
+    """
+    Returns the normalization of a context dataset for a normalization mode.
+
+    Raises:
+        ValueError: If the mode is not one of NORMALIZATION_MODES.
+    """
+    if normalization == 'minmax':
+        return get_normalization_stats(df)
+    if normalization == 'ecdf':
+        return EcdfNormalizer(df)
+    raise ValueError(f"Unknown normalization '{normalization}'. Valid modes are: {list(NORMALIZATION_MODES)}")
+
+
+def get_fit_score_table(df: pd.DataFrame, archetype_name: str, recipe: Dict[str, float], normalization: str = 'minmax') -> FitScoreTable:
+    """Returns the fit-score table of an archetype over a dataset under a normalization mode, computed once per dataset."""
+    return get_dataset_artifact(df, f"fit_scores:{archetype_name}:{normalization}", lambda d: FitScoreTable(d, archetype_name, recipe, normalization))
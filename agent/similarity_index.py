@@ -0,0 +1,90 @@
+import copy
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from typing import Dict, List, Optional
+
+
+class SimilarityIndex:
+    """
+    A nearest-neighbour index over normalized player metric vectors ("players like X").
+
+    Each metric is min-max normalized over the full dataset (the same scale used by the
+    archetype fit scores) and optionally weighted, so that a metric with weight w contributes
+    w * (difference)^2 to the squared distance. The weighted vectors are stored in a KD-tree,
+    which is built once per dataset and answers k-nearest-neighbour queries without scanning
+    the full matrix.
+    """
+
+    def __init__(self, df: pd.DataFrame, metrics: List[str], weights: Optional[Dict[str, float]] = None):
+        """
+        Builds the index.
+
+        Args:
+            df: The full dataset. Rows are identified by their index labels.
+            metrics: The candidate metric columns. Missing or non-numeric columns are skipped.
+            weights: Optional per-metric weights (e.g. an archetype's key_metrics). Defaults to 1.0.
+        """
+        self.metrics = [m for m in dict.fromkeys(metrics) if m in df.columns and pd.api.types.is_numeric_dtype(df[m])]
+        if not self.metrics:
+            raise ValueError("None of the requested similarity metrics are present in the dataset.")
+
+        values = df[self.metrics].to_numpy(dtype=np.float64, copy=True)
+        # Missing stats are treated as a typical (median) value rather than as zero.
+        medians = np.nanmedian(values, axis=0)
+        nan_rows, nan_cols = np.where(np.isnan(values))
+        values[nan_rows, nan_cols] = np.take(np.nan_to_num(medians), nan_cols)
+
+        mins = values.min(axis=0)
+        ranges = values.max(axis=0) - mins
+        ranges[ranges == 0] = 1.0
+        weight_vector = np.array([(weights or {}).get(m, 1.0) for m in self.metrics], dtype=np.float64)
+
+        self.scale = np.sqrt(weight_vector) / ranges
+        self.offset = mins
+        self.vectors = (values - self.offset) * self.scale
+        self.labels = df.index
+        self.tree = cKDTree(self.vectors)
+
+    def query(self, row_label, k: int = 10) -> pd.DataFrame:
+        """
+        Finds the k players most similar to the player at `row_label`.
+
+        Args:
+            row_label: The index label of the reference player in the indexed dataset.
+            k: The number of neighbours to return (the reference player is excluded).
+
+        Returns:
+            A DataFrame indexed by the neighbours' row labels, ordered from most to least similar,
+            with a 'similarity_distance' column and one column per metric holding that metric's
+            share (0-1) of the squared distance.
+        """
+        position = self.labels.get_loc(row_label)
+        reference = self.vectors[position]
+        k = min(k + 1, len(self.labels))
+        distances, positions = self.tree.query(reference, k=k)
+        distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+
+        keep = positions != position
+        distances, positions = distances[keep], positions[keep]
+
+        squared_diffs = (self.vectors[positions] - reference) ** 2
+        totals = squared_diffs.sum(axis=1, keepdims=True)
+        shares = np.divide(squared_diffs, totals, out=np.zeros_like(squared_diffs), where=totals > 0)
+
+        result = pd.DataFrame(shares, index=self.labels[positions], columns=self.metrics)
+        result.insert(0, "similarity_distance", distances)
+        return result.head(k - 1)
+
+    def refresh(self, old_df: pd.DataFrame, new_df: pd.DataFrame, diff) -> Optional["SimilarityIndex"]:
+        """
+        Reuses this index for a new dataset version when none of its rows or metrics changed.
+
+        A KD-tree cannot be updated in place, so any change to the indexed players or metrics
+        invalidates it (returns None) and it is rebuilt lazily on the next query.
+        """
+        if not diff.rows_aligned or diff.changed_columns & set(self.metrics):
+            return None
+        refreshed = copy.copy(self)
+        refreshed.labels = new_df.index
+        return refreshed
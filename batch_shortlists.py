@@ -0,0 +1,222 @@
+# batch_shortlists.py
+"""
+Headless batch shortlist generator.
+
+Runs the non-LLM scouting core (archetype fit scoring, filtering and top-K ranking) for every
+archetype x cohort (e.g. league or position) combination in one job, fanning the archetypes
+out over a process pool and writing every shortlist to disk. This is the entry point for the
+weekly recruitment report; it does not need Streamlit session state or an OpenAI key.
+
+Usage (from the project root):
+    python batch_shortlists.py path/to/provider_export.csv --output-dir shortlists
+    python batch_shortlists.py data.csv --cohort-column primary_position --top-k 10 \
+        --archetypes "Winger" "Pressing Forward" --filters '[{"column": "age", "operator": "less_than", "value": 24}]'
+    python batch_shortlists.py data.csv --as-of 2025-03-01
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(PROJECT_ROOT)
+
+from agent.agent_core import ARCHETYPES, SYNONYM_LIBRARY, POSITION_GROUPINGS, _execute_new_search, _build_display_df
+from agent.scoring_tables import NORMALIZATION_MODES
+from utils.data_handler import process_uploaded_csv
+from utils.derived_features import materialize_derived_features
+
+# The dataset is loaded once per worker process (see _init_worker) instead of being
+# pickled and shipped with every task.
+_WORKER_DF: Optional[pd.DataFrame] = None
+
+
+def _slugify(value: Any) -> str:
+    """Turns an archetype or cohort name into a safe file name fragment."""
+    return "".join(c if c.isalnum() else "_" for c in str(value)).strip("_").lower() or "unknown"
+
+
+def _unique_slugs(values: List[Any]) -> Dict[Any, str]:
+    """
+    Maps each value to its file name fragment. Values whose slugs collide (e.g. '2. Bundesliga' and
+    '2 Bundesliga') get a short hash of the raw value appended, so no file overwrites another.
+    """
+    slugs = {value: _slugify(value) for value in values}
+    counts = Counter(slugs.values())
+    return {
+        value: f"{slug}_{hashlib.sha1(str(value).encode('utf-8')).hexdigest()[:6]}" if counts[slug] > 1 else slug
+        for value, slug in slugs.items()
+    }
+
+
+def build_archetype_shortlists(
+    full_df: pd.DataFrame,
+    archetype_name: str,
+    cohort_column: Optional[str] = "current_league",
+    top_k: int = 25,
+    filters: List[Dict[str, Any]] = None,
+    normalization: str = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Builds the top-K shortlist of one archetype for every cohort in the dataset.
+
+    The archetype is scored once over the full dataset (exactly as the chat agent's `new_search`
+    tool does, so fit scores are directly comparable with the app) and the ranked result is then
+    split by cohort.
+
+    Args:
+        full_df: The full, canonical player dataset.
+        archetype_name: The archetype to score, as named in archetypes.json.
+        cohort_column: The column to split shortlists by (e.g. 'current_league' or
+                       'primary_position'). If None, a single shortlist named 'all' is built.
+        top_k: The number of players to keep per cohort.
+        filters: Optional filters in the same format as the agent's tools.
+        normalization: 'minmax' or 'ecdf'; defaults to the archetype's (or the app's) normalization.
+
+    Returns:
+        A dictionary mapping each cohort value to its ranked shortlist DataFrame.
+    """
+    # Without cohorts only the overall top-K is written, so only those rows need to be taken and sorted.
+    ranked_df = _execute_new_search(full_df=full_df, archetype_name=archetype_name, filters=filters, normalization=normalization,
+                                    top_k=None if cohort_column else top_k)
+    used_cols = [f.get("column") for f in (filters or []) if f.get("column")]
+    if cohort_column:
+        used_cols.append(cohort_column)
+    display_df = _build_display_df(ranked_df, archetype_name, used_cols)
+
+    if not cohort_column:
+        return {"all": display_df.head(top_k)}
+    if cohort_column not in ranked_df.columns:
+        raise ValueError(f"Cohort column '{cohort_column}' not found in the dataset.")
+
+    # ranked_df is already sorted by fit score, so head() within each group is the cohort's top-K.
+    return {cohort: group.head(top_k) for cohort, group in display_df.groupby(cohort_column, sort=True)}
+
+
+def _init_worker(csv_path: str, as_of: Optional[datetime.date] = None) -> None:
+    """Process pool initializer: loads and canonicalizes the dataset once per worker."""
+    global _WORKER_DF
+    with open(csv_path, 'rb') as f:
+        _WORKER_DF = materialize_derived_features(process_uploaded_csv(f, SYNONYM_LIBRARY), POSITION_GROUPINGS, reference_date=as_of)
+
+
+def _run_archetype_job(archetype_name: str, archetype_slug: str, cohort_column: Optional[str], top_k: int, filters: List[Dict[str, Any]],
+                       output_dir: str, normalization: str = None) -> List[Dict[str, Any]]:
+    """Worker task: builds and writes all cohort shortlists for one archetype, returning an index of the files."""
+    shortlists = build_archetype_shortlists(_WORKER_DF, archetype_name, cohort_column, top_k, filters, normalization)
+    archetype_dir = os.path.join(output_dir, archetype_slug)
+    os.makedirs(archetype_dir, exist_ok=True)
+
+    index_rows = []
+    cohort_slugs = _unique_slugs(list(shortlists))
+    for cohort, shortlist_df in shortlists.items():
+        path = os.path.join(archetype_dir, f"{cohort_slugs[cohort]}.csv")
+        shortlist_df.to_csv(path, index=False)
+        index_rows.append({
+            "archetype": archetype_name,
+            "cohort": cohort,
+            "players": len(shortlist_df),
+            "top_player": shortlist_df['full_name'].iloc[0] if 'full_name' in shortlist_df.columns and not shortlist_df.empty else None,
+            "path": os.path.relpath(path, output_dir),
+        })
+    return index_rows
+
+
+def generate_shortlists(
+    csv_path: str,
+    output_dir: str,
+    archetypes: List[str] = None,
+    cohort_column: Optional[str] = "current_league",
+    top_k: int = 25,
+    filters: List[Dict[str, Any]] = None,
+    max_workers: int = None,
+    normalization: str = None,
+    as_of: Optional[datetime.date] = None
+) -> pd.DataFrame:
+    """
+    Generates shortlists for every archetype x cohort combination and writes them to disk.
+
+    Each archetype is one task in a process pool. Shortlists are written to
+    `<output_dir>/<archetype>/<cohort>.csv` (names that would collide get a short hash suffix)
+    and an `index.csv` summarizing all of them is written to `output_dir`.
+
+    Args:
+        csv_path: Path to the provider export (any header naming covered by the synonym library).
+        output_dir: Directory the shortlists are written to. Created if missing.
+        archetypes: The archetypes to run. Defaults to every archetype in archetypes.json.
+        cohort_column: The column to split shortlists by, or None for one shortlist per archetype.
+        top_k: The number of players to keep per cohort.
+        filters: Optional filters applied to every shortlist.
+        max_workers: The size of the process pool. Defaults to the number of CPUs.
+        normalization: 'minmax' or 'ecdf' for every archetype; defaults to each archetype's normalization.
+        as_of: The date the export represents, for date-dependent columns such as contract_months_left.
+               Defaults to today.
+
+    Returns:
+        The index DataFrame (one row per written shortlist).
+
+    Raises:
+        ValueError: If an unknown archetype is requested.
+    """
+    archetypes = archetypes or list(ARCHETYPES.keys())
+    unknown = [a for a in archetypes if a not in ARCHETYPES]
+    if unknown:
+        raise ValueError(f"Unknown archetype(s): {unknown}. Valid archetypes are: {list(ARCHETYPES.keys())}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    index_rows = []
+    archetype_slugs = _unique_slugs(archetypes)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(csv_path, as_of)) as executor:
+        futures = {
+            executor.submit(_run_archetype_job, archetype, archetype_slugs[archetype], cohort_column, top_k, filters, output_dir, normalization): archetype
+            for archetype in archetypes
+        }
+        for future in as_completed(futures):
+            rows = future.result()
+            index_rows.extend(rows)
+            print(f"DIAGNOSTIC: Wrote {len(rows)} shortlist(s) for archetype '{futures[future]}'.")
+
+    index_df = pd.DataFrame(index_rows, columns=["archetype", "cohort", "players", "top_player", "path"])
+    index_df = index_df.sort_values(["archetype", "cohort"]).reset_index(drop=True)
+    index_df.to_csv(os.path.join(output_dir, "index.csv"), index=False)
+    return index_df
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate archetype shortlists per cohort without the chat UI.")
+    parser.add_argument("csv_path", help="Path to the player data CSV export.")
+    parser.add_argument("--output-dir", default="shortlists", help="Directory to write the shortlists to.")
+    parser.add_argument("--archetypes", nargs="+", default=None, help="Archetypes to run (default: all).")
+    parser.add_argument("--cohort-column", default="current_league", help="Column to split shortlists by, or 'none'.")
+    parser.add_argument("--top-k", type=int, default=25, help="Number of players per shortlist.")
+    parser.add_argument("--filters", default=None, help="JSON list of filters, in the agent's filter format.")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count).")
+    parser.add_argument("--normalization", choices=NORMALIZATION_MODES, default=None,
+                        help="Metric normalization of the fit scores (default: per archetype).")
+    parser.add_argument("--as-of", type=datetime.date.fromisoformat, default=None,
+                        help="Date the export represents, YYYY-MM-DD, for date-dependent columns (default: today).")
+    args = parser.parse_args(argv)
+
+    index_df = generate_shortlists(
+        csv_path=args.csv_path,
+        output_dir=args.output_dir,
+        archetypes=args.archetypes,
+        cohort_column=None if args.cohort_column.lower() == "none" else args.cohort_column,
+        top_k=args.top_k,
+        filters=json.loads(args.filters) if args.filters else None,
+        max_workers=args.workers,
+        normalization=args.normalization,
+        as_of=args.as_of,
+    )
+    print(f"--- Wrote {len(index_df)} shortlists to '{args.output_dir}' ---")
+
+
+if __name__ == "__main__":
+    main()
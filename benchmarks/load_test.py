@@ -0,0 +1,225 @@
+# benchmarks/load_test.py
+"""
+Concurrent-session load test of the Streamlit app.
+
+Drives main.py headlessly through Streamlit's app-testing API in many simulated sessions at once.
+Every session replays the same scripted scouting conversation: dataset upload, logbook upload,
+new_search, refinement, plot, logbook entry and an Analyst's Note. The OpenAI client is replaced
+by a local scripted stand-in that answers after a configurable latency, so no key or network is
+needed and the numbers reflect the app itself plus the simulated model time.
+
+For each session count it reports rerun latency percentiles per step, throughput (reruns per
+second across all sessions) and memory per session (as measured by the app's memory accountant,
+and as resident-set growth of the process).
+
+Usage (from the project root):
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --sessions 1 4 16 --llm-latency 0.5 --csv new_database.csv
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "load-test")
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(PROJECT_ROOT)
+
+LOGBOOK_NAME = "wellness_log"
+
+# The scripted conversation: (step label, chat query, tool calls the scripted model returns).
+CHAT_STEPS = [
+    ("new_search", "find me pressing forwards", [("new_search", {"archetype_name": "Pressing Forward"})]),
+    ("refinement", "only the ones under 27, best pressers first", [("filter_and_sort", {
+        "filters": [{"column": "age", "operator": "less_than", "value": 27}], "sort_by": "pressures_p90", "sort_ascending": False})]),
+    ("plot", "plot pressures against goals", [("create_plot", {"x_axis": "pressures_p90", "y_axis": "goals_p90", "title": "Pressures vs goals"})]),
+    ("logbook_entry", "add a log entry to the wellness log: 8 hours sleep", [("add_log_entry", {
+        "logbook_name": LOGBOOK_NAME, "data": {"date": "2025-01-01", "sleep_hours": 8}})]),
+]
+_TOOL_CALLS_BY_QUERY = {query: calls for _, query, calls in CHAT_STEPS}
+
+
+class ScriptedOpenAI:
+    """
+    A local stand-in for `openai.OpenAI`: tool-selection calls return the scripted tool calls of the
+    query, every other call a short text, each after `latency` seconds (+/- `jitter`).
+    """
+
+    latency = 0.3
+    jitter = 0.1
+
+    def __init__(self, *args, **kwargs):
+        self.chat = types.SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if kwargs.get("tools"):
+            query = kwargs["messages"][-1]["content"]
+            calls = _TOOL_CALLS_BY_QUERY.get(query, [("new_search", {"archetype_name": "Winger"})])
+            tool_calls = [types.SimpleNamespace(id=f"call_{i}", function=types.SimpleNamespace(name=name, arguments=json.dumps(args)))
+                          for i, (name, args) in enumerate(calls)]
+            message = types.SimpleNamespace(content=None, tool_calls=tool_calls)
+        elif kwargs.get("max_tokens") == 10:
+            message = types.SimpleNamespace(content="refinement", tool_calls=None)
+        else:
+            message = types.SimpleNamespace(content="Done. This is a scripted answer.", tool_calls=None)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def _install_fakes(scratch_dir: str) -> None:
+    """Routes every OpenAI client, the snapshot store and the note cache of the app to local stand-ins."""
+    import openai
+    openai.OpenAI = ScriptedOpenAI
+
+    # Keep the load test's uploads and notes out of the real snapshot store and note cache.
+    import utils.snapshot_store as snapshot_store
+    snapshot_store.SNAPSHOT_STORE_DIR = os.path.join(scratch_dir, "snapshots")
+    import insights.note_cache as note_cache
+    note_cache._CACHE = note_cache.NoteCache(os.path.join(scratch_dir, "note_cache.sqlite3"))
+
+
+def _rss_bytes() -> int:
+    """Returns the resident set size of this process (Linux), or 0 if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _session_memory_mb(at) -> float:
+    """Reads this session's footprint from the app's memory diagnostics panel."""
+    for metric in at.sidebar.metric:
+        if metric.label == "This session":
+            return float(metric.value.split()[0])
+    return float("nan")
+
+
+def settle(at, timeout: float) -> None:
+    """Waits until the session's background tasks (uploads, notes) have finished and reruns to deliver them."""
+    from utils.background_tasks import session_tasks
+    deadline = time.perf_counter() + timeout
+    while tasks := session_tasks(at.session_state["task_session_key"]):
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"Background tasks still running after {timeout}s: {[task.label for task in tasks]}")
+        if all(task.done() for task in tasks):
+            at.run()
+        else:
+            time.sleep(0.01)
+
+
+def run_session(csv_bytes: bytes, logbook_bytes: bytes, timeout: float) -> Tuple[List[Tuple[str, float]], float, List[str]]:
+    """
+    Replays the scripted conversation in one simulated session.
+
+    Returns:
+        A tuple of ([(step label, rerun seconds)], session memory in MB, [exceptions raised by the app]).
+    """
+    from streamlit.testing.v1 import AppTest
+
+    timings = []
+    at = AppTest.from_file(os.path.join(PROJECT_ROOT, "main.py"), default_timeout=timeout)
+
+    def timed(label, action):
+        # A step lasts until its background work has been delivered, like a scout waiting for the result.
+        start = time.perf_counter()
+        action()
+        settle(at, timeout)
+        timings.append((label, time.perf_counter() - start))
+
+    timed("first_load", at.run)
+    at.sidebar.file_uploader[0].set_value(("players.csv", csv_bytes, "text/csv"))
+    timed("upload", at.run)
+    at.sidebar.file_uploader(key="logbook_uploader").set_value([(f"{LOGBOOK_NAME}.csv", logbook_bytes, "text/csv")])
+    timed("logbook_upload", at.run)
+    for label, query, _ in CHAT_STEPS:
+        timed(label, lambda: at.chat_input[0].set_value(query).run())
+    at.selectbox(key="selected_player_for_note").select_index(0)
+    timed("note_select", at.run)
+    note_button = next(b for b in at.button if b.label == "Generate Analyst's Note")
+    timed("analyst_note", lambda: note_button.click().run())
+
+    errors = [str(e.value) for e in at.exception]
+    return timings, _session_memory_mb(at), errors
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_load_level(sessions: int, csv_bytes: bytes, logbook_bytes: bytes, timeout: float) -> Dict:
+    """Runs `sessions` simulated sessions concurrently and aggregates their measurements."""
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="load-session") as pool:
+        results = list(pool.map(lambda _: run_session(csv_bytes, logbook_bytes, timeout), range(sessions)))
+    wall = time.perf_counter() - start
+    rss_growth = max(_rss_bytes() - rss_before, 0)
+
+    by_step: Dict[str, List[float]] = {}
+    for timings, _, _ in results:
+        for label, seconds in timings:
+            by_step.setdefault(label, []).append(seconds)
+    all_reruns = [seconds for values in by_step.values() for seconds in values]
+    return {
+        "sessions": sessions,
+        "wall": wall,
+        "by_step": by_step,
+        "all": all_reruns,
+        "throughput": len(all_reruns) / wall,
+        "session_mb": statistics.mean(mb for _, mb, _ in results),
+        "rss_mb_per_session": rss_growth / sessions / (1024 * 1024),
+        "errors": [err for _, _, errors in results for err in errors],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit app with many concurrent simulated sessions.")
+    parser.add_argument("--csv", default=os.path.join(PROJECT_ROOT, "new_database.csv"), help="Player dataset uploaded by every session.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrent session counts to test.")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Mean latency of every scripted LLM call (s).")
+    parser.add_argument("--llm-jitter", type=float, default=0.1, help="Uniform +/- jitter on the LLM latency (s).")
+    parser.add_argument("--timeout", type=float, default=120, help="Timeout of a single rerun (s).")
+    args = parser.parse_args()
+
+    ScriptedOpenAI.latency, ScriptedOpenAI.jitter = args.llm_latency, args.llm_jitter
+    _install_fakes(tempfile.mkdtemp(prefix="load_test_"))
+
+    from utils.logbook_handler import create_logbook_template
+    with open(args.csv, "rb") as f:
+        csv_bytes = f.read()
+    logbook_bytes = create_logbook_template(LOGBOOK_NAME, [{"name": "sleep_hours", "type": "Number"}])
+
+    # Warm-up: module imports and per-dataset tables are built once per process, not per session.
+    run_session(csv_bytes, logbook_bytes, args.timeout)
+
+    levels = [run_load_level(n, csv_bytes, logbook_bytes, args.timeout) for n in args.sessions]
+
+    print(f"\n{'sessions':>8}{'p50 (s)':>10}{'p90 (s)':>10}{'p99 (s)':>10}{'reruns/s':>10}{'MB/session':>12}{'RSS MB/session':>16}{'errors':>8}")
+    for level in levels:
+        values = level["all"]
+        print(f"{level['sessions']:>8}{_percentile(values, 50):>10.3f}{_percentile(values, 90):>10.3f}{_percentile(values, 99):>10.3f}"
+              f"{level['throughput']:>10.2f}{level['session_mb']:>12.2f}{level['rss_mb_per_session']:>16.2f}{len(level['errors']):>8}")
+
+    print("\nRerun latency by step (p50 / p90, seconds):")
+    steps = list(levels[0]["by_step"])
+    print(f"{'step':<16}" + "".join(f"{str(level['sessions']) + ' sess.':>18}" for level in levels))
+    for step in steps:
+        row = "".join(f"{_percentile(level['by_step'][step], 50):>9.3f}/{_percentile(level['by_step'][step], 90):<8.3f}" for level in levels)
+        print(f"{step:<16}{row}")
+
+    errors = [err for level in levels for err in level["errors"]]
+    if errors:
+        print(f"\n{len(errors)} app exception(s), first: {errors[0]}")
+
+
+if __name__ == "__main__":
+    main()
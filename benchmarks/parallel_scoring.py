@@ -0,0 +1,116 @@
+# benchmarks/parallel_scoring.py
+"""
+Scaling benchmark of parallel fit scoring and percentile ranking, from 1 to N cores.
+
+Builds a synthetic multi-million-row dataset by tiling a provider export (with small noise on
+every metric so rows are distinct), then times, for each worker count:
+  - fit scoring of one archetype over the whole dataset (as done once per archetype and dataset),
+  - percentile ranking of every numeric column against all players and within leagues,
+and compares them with the single-process pandas path the app uses below the dispatch threshold
+(results must be identical). Process start-up and the one-off copy of the metric columns into
+shared memory are excluded from the timings (they happen once per server and dataset) and are
+reported separately.
+
+Usage (from the project root):
+    python benchmarks/parallel_scoring.py
+    python benchmarks/parallel_scoring.py --rows 5000000 --workers 1 8 16 32 --archetype "Pressing Forward" --normalization ecdf
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(PROJECT_ROOT)
+
+import agent.parallel_scoring as parallel_scoring
+from agent.agent_core import ARCHETYPES, SYNONYM_LIBRARY
+from agent.scoring_tables import score_rows, get_normalizer, NORMALIZATION_MODES
+from utils.data_handler import process_uploaded_csv
+
+
+def build_dataset(csv_path: str, rows: int, seed: int = 0) -> pd.DataFrame:
+    """Tiles a provider export up to `rows` rows, jittering every float metric by up to +/-5%."""
+    with open(csv_path, 'rb') as f:
+        base = process_uploaded_csv(f, SYNONYM_LIBRARY)
+    df = base.iloc[np.resize(np.arange(len(base)), rows)].reset_index(drop=True)
+    rng = np.random.default_rng(seed)
+    for column in df.select_dtypes(include='float').columns:
+        df[column] = df[column] * rng.uniform(0.95, 1.05, size=rows)
+    return df
+
+
+def best_time(fn: Callable, repeats: int) -> float:
+    """Returns the median wall time of `repeats` calls."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    default_workers = sorted({1, 2, 4, 8, 16, 32, os.cpu_count() or 1})
+    parser = argparse.ArgumentParser(description="Benchmark parallel fit scoring and percentile ranking across core counts.")
+    parser.add_argument("--csv", default=os.path.join(PROJECT_ROOT, "new_database.csv"), help="Provider export to tile.")
+    parser.add_argument("--rows", type=int, default=2000000, help="Rows of the synthetic dataset.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[w for w in default_workers if w <= (os.cpu_count() or 1)],
+                        help="Worker counts to test.")
+    parser.add_argument("--archetype", default="Winger", choices=list(ARCHETYPES), help="Archetype to score.")
+    parser.add_argument("--normalization", default="minmax", choices=NORMALIZATION_MODES, help="Normalization of the fit score.")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per measurement (median reported).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = build_dataset(args.csv, args.rows)
+    numeric_df = df.select_dtypes(include='number')
+    leagues = df['current_league'].astype('category')
+    recipe = ARCHETYPES[args.archetype]['key_metrics']
+    stats = get_normalizer(df, args.normalization)
+    if args.normalization == 'ecdf':
+        for metric in recipe:
+            stats.sorted_values(metric)  # build the ECDF tables once, as the app does per dataset
+    print(f"Dataset: {len(df):,} rows, {numeric_df.shape[1]} numeric columns (built in {time.perf_counter() - start:.1f}s); "
+          f"{os.cpu_count()} cores available.")
+
+    # Single-process baseline: the pandas path used below PARALLEL_SCORING_MIN_ROWS.
+    parallel_scoring.PARALLEL_SCORING_MIN_ROWS = 0
+    serial_scores = score_rows(df, recipe, stats)
+    serial_rank_all = np.rint(numeric_df.rank(pct=True).to_numpy(dtype=np.float64) * 100)
+    serial_rank_league = np.rint(numeric_df.groupby(leagues, observed=True).rank(pct=True).to_numpy(dtype=np.float64) * 100)
+    serial_score_s = best_time(lambda: score_rows(df, recipe, stats), args.repeats)
+    serial_rank_s = best_time(lambda: numeric_df.rank(pct=True), 1)
+    serial_league_s = best_time(lambda: numeric_df.groupby(leagues, observed=True).rank(pct=True), 1)
+
+    start = time.perf_counter()
+    parallel_scoring.get_shared_metric_block(df)
+    parallel_scoring.parallel_score(df, recipe, stats, workers=args.workers[0])
+    print(f"One-off: process start-up and copy of {len(recipe)} metric columns to shared memory: {time.perf_counter() - start:.2f}s.\n")
+
+    print(f"{'workers':>8}{'score (s)':>17}{'speedup':>9}{'rank all (s)':>14}{'speedup':>9}{'rank league (s)':>17}{'speedup':>9}  identical")
+    print(f"{'pandas':>8}{serial_score_s:>17.3f}{'':>9}{serial_rank_s:>14.3f}{'':>9}{serial_league_s:>17.3f}")
+    for workers in args.workers:
+        parallel_scoring.parallel_score(df, recipe, stats, workers=workers)  # start the pool at this size
+        scores = parallel_scoring.parallel_score(df, recipe, stats, workers=workers)
+        packed = parallel_scoring.parallel_percentile_ranks(numeric_df, workers=workers)
+        packed_league = parallel_scoring.parallel_percentile_ranks(numeric_df, leagues, workers=workers)
+        identical = (np.array_equal(scores.to_numpy(), serial_scores.to_numpy())
+                     and np.array_equal(np.where(packed == 255, np.nan, packed), serial_rank_all, equal_nan=True)
+                     and np.array_equal(np.where(packed_league == 255, np.nan, packed_league), serial_rank_league, equal_nan=True))
+
+        score_s = best_time(lambda: parallel_scoring.parallel_score(df, recipe, stats, workers=workers), args.repeats)
+        rank_s = best_time(lambda: parallel_scoring.parallel_percentile_ranks(numeric_df, workers=workers), 1)
+        league_s = best_time(lambda: parallel_scoring.parallel_percentile_ranks(numeric_df, leagues, workers=workers), 1)
+        print(f"{workers:>8}{score_s:>17.3f}{serial_score_s / score_s:>8.1f}x{rank_s:>14.3f}{serial_rank_s / rank_s:>8.1f}x"
+              f"{league_s:>17.3f}{serial_league_s / league_s:>8.1f}x  {identical}")
+
+
+if __name__ == "__main__":
+    main()
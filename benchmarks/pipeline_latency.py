@@ -0,0 +1,122 @@
+# benchmarks/pipeline_latency.py
+"""
+End-to-end latency of ScoutAgent.process_query: concurrent pipeline vs. sequential baseline.
+
+The OpenAI client is replaced by a local fake backend that answers every call after a fixed,
+configurable latency (tool selection, intent classification and the confirmation message), so
+the benchmark measures the pipeline's structure rather than network noise. The baseline runs
+exactly the same stages with an inline executor, i.e. strictly one after another.
+
+Usage (from the project root):
+    python benchmarks/pipeline_latency.py
+    python benchmarks/pipeline_latency.py --csv new_database.csv --rounds 5 --tool-latency 0.8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import types
+from concurrent.futures import Future
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(PROJECT_ROOT)
+
+from agent.agent_core import ScoutAgent, SYNONYM_LIBRARY
+from utils.data_handler import process_uploaded_csv
+
+# (query, tool the fake model picks, its arguments). The first turn has no current view.
+SCRIPTED_TURNS = [
+    ("find me a winger", "new_search", {"archetype_name": "Winger"}),
+    ("only players under 24", "filter_and_sort", {"filters": [{"column": "age", "operator": "less_than", "value": 24}]}),
+    ("sort them by goals", "filter_and_sort", {"sort_by": "goals_p90", "sort_ascending": False}),
+]
+
+
+class FakeChatBackend:
+    """Stands in for `OpenAI().chat.completions`, answering each kind of call after a fixed latency."""
+
+    def __init__(self, tool_latency: float, classify_latency: float, summary_latency: float):
+        self.tool_latency = tool_latency
+        self.classify_latency = classify_latency
+        self.summary_latency = summary_latency
+        self.next_tool_call = None
+
+    def create(self, **kwargs):
+        if kwargs.get("tools"):
+            time.sleep(self.tool_latency)
+            name, args = self.next_tool_call
+            tool_call = types.SimpleNamespace(id="call_0", function=types.SimpleNamespace(name=name, arguments=json.dumps(args)))
+            message = types.SimpleNamespace(content=None, tool_calls=[tool_call])
+        elif kwargs.get("max_tokens") == 10:
+            time.sleep(self.classify_latency)
+            message = types.SimpleNamespace(content="refinement", tool_calls=None)
+        else:
+            time.sleep(self.summary_latency)
+            message = types.SimpleNamespace(content="Done.", tool_calls=None)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+class InlineExecutor:
+    """An executor that runs every submitted call immediately, turning the pipeline back into a sequence."""
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def run_conversation(agent: ScoutAgent, backend: FakeChatBackend, full_df) -> list:
+    """Runs the scripted conversation once and returns the latency of every turn in seconds."""
+    history, last_result_df, active_archetype, latencies = [], None, None, []
+    for query, tool_name, tool_args in SCRIPTED_TURNS:
+        backend.next_tool_call = (tool_name, tool_args)
+        start = time.perf_counter()
+        response = agent.process_query(query, history, full_df, last_result_df, active_archetype)
+        latencies.append(time.perf_counter() - start)
+        if response.get("raw_dataframe") is not None:
+            last_result_df = response["raw_dataframe"]
+        if tool_name == "new_search":
+            active_archetype = tool_args["archetype_name"]
+        history += [{"role": "user", "content": query}, {"role": "assistant", "content": response["summary_text"]}]
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare process_query latency of the concurrent pipeline and a sequential baseline.")
+    parser.add_argument("--csv", default=os.path.join(PROJECT_ROOT, "new_database.csv"), help="Player dataset to search.")
+    parser.add_argument("--rounds", type=int, default=3, help="Number of times the scripted conversation is run per mode.")
+    parser.add_argument("--tool-latency", type=float, default=0.8, help="Fake latency of the tool-selection call (s).")
+    parser.add_argument("--classify-latency", type=float, default=0.4, help="Fake latency of the intent classifier (s).")
+    parser.add_argument("--summary-latency", type=float, default=0.6, help="Fake latency of the confirmation message (s).")
+    args = parser.parse_args()
+
+    with open(args.csv, "rb") as f:
+        full_df = process_uploaded_csv(f, SYNONYM_LIBRARY)
+
+    backend = FakeChatBackend(args.tool_latency, args.classify_latency, args.summary_latency)
+    agent = ScoutAgent()
+    agent.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=backend))
+    concurrent_executor = agent.pipeline_executor
+
+    results = {}
+    for mode, executor in [("sequential", InlineExecutor()), ("concurrent", concurrent_executor)]:
+        agent.pipeline_executor = executor
+        run_conversation(agent, backend, full_df)  # warm-up: per-dataset tables are built once
+        rounds = [run_conversation(agent, backend, full_df) for _ in range(args.rounds)]
+        results[mode] = [statistics.mean(turn) for turn in zip(*rounds)]
+
+    print(f"\n{'turn':<28}{'sequential (s)':>16}{'concurrent (s)':>16}{'speed-up':>10}")
+    for (query, _, _), seq, conc in zip(SCRIPTED_TURNS, results["sequential"], results["concurrent"]):
+        print(f"{query:<28}{seq:>16.3f}{conc:>16.3f}{seq / conc:>9.2f}x")
+    total_seq, total_conc = sum(results["sequential"]), sum(results["concurrent"])
+    print(f"{'conversation total':<28}{total_seq:>16.3f}{total_conc:>16.3f}{total_seq / total_conc:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
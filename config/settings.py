@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Get the directory of the current script
@@ -18,4 +19,75 @@ DATABASE_PATH = os.path.join(BASE_DIR, 'database', 'sample_data.csv')
 ARCHETYPES_PATH = os.path.join(BASE_DIR, 'database', 'archetypes.json')
 SYNONYM_LIBRARY_PATH = os.path.join(BASE_DIR, 'database', 'nlu_synonym_library.json')
 NLU_MAPPINGS_PATH = os.path.join(BASE_DIR, 'database', 'nlu_mappings.json')
-INSIGHTS_PERSONA_PATH = os.path.join(BASE_DIR, 'database', 'insight_persona.md')
\ No newline at end of file
+INSIGHTS_PERSONA_PATH = os.path.join(BASE_DIR, 'database', 'insight_persona.md')
+
+# Chat rendering: only the most recent messages are rendered in full on each rerun,
+# older ones collapse to summaries that are expanded on demand.
+CHAT_RENDER_WINDOW = 6
+# Number of table rows stored (and displayed) with each chat message.
+CHAT_TABLE_PAGE_ROWS = 25
+
+# Age band edges for "compare against players of the same age" percentile cohorts:
+# [21, 24, 28, 31] -> <21, 21-23, 24-27, 28-30, 31+
+PERCENTILE_AGE_BAND_EDGES = [21, 24, 28, 31]
+
+# Percentile at which a player counts as excelling in a foreign archetype's primary metric
+# (the "WOW" conceptual anomaly of the Analyst's Note and the surprising-profiles search).
+ANOMALY_PERCENTILE_THRESHOLD = 90
+
+# Local, versioned store of uploaded dataset snapshots (player time series for trend columns).
+SNAPSHOT_STORE_DIR = os.path.join(BASE_DIR, 'database', 'snapshots')
+# Number of most recent snapshots averaged by the rolling_avg_<metric> trend columns.
+TREND_ROLLING_WINDOW = 5
+
+# Chat context sent to the model: the most recent messages verbatim, older turns compacted into a
+# state summary, within a per-call token budget (the intent classifier gets a smaller one).
+CONTEXT_RECENT_MESSAGES = 6
+CONTEXT_HISTORY_TOKEN_BUDGET = 1500
+INTENT_CONTEXT_TOKEN_BUDGET = 400
+
+# Threads shared by all sessions for the concurrent LLM calls of one agent query
+# (speculative tool selection, intent classification, confirmation message).
+AGENT_PIPELINE_WORKERS = 8
+
+# Memory accounting: every session must fit SESSION_MEMORY_BUDGET_MB, and all sessions plus the shared
+# datasets must fit PROCESS_MEMORY_BUDGET_MB (each session gets a fair share when that is smaller).
+# Over budget, the oldest history is evicted: "spill" writes chat tables/charts to MEMORY_SPILL_DIR, "drop" discards them.
+SESSION_MEMORY_BUDGET_MB = 200
+PROCESS_MEMORY_BUDGET_MB = 4000
+MEMORY_EVICTION_MODE = "spill"
+MEMORY_SPILL_DIR = os.path.join(tempfile.gettempdir(), "1stscout_spill")
+# Sessions not seen for this long no longer count towards the process budget.
+MEMORY_SESSION_IDLE_SECONDS = 1800
+
+# Persistent Analyst's Note cache, shared by all sessions and bounded to NOTE_CACHE_MAX_MB of note text
+# (least recently used notes are evicted first). After every new_search, the notes of the top
+# NOTE_PREWARM_TOP_N players are generated in the background by NOTE_PREWARM_WORKERS threads.
+NOTE_CACHE_PATH = os.path.join(BASE_DIR, 'database', 'note_cache.sqlite3')
+NOTE_CACHE_MAX_MB = 50
+NOTE_PREWARM_TOP_N = 5
+NOTE_PREWARM_WORKERS = 2
+
+# Background tasks (dataset ingest, logbook loading, Analyst's Notes) run off the Streamlit script thread:
+# I/O-bound jobs on BACKGROUND_THREAD_WORKERS threads, CPU-bound parsing on BACKGROUND_PROCESS_WORKERS
+# processes (0 runs it in the job's thread). Their progress is refreshed every BACKGROUND_POLL_SECONDS,
+# and a job finishing within BACKGROUND_INLINE_WAIT_SECONDS (e.g. a cached note) is shown without a rerun.
+BACKGROUND_THREAD_WORKERS = 8
+BACKGROUND_PROCESS_WORKERS = 2
+BACKGROUND_POLL_SECONDS = 0.5
+BACKGROUND_INLINE_WAIT_SECONDS = 0.2
+
+# Parallel scoring: datasets of at least PARALLEL_SCORING_MIN_ROWS rows (0 disables it) have their fit
+# scores and percentile ranks computed by PARALLEL_SCORING_WORKERS processes (0 = every core) over a
+# shared-memory copy of the numeric columns, in row shards of at most PARALLEL_SCORING_SHARD_ROWS rows.
+PARALLEL_SCORING_MIN_ROWS = 1000000
+PARALLEL_SCORING_WORKERS = 0
+PARALLEL_SCORING_SHARD_ROWS = 250000
+
+# A chat search over a dataset of at least PARALLEL_SCORING_MIN_ROWS rows returns only its
+# LARGE_SEARCH_TOP_K best-ranked players: only they are taken from the dataset and sorted.
+LARGE_SEARCH_TOP_K = 1000
+
+# Normalization of metrics in fit scores when neither the query nor the archetype (its optional
+# "normalization" key in archetypes.json) chooses one: 'minmax' or 'ecdf' (percentile of the dataset).
+DEFAULT_NORMALIZATION = 'minmax'
\ No newline at end of file
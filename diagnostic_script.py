@@ -1,29 +1,186 @@
 # diagnostic_script.py
-import pandas as pd
+"""
+Streaming profiler for provider CSV exports.
+
+Reads only the header and a bounded sample of chunks of a file, however large it is, and reports
+what onboarding it would look like: how its headers map onto the canonical schema through
+nlu_synonym_library.json, the inferred dtype, null rate and cardinality of every column, and the
+projected in-memory footprint of the full file with default and with compact dtypes. When the
+sample covers the whole file, every figure is exact; otherwise the row count and footprint are
+extrapolated from the sample's bytes per row.
+
+Usage (from the project root):
+    python diagnostic_script.py path/to/provider_export.csv
+    python diagnostic_script.py export.csv --chunk-size 50000 --sample-chunks 2 --json profile.json
+"""
+import argparse
+import json
 import os
+import sys
+import time
+from typing import Any, Dict, Tuple
+
+import pandas as pd
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(PROJECT_ROOT)
+
+from config.settings import SYNONYM_LIBRARY_PATH
+from utils.data_handler import build_reverse_synonym_map, map_columns_to_canonical, suggest_compact_dtype
+
+_MB = 1024 * 1024
+
+
+def read_sample(csv_path: str, chunk_size: int, sample_chunks: int) -> Tuple[pd.DataFrame, bool]:
+    """
+    Reads the first `sample_chunks` chunks of `chunk_size` rows of a CSV file.
+
+    Returns:
+        A tuple of (sampled rows, whether the sample is the entire file).
+    """
+    chunks = []
+    with pd.read_csv(csv_path, chunksize=chunk_size, low_memory=False) as reader:
+        for chunk in reader:
+            chunks.append(chunk)
+            if len(chunks) == sample_chunks:
+                break
+    # A short last chunk means the file ended inside the sample; no extra chunk is read to find out.
+    # A file that ends exactly on the sample's last row is reported as incomplete (its row count is estimated).
+    is_complete = len(chunks) < sample_chunks or len(chunks[-1]) < chunk_size
+    if not chunks:
+        return pd.DataFrame(), True
+    return pd.concat(chunks, ignore_index=True), is_complete
+
+
+def estimate_row_count(csv_path: str, sampled_rows: int) -> int:
+    """Extrapolates the number of data rows of a file from the byte size of its header and first rows."""
+    with open(csv_path, 'rb') as f:
+        header_bytes = len(f.readline())
+        sample_bytes = sum(len(f.readline()) for _ in range(sampled_rows))
+    if not sample_bytes:
+        return 0
+    return round((os.path.getsize(csv_path) - header_bytes) * sampled_rows / sample_bytes)
+
+
+def profile_columns(sample: pd.DataFrame, reverse_synonym_map: Dict[str, str]) -> pd.DataFrame:
+    """
+    Profiles every column of a sample.
+
+    Returns:
+        One row per source column: its canonical name (or None if unmapped), inferred dtype,
+        null rate, number of distinct values, suggested compact dtype, and bytes per row under
+        the inferred and the compact dtype.
+    """
+    canonical_names, mapped, _ = map_columns_to_canonical(list(sample.columns), reverse_synonym_map)
+    rows = len(sample) or 1
+    records = []
+    for original, canonical in zip(sample.columns, canonical_names):
+        column = sample[original]
+        compact_dtype = suggest_compact_dtype(column)
+        try:
+            compact_bytes = column.astype(compact_dtype).memory_usage(deep=True, index=False)
+        except (TypeError, ValueError):
+            compact_dtype, compact_bytes = str(column.dtype), column.memory_usage(deep=True, index=False)
+        records.append({
+            'column': original,
+            'canonical': canonical if original in mapped else None,
+            'dtype': str(column.dtype),
+            'null_pct': round(100 * column.isna().mean(), 1) if len(column) else 0.0,
+            'distinct': int(column.nunique()),
+            'compact_dtype': compact_dtype,
+            'bytes_per_row': column.memory_usage(deep=True, index=False) / rows,
+            'compact_bytes_per_row': compact_bytes / rows,
+        })
+    return pd.DataFrame.from_records(records)
+
+
+def build_profile(csv_path: str, synonym_library: Dict[str, Any], chunk_size: int = 20000, sample_chunks: int = 5) -> Dict[str, Any]:
+    """
+    Profiles a CSV file from a bounded sample.
+
+    Args:
+        csv_path: The provider export to profile.
+        synonym_library: The loaded JSON from nlu_synonym_library.json.
+        chunk_size: Rows per chunk read.
+        sample_chunks: The maximum number of chunks read.
+
+    Returns:
+        A dictionary with the file summary, the column profile (a DataFrame) and the synonym coverage.
+    """
+    sample, is_complete = read_sample(csv_path, chunk_size, sample_chunks)
+    total_rows = len(sample) if is_complete else estimate_row_count(csv_path, len(sample))
+    reverse_synonym_map = build_reverse_synonym_map(synonym_library)
+    columns = profile_columns(sample, reverse_synonym_map)
+
+    mapped = columns.dropna(subset=['canonical'])
+    duplicated = mapped[mapped['canonical'].duplicated(keep=False)]
+    canonical_fields = list(synonym_library.get("synonym_library", {}))
+    return {
+        'file': csv_path,
+        'file_mb': os.path.getsize(csv_path) / _MB,
+        'sampled_rows': len(sample),
+        'total_rows': total_rows,
+        'is_exact': is_complete,
+        'columns': columns,
+        'coverage': {
+            'mapped': len(mapped),
+            'total': len(columns),
+            'unmapped_columns': columns.loc[columns['canonical'].isna(), 'column'].tolist(),
+            'missing_canonical_fields': [c for c in canonical_fields if c not in set(mapped['canonical'])],
+            'duplicate_mappings': duplicated.groupby('canonical')['column'].apply(list).to_dict(),
+        },
+        'projected_mb': columns['bytes_per_row'].sum() * total_rows / _MB,
+        'projected_compact_mb': columns['compact_bytes_per_row'].sum() * total_rows / _MB,
+    }
+
+
+def print_profile(profile: Dict[str, Any]) -> None:
+    """Prints a profile as a human-readable report."""
+    coverage = profile['coverage']
+    approx = "" if profile['is_exact'] else "~"
+    print("--- DATASET PROFILE ---")
+    print(f"File: {profile['file']} ({profile['file_mb']:.1f} MB)")
+    print(f"Rows: {approx}{profile['total_rows']:,} ({profile['sampled_rows']:,} sampled{', entire file' if profile['is_exact'] else ''})")
+    print(f"Synonym coverage: {coverage['mapped']}/{coverage['total']} columns mapped to the canonical schema")
+    if coverage['duplicate_mappings']:
+        print(f"  Several columns map to the same canonical field: {coverage['duplicate_mappings']}")
+    if coverage['unmapped_columns']:
+        print(f"  Unmapped columns (kept under their original names): {coverage['unmapped_columns']}")
+    if coverage['missing_canonical_fields']:
+        print(f"  Canonical fields not provided: {coverage['missing_canonical_fields']}")
+
+    table = profile['columns'].drop(columns=['bytes_per_row', 'compact_bytes_per_row'])
+    print("\nColumns (distinct counts are over the sample):")
+    print(table.to_string(index=False, na_rep='-'))
+
+    print(f"\nProjected in-memory footprint: {approx}{profile['projected_mb']:.1f} MB as loaded, "
+          f"{approx}{profile['projected_compact_mb']:.1f} MB with compact dtypes")
+    print("--- END OF PROFILE ---")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a provider CSV export from a bounded sample of its rows.")
+    parser.add_argument("csv_path", help="Path to the CSV file to profile.")
+    parser.add_argument("--chunk-size", type=int, default=20000, help="Rows per chunk read.")
+    parser.add_argument("--sample-chunks", type=int, default=5, help="Maximum number of chunks read.")
+    parser.add_argument("--json", dest="json_path", help="Also write the profile to this JSON file.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv_path):
+        parser.error(f"The file could not be found: {args.csv_path}")
+    with open(SYNONYM_LIBRARY_PATH, 'r') as f:
+        synonym_library = json.load(f)
+
+    start = time.perf_counter()
+    profile = build_profile(args.csv_path, synonym_library, args.chunk_size, args.sample_chunks)
+    print_profile(profile)
+    print(f"Profiled in {time.perf_counter() - start:.2f}s.")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({**profile, 'columns': profile['columns'].to_dict(orient='records')}, f, indent=2, default=str)
+        print(f"Profile written to '{args.json_path}'.")
+
 
-# This script is designed to be run from the root of your project directory.
-# It will load the user's CSV and print its column headers.
-
-# Construct the path to the CSV file
-try:
-    csv_path = os.path.join('database', 'sample_data.csv')
-    
-    if not os.path.exists(csv_path):
-        print(f"ERROR: The file could not be found at the expected path: {csv_path}")
-        print("Please ensure that 'sample_data.csv' exists inside the 'database' directory.")
-    else:
-        # Load the CSV into a pandas DataFrame
-        df = pd.read_csv(csv_path)
-        
-        # Get the list of column headers
-        column_headers = df.columns.tolist()
-        
-        # Print the headers for analysis
-        print("--- DIAGNOSTIC SCRIPT OUTPUT ---")
-        print("Detected Column Headers in 'sample_data.csv':")
-        print(column_headers)
-        print("--- END OF DIAGNOSTIC ---")
-
-except Exception as e:
-    print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+from config.settings import ANOMALY_PERCENTILE_THRESHOLD
+from insights.percentile_cube import get_percentile_cube
+from utils.dataset_store import get_dataset_artifact
+
+
+def primary_metrics_by_archetype(archetypes: Dict[str, Any]) -> pd.Series:
+    """Returns the single most heavily weighted metric of every archetype, in archetype order."""
+    return pd.Series({
+        name: max(details["key_metrics"], key=details["key_metrics"].get)
+        for name, details in archetypes.items() if details.get("key_metrics")
+    }, dtype=object)
+
+
+class AnomalyTable:
+    """
+    Every "WOW" conceptual anomaly in a dataset: a player reaching the anomaly percentile threshold in
+    the primary metric of an archetype that does not belong to their own position group
+    (e.g. a centre back in the 95th percentile for a Winger's progressive carries).
+
+    The scan is a single vectorized pass over the (players x archetypes) matrix of primary-metric
+    percentiles taken from the percentile cube, instead of a per-player loop over archetypes.
+
+    Attributes:
+        anomalies: Long table with one row per anomaly: 'row_label', 'archetype', 'metric', 'percentile'.
+        summary: Per-player table (indexed like the dataset, players with anomalies only) with
+                 'anomaly_count', 'top_anomaly_percentile' and a readable 'surprising_profiles' column.
+    """
+
+    def __init__(self, df: pd.DataFrame, archetypes: Dict[str, Any], position_groupings: Dict[str, List[str]],
+                 archetype_categories: Dict[str, str], cohort: str = 'all', threshold: float = ANOMALY_PERCENTILE_THRESHOLD):
+        cube = get_percentile_cube(df, position_groupings)
+        primary_metrics = primary_metrics_by_archetype(archetypes)
+        primary_metrics = primary_metrics[primary_metrics.isin(cube.columns)]
+        archetype_names = primary_metrics.index.to_numpy()
+
+        # (players x archetypes) percentile matrix of each archetype's primary metric.
+        percentiles = np.column_stack([cube.metric_percentiles(cohort, m).to_numpy() for m in primary_metrics]) \
+            if len(primary_metrics) else np.empty((len(df), 0))
+
+        # A player's own archetypes are those of their position group; they cannot be anomalies.
+        if 'position_group' in cube.cohort_keys.columns:
+            player_groups = cube.cohort_keys['position_group'].astype(object).to_numpy()
+        else:
+            player_groups = np.full(len(df), None, dtype=object)
+        archetype_groups = np.array([archetype_categories.get(a) for a in archetype_names], dtype=object)
+        own = (player_groups[:, None] == archetype_groups[None, :]) & pd.notna(archetype_groups)[None, :]
+
+        hits = np.nan_to_num(percentiles, nan=-1.0) >= threshold
+        hits &= ~own
+        rows, cols = np.nonzero(hits)
+
+        self.cohort = cohort
+        self.threshold = threshold
+        self.anomalies = pd.DataFrame({
+            'row_label': df.index.to_numpy()[rows],
+            'archetype': archetype_names[cols],
+            'metric': primary_metrics.to_numpy()[cols],
+            'percentile': percentiles[rows, cols],
+        }).sort_values(['row_label', 'percentile'], ascending=[True, False], kind='stable')
+
+        labels = (self.anomalies['archetype'] + " (" + self.anomalies['metric'] + " at percentile "
+                  + self.anomalies['percentile'].map('{:.0f}'.format) + ")")
+        grouped = self.anomalies.groupby('row_label', sort=False)
+        self.summary = pd.DataFrame({
+            'anomaly_count': grouped.size(),
+            'top_anomaly_percentile': grouped['percentile'].max(),
+            'surprising_profiles': labels.groupby(self.anomalies['row_label'], sort=False).agg("; ".join),
+        })
+        self.summary.index.name = None
+        # Each player's strongest anomaly (anomalies are sorted by percentile within each player).
+        self._top = self.anomalies.drop_duplicates('row_label').set_index('row_label')
+
+    def top_anomaly(self, row_label: Any) -> Optional[Dict[str, Any]]:
+        """Returns a player's strongest anomaly as {'archetype', 'metric', 'percentile'}, or None if they have none."""
+        if row_label not in self._top.index:
+            return None
+        top = self._top.loc[row_label]
+        return {"archetype": top['archetype'], "metric": top['metric'], "percentile": float(top['percentile'])}
+
+
+def get_anomaly_table(df: pd.DataFrame, archetypes: Dict[str, Any], position_groupings: Dict[str, List[str]],
+                      archetype_categories: Dict[str, str], cohort: str = 'all') -> AnomalyTable:
+    """Returns the anomaly table of a dataset for a percentile cohort, computed once per dataset."""
+    return get_dataset_artifact(
+        df, f"anomaly_table:{cohort}",
+        lambda d: AnomalyTable(d, archetypes, position_groupings, archetype_categories, cohort)
+    )
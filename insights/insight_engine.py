@@ -1,3 +1,4 @@
+import hashlib
 import pandas as pd
 import json
 from openai import OpenAI
@@ -5,6 +6,22 @@ from typing import Dict, Any, List, Optional
 
 # Note: We will need to add INSIGHTS_PERSONA_PATH to the settings file.
 from config.settings import OPENAI_API_KEY, INSIGHTS_PERSONA_PATH
+from insights.percentile_cube import get_percentile_cube
+from insights.anomaly_scan import AnomalyTable, get_anomaly_table
+from insights.note_cache import NoteKey, get_note_cache
+from utils.dataset_store import dataset_key_of
+
+# Bumped whenever the structured input of a note changes meaning (v2: anomaly read from the anomaly table),
+# so notes cached under the old definition are not served again.
+NOTE_INPUTS_VERSION = 2
+
+# Notes starting with this prefix report a failure; they are shown but never cached.
+ANALYSIS_ERROR_PREFIX = "**Analysis Error:**"
+
+
+def _is_cacheable_note(note: Optional[str]) -> bool:
+    return isinstance(note, str) and not note.startswith(ANALYSIS_ERROR_PREFIX)
+
 
 class InsightEngine:
     """
@@ -14,16 +31,22 @@ class InsightEngine:
     a narrative "Analyst's Note" based on a defined persona.
     """
 
-    def __init__(self, archetypes: Dict[str, Any]):
+    def __init__(self, archetypes: Dict[str, Any], position_groupings: Dict[str, List[str]] = None, archetype_categories: Dict[str, str] = None):
         """
         Initializes the InsightEngine.
 
         Args:
             archetypes (Dict[str, Any]): The loaded dictionary of player archetypes and their key metrics.
+            position_groupings (Dict[str, List[str]]): The position categories and their positions, used
+                                                        for position-group percentile cohorts.
+            archetype_categories (Dict[str, str]): The position category of each archetype, used to tell a
+                                                   player's own archetypes from "foreign" ones in anomaly scans.
         """
         self.client = OpenAI(api_key=OPENAI_API_KEY)
         self.model_name = "gpt-4.1-nano-2025-04-14"
         self.archetypes = archetypes
+        self.position_groupings = position_groupings or {}
+        self.archetype_categories = archetype_categories or {}
         try:
             with open(INSIGHTS_PERSONA_PATH, 'r') as f:
                 self.master_prompt = f.read()
@@ -34,15 +57,18 @@ class InsightEngine:
         except Exception as e:
             self.master_prompt = "You are an AI football scout. Write a brief analysis."
             print(f"ERROR: Could not load persona file. Details: {e}")
+        # Cached notes are only reused while the persona prompt, the model and the note's inputs are unchanged.
+        self.persona_hash = hashlib.sha256(f"{NOTE_INPUTS_VERSION}\n{self.model_name}\n{self.master_prompt}".encode("utf-8")).hexdigest()
 
 
-    def _calculate_percentiles(self, player_series: pd.Series, full_df: pd.DataFrame) -> Optional[pd.Series]:
+    def _calculate_percentiles(self, player_series: pd.Series, full_df: pd.DataFrame, cohort: str = 'all') -> Optional[pd.Series]:
         """
-        Calculates the percentile rank for each of a player's stats relative to the full dataset.
+        Looks up the percentile rank for each of a player's stats relative to a comparison cohort.
 
         Args:
             player_series (pd.Series): The data for the single player to analyze.
             full_df (pd.DataFrame): The full dataset for calculating percentile context.
+            cohort (str): The comparison cohort: 'all', 'position_group', 'league' or 'age_band'.
 
         Returns:
             Optional[pd.Series]: A Series where index is the stat name and value is the percentile (0-100).
@@ -51,29 +77,30 @@ class InsightEngine:
         if player_series.name not in full_df.index:
             return None
             
-        # Use rank(pct=True) for efficient, vectorized percentile calculation
-        percentiles = full_df.rank(pct=True).loc[player_series.name] * 100
-        return percentiles.round(0)
+        # Ranks for every cohort are computed once per dataset and reused for every note.
+        return get_percentile_cube(full_df, self.position_groupings).player_percentiles(player_series.name, cohort)
 
-    def generate_analyst_note(self, player_data: pd.Series, full_dataset: pd.DataFrame, active_archetype: str) -> Optional[str]:
+    def generate_analyst_note(self, player_data: pd.Series, full_dataset: pd.DataFrame, active_archetype: str, cohort: str = 'all') -> Optional[str]:
         """
         Generates a full "Analyst's Note" for a given player.
 
         This method performs the core analytical workflow:
         1. Calculates percentiles for the player's stats.
         2. Identifies the top 4 strengths and weaknesses based on their primary archetype.
-        3. Finds a "WOW" conceptual anomaly by checking for high performance in contrasting archetypes.
+        3. Looks up the player's "WOW" conceptual anomaly in the dataset's anomaly table (the same
+           definition as the surprising-profiles search: a foreign position group's archetype).
         4. Synthesizes these findings into a narrative using an LLM call guided by the master persona prompt.
 
         Args:
             player_data (pd.Series): The data for the single player.
             full_dataset (pd.DataFrame): The entire dataset for context.
             active_archetype (str): The primary archetype of the player.
+            cohort (str): The cohort the player is compared against ('all', 'position_group', 'league' or 'age_band').
 
         Returns:
             Optional[str]: A formatted Markdown string containing the "Analyst's Note", or None if an error occurs.
         """
-        player_percentiles = self._calculate_percentiles(player_data, full_dataset)
+        player_percentiles = self._calculate_percentiles(player_data, full_dataset, cohort)
         if player_percentiles is None:
             return None
 
@@ -83,37 +110,21 @@ class InsightEngine:
             return None # Cannot proceed without metrics for the active archetype
 
         # Filter percentiles to only the metrics relevant to the player's archetype
-        relevant_percentiles = player_percentiles[archetype_metrics.keys()].dropna()
+        relevant_percentiles = player_percentiles.reindex(list(archetype_metrics.keys())).dropna()
         
         strengths = relevant_percentiles.nlargest(4)
         weaknesses = relevant_percentiles.nsmallest(4)
 
         # 2. Identify Conceptual Anomaly ("WOW" Insight)
-        anomaly = None
-        for archetype_name, details in self.archetypes.items():
-            if archetype_name == active_archetype:
-                continue # Skip the player's own archetype
-
-            # Get the single most important metric for this "foreign" archetype
-            foreign_metrics = details.get("key_metrics", {})
-            if not foreign_metrics:
-                continue
-            
-            primary_foreign_metric = max(foreign_metrics, key=foreign_metrics.get)
-
-            # Check the player's percentile in this specific metric
-            if primary_foreign_metric in player_percentiles and player_percentiles[primary_foreign_metric] >= 90:
-                anomaly = {
-                    "archetype": archetype_name,
-                    "metric": primary_foreign_metric,
-                    "percentile": player_percentiles[primary_foreign_metric]
-                }
-                break # Found the first anomaly, so we stop
+        # Read from the dataset-wide anomaly table, so the note always reports the same anomaly that
+        # find_surprising_profiles found for this player (their strongest one).
+        anomaly = self.scan_anomalies(full_dataset, cohort).top_anomaly(player_data.name)
 
         # 3. Synthesize with LLM
         structured_input = f"""
         * Player Name: {player_data.get('full_name', 'N/A')}
         * Primary Archetype: {active_archetype}
+        * Percentiles Compared Against: {get_percentile_cube(full_dataset, self.position_groupings).cohort_of(player_data.name, cohort)}
         * Identified Strengths:
         {json.dumps(strengths.to_dict(), indent=4)}
         * Identified Weaknesses:
@@ -134,4 +145,64 @@ class InsightEngine:
             return response.choices[0].message.content
         except Exception as e:
             print(f"ERROR: Insight Engine LLM call failed: {e}")
-            return f"**Analysis Error:** Could not generate the analyst's note due to a connection issue. Details: {e}"
+            return f"{ANALYSIS_ERROR_PREFIX} Could not generate the analyst's note due to a connection issue. Details: {e}"
+
+    def _note_key(self, player_data: pd.Series, full_dataset: pd.DataFrame, active_archetype: str, cohort: str) -> Optional[NoteKey]:
+        """Returns the note cache key of a player's note, or None if the dataset is not a registered upload."""
+        dataset_hash = dataset_key_of(full_dataset)
+        if dataset_hash is None:
+            return None
+        player_id = player_data.get('player_id', player_data.name)
+        return (str(player_id), active_archetype, dataset_hash, self.persona_hash, cohort)
+
+    def get_analyst_note(self, player_data: pd.Series, full_dataset: pd.DataFrame, active_archetype: str, cohort: str = 'all') -> Optional[str]:
+        """
+        Returns the "Analyst's Note" of a player from the persistent note cache, generating it on a miss.
+
+        Takes the same arguments as generate_analyst_note. A note is reused for the same player,
+        archetype, dataset, persona and cohort, in any session; failed generations are not cached.
+        """
+        key = self._note_key(player_data, full_dataset, active_archetype, cohort)
+        generate = lambda: self.generate_analyst_note(player_data, full_dataset, active_archetype, cohort)
+        if key is None:
+            return generate()
+        return get_note_cache().get_or_create(key, generate, cacheable=_is_cacheable_note)
+
+    def prewarm_analyst_notes(self, player_labels: List[Any], full_dataset: pd.DataFrame, active_archetype: str, cohort: str = 'all') -> int:
+        """
+        Generates the notes of several players in the background, so they are cached before they are requested.
+
+        Args:
+            player_labels (List[Any]): Row labels (in full_dataset) of the players, most relevant first.
+            full_dataset (pd.DataFrame): The entire dataset for context.
+            active_archetype (str): The archetype the notes are written for.
+            cohort (str): The percentile comparison cohort.
+
+        Returns:
+            int: The number of notes queued for generation.
+        """
+        if active_archetype not in self.archetypes:
+            return 0
+        jobs = []
+        for label in player_labels:
+            player_data = full_dataset.loc[label]
+            key = self._note_key(player_data, full_dataset, active_archetype, cohort)
+            if key is not None:
+                jobs.append((key, lambda p=player_data: self.generate_analyst_note(p, full_dataset, active_archetype, cohort)))
+        return get_note_cache().prewarm(jobs, cacheable=_is_cacheable_note)
+
+    def scan_anomalies(self, full_df: pd.DataFrame, cohort: str = 'all') -> AnomalyTable:
+        """
+        Returns every conceptual anomaly in the dataset at once (see AnomalyTable).
+
+        The scan is computed once per dataset and cohort and shared by all sessions, which turns the
+        per-note "WOW" check into a ranked, queryable dataset feature.
+
+        Args:
+            full_df (pd.DataFrame): The full dataset.
+            cohort (str): The percentile cohort the anomalies are measured in.
+
+        Returns:
+            AnomalyTable: The dataset's anomaly table.
+        """
+        return get_anomaly_table(full_df, self.archetypes, self.position_groupings, self.archetype_categories, cohort)
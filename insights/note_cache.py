@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from config.settings import NOTE_CACHE_PATH, NOTE_CACHE_MAX_MB, NOTE_PREWARM_WORKERS
+
+# (player_id, archetype, dataset hash, persona hash, cohort): everything an Analyst's Note depends on.
+NoteKey = Tuple[str, str, str, str, str]
+
+
+class NoteCache:
+    """
+    A persistent cache of generated Analyst's Notes, shared by every session of the process.
+
+    Notes are stored in a local SQLite file keyed by NoteKey, so a note generated once (in any
+    session, or before a restart) is served instantly for the same player, archetype, dataset,
+    persona and cohort. The file is bounded to `max_bytes` of note text; the least recently
+    used notes are evicted first. Concurrent requests for the same note (e.g. a click while the
+    note is being prewarmed) wait for the one generation in flight instead of starting another.
+    """
+
+    def __init__(self, db_path: str = NOTE_CACHE_PATH, max_bytes: int = NOTE_CACHE_MAX_MB * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._in_flight: Dict[NoteKey, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=NOTE_PREWARM_WORKERS, thread_name_prefix="note-prewarm")
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS notes (
+                       player_id TEXT, archetype TEXT, dataset_hash TEXT, persona_hash TEXT, cohort TEXT,
+                       note TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL,
+                       PRIMARY KEY (player_id, archetype, dataset_hash, persona_hash, cohort))"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS notes_last_used ON notes (last_used)")
+
+    # --- Storage ---
+    def get(self, key: NoteKey) -> Optional[str]:
+        """Returns the cached note for a key (marking it as recently used), or None on a miss."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT note FROM notes WHERE player_id=? AND archetype=? AND dataset_hash=? AND persona_hash=? AND cohort=?",
+                key
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE notes SET last_used=? WHERE player_id=? AND archetype=? AND dataset_hash=? AND persona_hash=? AND cohort=?",
+                    (time.time(), *key)
+                )
+        return row[0] if row else None
+
+    def put(self, key: NoteKey, note: str) -> None:
+        """Stores a note and evicts the least recently used notes beyond the size bound."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, note, len(note.encode("utf-8")), time.time())
+            )
+            # Keep the most recently used notes whose cumulative size fits the bound.
+            evicted = self._conn.execute(
+                """DELETE FROM notes WHERE rowid IN (
+                       SELECT rowid FROM (
+                           SELECT rowid, SUM(size) OVER (ORDER BY last_used DESC ROWS UNBOUNDED PRECEDING) AS kept
+                           FROM notes)
+                       WHERE kept > ?)""",
+                (self.max_bytes,)
+            ).rowcount
+        if evicted:
+            print(f"DIAGNOSTIC: Note cache over {self.max_bytes} bytes, evicted {evicted} least recently used note(s).")
+
+    def __contains__(self, key: NoteKey) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM notes WHERE player_id=? AND archetype=? AND dataset_hash=? AND persona_hash=? AND cohort=?",
+                key
+            ).fetchone() is not None
+
+    # --- Generation ---
+    def get_or_create(self, key: NoteKey, producer: Callable[[], Optional[str]],
+                      cacheable: Callable[[Optional[str]], bool] = lambda note: note is not None) -> Optional[str]:
+        """
+        Returns the cached note for a key, generating (and storing) it with `producer` on a miss.
+
+        Args:
+            key: The note's cache key.
+            producer: Generates the note; only called if the note is neither cached nor in flight.
+            cacheable: Tells whether a generated note may be stored (error messages are not).
+
+        Returns:
+            The note, or whatever the producer returned if it was not cacheable.
+        """
+        note = self.get(key)
+        if note is not None:
+            return note
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._in_flight[key] = Future()
+        if not is_owner:
+            return future.result()
+
+        try:
+            note = producer()
+            if cacheable(note):
+                self.put(key, note)
+            future.set_result(note)
+            return note
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def prewarm(self, jobs: Iterable[Tuple[NoteKey, Callable[[], Optional[str]]]],
+                cacheable: Callable[[Optional[str]], bool] = lambda note: note is not None) -> int:
+        """
+        Generates notes in the background so they are cached by the time they are requested.
+
+        Args:
+            jobs: (key, producer) pairs, in priority order.
+            cacheable: As in get_or_create.
+
+        Returns:
+            The number of notes queued (notes already cached or in flight are skipped).
+        """
+        queued = 0
+        for key, producer in jobs:
+            with self._lock:
+                in_flight = key in self._in_flight
+            if in_flight or key in self:
+                continue
+            self._executor.submit(self._prewarm_one, key, producer, cacheable)
+            queued += 1
+        return queued
+
+    def _prewarm_one(self, key: NoteKey, producer: Callable[[], Optional[str]], cacheable: Callable[[Optional[str]], bool]) -> None:
+        try:
+            self.get_or_create(key, producer, cacheable)
+        except Exception as e:
+            print(f"ERROR: Prewarming the note for player '{key[0]}' failed. Details: {e}")
+
+
+_CACHE: Optional[NoteCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_note_cache() -> NoteCache:
+    """Returns the process-wide note cache, opening it on first use."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = NoteCache()
+        return _CACHE
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+from config.settings import PERCENTILE_AGE_BAND_EDGES
+from agent.parallel_scoring import parallel_percentile_ranks, should_parallelize
+from utils.dataset_store import get_dataset_artifact
+
+# The comparison cohorts a player can be ranked against, and the column that defines each one.
+COHORT_KEY_COLUMNS = {
+    'all': None,
+    'position_group': 'primary_position',
+    'league': 'current_league',
+    'age_band': 'age',
+}
+
+# Percentiles are stored as whole numbers in uint8; this value marks a missing percentile.
+_MISSING = np.uint8(255)
+
+
+def age_band_labels(edges: List[int]) -> List[str]:
+    """Returns the labels of the age bands delimited by `edges`, e.g. [21, 24] -> ['<21', '21-23', '24+']."""
+    labels = [f"<{edges[0]}"]
+    labels += [f"{low}-{high - 1}" for low, high in zip(edges[:-1], edges[1:])]
+    labels.append(f"{edges[-1]}+")
+    return labels
+
+
+class PercentileCube:
+    """
+    Precomputed percentile ranks (0-100) of every player in every numeric column, per comparison cohort.
+
+    For each cohort in COHORT_KEY_COLUMNS the dataset is ranked with one vectorized grouped
+    rank (e.g. every player against the players of their own league), so that a goalkeeper's
+    `shots_p90` is judged against other goalkeepers rather than against strikers. Percentiles are
+    stored as uint8 (1 byte per player, metric and cohort) and queried by (player, cohort, metric)
+    without any ranking at request time.
+    """
+
+    def __init__(self, df: pd.DataFrame, position_groupings: Dict[str, List[str]]):
+        """
+        Builds the cube.
+
+        Args:
+            df: The full dataset.
+            position_groupings: Maps each position category to its positions (POSITION_GROUPINGS).
+                                A position listed in several categories belongs to the first one.
+        """
+        self.position_groupings = position_groupings
+        self.cohort_keys = self._cohort_keys(df)
+        numeric_df = df.select_dtypes(include='number')
+        self.columns = list(numeric_df.columns)
+        self.cubes = {cohort: self._rank(numeric_df, cohort) for cohort in COHORT_KEY_COLUMNS}
+
+    def _cohort_keys(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Returns each player's cohort label (position category, league, age band) as categoricals."""
+        position_to_category = {}
+        for category, positions in self.position_groupings.items():
+            for position in positions:
+                position_to_category.setdefault(position, category)
+
+        keys = pd.DataFrame(index=df.index)
+        if 'primary_position' in df.columns:
+            keys['position_group'] = df['primary_position'].map(position_to_category).astype('category')
+        if 'current_league' in df.columns:
+            keys['league'] = df['current_league'].astype('category')
+        if 'age' in df.columns:
+            edges = PERCENTILE_AGE_BAND_EDGES
+            bins = [-np.inf] + list(edges) + [np.inf]
+            keys['age_band'] = pd.cut(df['age'], bins=bins, right=False, labels=age_band_labels(edges))
+        return keys
+
+    def _rank(self, numeric_df: pd.DataFrame, cohort: str) -> Optional[pd.DataFrame]:
+        """Ranks every column within each group of a cohort and packs the result into uint8."""
+        if cohort != 'all' and cohort not in self.cohort_keys.columns:
+            return None
+        if should_parallelize(len(numeric_df)):
+            # Very large datasets are ranked with the columns split across all cores (same results).
+            group_keys = None if cohort == 'all' else self.cohort_keys[cohort]
+            return pd.DataFrame(parallel_percentile_ranks(numeric_df, group_keys), index=numeric_df.index, columns=numeric_df.columns)
+        if cohort == 'all':
+            ranks = numeric_df.rank(pct=True)
+        elif cohort in self.cohort_keys.columns:
+            ranks = numeric_df.groupby(self.cohort_keys[cohort], observed=True).rank(pct=True)
+            ranks = ranks.reindex(numeric_df.index)
+        else:
+            return None
+        packed = np.rint(ranks.to_numpy(dtype=np.float64) * 100)
+        packed = np.where(np.isnan(packed), _MISSING, packed).astype(np.uint8)
+        return pd.DataFrame(packed, index=numeric_df.index, columns=numeric_df.columns)
+
+    def available_cohorts(self) -> List[str]:
+        return [cohort for cohort, cube in self.cubes.items() if cube is not None]
+
+    def _cube(self, cohort: str) -> pd.DataFrame:
+        cube = self.cubes.get(cohort)
+        if cube is None:
+            raise ValueError(f"Unknown or unavailable cohort '{cohort}'. Available cohorts are: {self.available_cohorts()}")
+        return cube
+
+    @staticmethod
+    def _unpack(values) -> np.ndarray:
+        values = np.asarray(values)
+        return np.where(values == _MISSING, np.nan, values.astype(np.float64))
+
+    def cohort_of(self, row_label, cohort: str) -> str:
+        """Returns a description of the cohort a player is compared against, e.g. 'La Liga 2 (league)'."""
+        if cohort == 'all':
+            return "All players"
+        value = self.cohort_keys.at[row_label, cohort] if cohort in self.cohort_keys.columns else None
+        return f"{'Unknown' if pd.isna(value) else value} ({cohort.replace('_', ' ')})"
+
+    def percentile(self, row_label, cohort: str, metric: str) -> Optional[float]:
+        """Returns one player's percentile in one metric within a cohort, or None if unavailable."""
+        cube = self._cube(cohort)
+        if metric not in cube.columns:
+            return None
+        value = self._unpack(cube.at[row_label, metric])
+        return None if np.isnan(value) else float(value)
+
+    def player_percentiles(self, row_label, cohort: str = 'all') -> pd.Series:
+        """Returns one player's percentile in every numeric column within a cohort (NaN if unavailable)."""
+        cube = self._cube(cohort)
+        return pd.Series(self._unpack(cube.loc[row_label].to_numpy()), index=cube.columns, name=row_label)
+
+    def metric_percentiles(self, cohort: str, metric: str) -> pd.Series:
+        """Returns every player's percentile in one metric within a cohort, aligned with the dataset's index."""
+        cube = self._cube(cohort)
+        if metric not in cube.columns:
+            raise ValueError(f"Column '{metric}' has no percentiles; only numeric columns of the dataset can be ranked.")
+        return pd.Series(self._unpack(cube[metric].to_numpy()), index=cube.index, name=metric)
+
+    def refresh(self, old_df: pd.DataFrame, new_df: pd.DataFrame, diff) -> Optional["PercentileCube"]:
+        """
+        Derives the cube of a new dataset version from this one and the diff.
+
+        When the set of players and their cohort membership are unchanged, only the columns
+        that changed are re-ranked and every other column is reused. Adding or removing players,
+        or moving them between cohorts, shifts percentiles everywhere, so in that case the cube is
+        rebuilt lazily instead (returns None).
+        """
+        key_columns = {c for c in COHORT_KEY_COLUMNS.values() if c}
+        if not diff.rows_aligned or diff.changed_columns & key_columns:
+            return None
+
+        numeric_df = new_df.select_dtypes(include='number')
+        stale = [c for c in numeric_df.columns if c in diff.changed_columns or c not in self.columns]
+        reused = [c for c in numeric_df.columns if c not in stale]
+
+        refreshed = object.__new__(PercentileCube)
+        refreshed.position_groupings = self.position_groupings
+        refreshed.cohort_keys = self.cohort_keys.set_axis(new_df.index, axis=0)
+        refreshed.columns = list(numeric_df.columns)
+        refreshed.cubes = {}
+        for cohort, cube in self.cubes.items():
+            if cube is None:
+                refreshed.cubes[cohort] = None
+                continue
+            parts = [cube[reused].set_axis(new_df.index, axis=0)]
+            if stale:
+                parts.append(refreshed._rank(numeric_df[stale], cohort))
+            refreshed.cubes[cohort] = pd.concat(parts, axis=1)[refreshed.columns]
+        return refreshed
+
+
+def get_percentile_cube(df: pd.DataFrame, position_groupings: Dict[str, List[str]]) -> PercentileCube:
+    """Returns the percentile cube of a dataset, computed once per dataset."""
+    return get_dataset_artifact(df, "percentile_cube", lambda d: PercentileCube(d, position_groupings))
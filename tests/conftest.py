@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import the app's packages from the project root, as the app and the scripts do.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
@@ -0,0 +1,14 @@
+import pandas as pd
+
+from utils.derived_features import materialize_derived_features
+
+
+def test_contract_months_left_keeps_numeric_stats_float64():
+    df = pd.DataFrame({
+        'player_id': [1, 2, 3],
+        'contract_expires_on': ['2026-06-30', None, '2024-01-01'],
+    })
+    out = materialize_derived_features(df, {}, reference_date=pd.Timestamp('2025-10-19'))
+    assert out['contract_months_left'].dtype == 'float32'
+    assert out['contract_months_left'].isna().tolist() == [False, True, False]
+    assert out.select_dtypes('number').min().dtype == 'float64'
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from utils import logbook_handler
+from utils.logbook_handler import apply_logbook_schema, build_logbook_schema, get_logbook_schema, parse_logbook, register_logbook
+
+ENTRY = {"date": "2025-10-19", "player_name": "Tianco", "sleep_hours": 8}
+
+
+@pytest.fixture
+def session_state(monkeypatch):
+    monkeypatch.setattr(logbook_handler.st, 'session_state', {})
+
+
+def test_header_only_legacy_logbook_types_its_first_entry(session_state):
+    logbook_key, df, schema = parse_logbook("Wellness.csv", b"date,player_name,sleep_hours\n")
+    assert schema == {'date': 'date'}
+    register_logbook(logbook_key, df, schema)
+
+    updated_df = pd.concat([df, pd.DataFrame([ENTRY])], ignore_index=True)
+    updated_df = apply_logbook_schema(updated_df, get_logbook_schema(logbook_key, updated_df))
+
+    row = updated_df.iloc[0]
+    assert row['date'] == pd.Timestamp("2025-10-19")
+    assert row['player_name'] == "Tianco"
+    assert row['sleep_hours'] == 8
+    assert get_logbook_schema(logbook_key) == {'date': 'date', 'player_name': 'text', 'sleep_hours': 'number'}
+
+
+def test_metric_names_with_schema_separators_are_rejected():
+    with pytest.raises(ValueError):
+        build_logbook_schema([{'name': 'Sleep; hours', 'type': 'Number'}])
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from agent.scoring_tables import NormalizationStats, FitScoreTable
+from utils.dataset_diff import diff_datasets
+
+RECIPE = {'crosses_p90': 0.6, 'contract_months_left': 0.4}
+
+
+def _players() -> pd.DataFrame:
+    return pd.DataFrame({
+        'player_id': [1, 2, 3, 4, 5],
+        'crosses_p90': [0.5, 5.1, 2.0, np.nan, 1.0],
+        # A nullable integer column, as derived features may be.
+        'contract_months_left': pd.array([3, 24, pd.NA, 12, 0], dtype='Int16'),
+    })
+
+
+def test_removal_only_refresh_matches_fresh_stats():
+    old_df = _players()
+    new_df = old_df[old_df['player_id'].isin([1, 2, 4])].reset_index(drop=True)
+    diff = diff_datasets(old_df, new_df)
+
+    refreshed = NormalizationStats(old_df).refresh(old_df, new_df, diff)
+    fresh = NormalizationStats(new_df)
+
+    assert refreshed.minimums.dtype == np.float64
+    for column in fresh.minimums.index:
+        assert refreshed.same_bounds(fresh, column), column
+
+
+def test_removal_only_fit_score_refresh_matches_fresh_table():
+    old_df = _players()
+    new_df = old_df[old_df['player_id'].isin([1, 2, 4])].reset_index(drop=True)
+    diff = diff_datasets(old_df, new_df)
+
+    refreshed = FitScoreTable(old_df, 'Winger', RECIPE).refresh(old_df, new_df, diff)
+    fresh = FitScoreTable(new_df, 'Winger', RECIPE)
+
+    np.testing.assert_allclose(refreshed.scores.to_numpy(dtype=float), fresh.scores.to_numpy(dtype=float))
@@ -1,12 +1,32 @@
 import streamlit as st
 import pandas as pd
 import json
+import io
+import datetime
 import uuid # Import the uuid library to generate unique keys for dynamic widgets
+from concurrent.futures import wait
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-from agent.agent_core import ScoutAgent, SYNONYM_LIBRARY
+from agent.agent_core import ScoutAgent, SYNONYM_LIBRARY, POSITION_GROUPINGS
+from agent.context_manager import ContextManager
+from config.settings import CHAT_RENDER_WINDOW, CHAT_TABLE_PAGE_ROWS, BACKGROUND_POLL_SECONDS, BACKGROUND_INLINE_WAIT_SECONDS
 from utils.data_handler import process_uploaded_csv
+from utils.dataset_store import get_or_register_dataset, carry_over_artifacts, compute_content_hash
+from utils.snapshot_store import get_snapshot_store, default_series
+from utils.memory_accountant import measure_session, record_session_usage, enforce_budget, load_spilled, clear_spill
+from utils.dataset_diff import diff_datasets
+from utils.derived_features import materialize_derived_features, derived_feature_columns
+from utils.background_tasks import BackgroundTask, submit_task, get_task, session_tasks, cancel_tasks, collect_finished, run_cpu_bound
 # Import the new function from our logbook handler
-from utils.logbook_handler import create_logbook_template, load_logbook
+from utils.logbook_handler import create_logbook_template, parse_logbook, register_logbook, LOGBOOK_RESERVED_CHARACTERS
+
+# Percentile comparison cohorts offered for the Analyst's Note: label -> cohort name.
+NOTE_COHORT_OPTIONS = {
+    "All players": "all",
+    "Same position group": "position_group",
+    "Same league": "league",
+    "Same age band": "age_band",
+}
 
 class WebUI:
     def __init__(self):
@@ -35,10 +55,18 @@ class WebUI:
             st.session_state.data_loaded = False
         if "uploaded_file_name" not in st.session_state:
             st.session_state.uploaded_file_name = None
+        if "uploaded_file_id" not in st.session_state:
+            st.session_state.uploaded_file_id = None
         if "full_df" not in st.session_state:
             st.session_state.full_df = None
+        if "dataset_key" not in st.session_state:
+            st.session_state.dataset_key = None
+        if "snapshot_series" not in st.session_state:
+            st.session_state.snapshot_series = None
         if "raw_df_history" not in st.session_state:
             st.session_state.raw_df_history = []
+        if "context_manager" not in st.session_state:
+            st.session_state.context_manager = ContextManager()
         if "active_archetype" not in st.session_state:
             st.session_state.active_archetype = None
         if "selected_player_for_note" not in st.session_state:
@@ -47,8 +75,17 @@ class WebUI:
             st.session_state.current_analyst_note = None
         if 'logbooks' not in st.session_state:
             st.session_state['logbooks'] = {}
+        if 'logbook_schemas' not in st.session_state:
+            st.session_state['logbook_schemas'] = {}
         if 'new_logbook_metrics' not in st.session_state:
             st.session_state.new_logbook_metrics = []
+        if 'processed_logbooks' not in st.session_state:
+            st.session_state.processed_logbooks = set()
+        if "failed_file_id" not in st.session_state:
+            st.session_state.failed_file_id = None
+        if "task_session_key" not in st.session_state:
+            # Identifies this session's background tasks (see utils.background_tasks).
+            st.session_state.task_session_key = uuid.uuid4().hex
 
     def _render_creator_wizard(self):
         """
@@ -79,7 +116,9 @@ class WebUI:
             new_metric_type = col2.selectbox("Data Type", ["Number", "Text", "Date"], key="new_metric_type_input")
             
             submitted = st.form_submit_button("Add Metric")
-            if submitted and new_metric_name:
+            if submitted and any(character in new_metric_name for character in LOGBOOK_RESERVED_CHARACTERS):
+                st.warning(f"Metric names may not contain any of: {' '.join(LOGBOOK_RESERVED_CHARACTERS)}")
+            elif submitted and new_metric_name:
                 st.session_state.new_logbook_metrics.append({
                     "id": str(uuid.uuid4()), # Assign a unique ID for stable widget keys
                     "name": new_metric_name,
@@ -111,6 +150,139 @@ class WebUI:
             except Exception as e:
                 st.error(f"Could not generate template: {e}")
 
+    @staticmethod
+    def _apply_dataset_update(previous_df: pd.DataFrame, new_df: pd.DataFrame) -> list:
+        """
+        Treats a newly uploaded dataset as a new version of the previous one.
+
+        The two versions are diffed on player_id and every precomputed table and index of the
+        previous version is refreshed incrementally for the new one, so a daily refresh costs
+        time proportional to what changed. If the versions cannot be matched (e.g. no player_id
+        column), the derived state is simply rebuilt on demand.
+
+        Returns:
+            The notices to show the user, as (Streamlit element name, text) pairs.
+        """
+        try:
+            diff = diff_datasets(previous_df, new_df)
+        except ValueError as e:
+            print(f"DIAGNOSTIC: No incremental update possible, derived state will be rebuilt: {e}")
+            return []
+        carry_over_artifacts(previous_df, new_df, diff)
+        return [("info", f"🔄 Dataset update: {diff.summary()}")]
+
+    @staticmethod
+    def _record_snapshot(df: pd.DataFrame, content_hash: str, snapshot_date, series: str, replace: bool) -> list:
+        """
+        Stores the uploaded dataset in its series' snapshot store so trend columns can be computed across uploads.
+
+        Returns:
+            The notices to show the user, as (Streamlit element name, text) pairs.
+        """
+        try:
+            # Derived features are recomputed from the raw columns, so only the raw columns are stored.
+            raw_df = df.drop(columns=derived_feature_columns(df))
+            entry = get_snapshot_store(series).record_snapshot(raw_df, content_hash, snapshot_date, replace=replace)
+        except (ValueError, OSError) as e:
+            return [("warning", f"This upload was not added to the player history: {e}")]
+        if entry is None:
+            return []
+        return [("caption", f"Snapshot {entry['snapshot_date']} added to the '{series}' player history ({entry['stored_cells']} changed values stored).")]
+
+    @classmethod
+    def _ingest_dataset(cls, task: BackgroundTask, raw_bytes: bytes, previous_df: pd.DataFrame, snapshot_date, series: str, replace: bool):
+        """
+        Background job of a dataset upload: parses the file (in the process pool), materializes the
+        derived feature columns, registers it as a shared dataset, refreshes the derived state of the
+        previous version and records the snapshot.
+
+        Returns:
+            A tuple of (dataset key, dataset, snapshot series, notices to show the user).
+        """
+        task.report(0.05, "Parsing the file")
+        # Sessions uploading the same export share one read-only copy of the dataset. Time-dependent
+        # derived columns are computed as of the "Data as of" date, so that date is part of the key.
+        dataset_key, processed_df = get_or_register_dataset(
+            raw_bytes,
+            lambda raw: materialize_derived_features(
+                run_cpu_bound(task, process_uploaded_csv, io.BytesIO(raw), SYNONYM_LIBRARY), POSITION_GROUPINGS, previous_df, snapshot_date
+            ),
+            variant=f"as_of={snapshot_date.isoformat()}"
+        )
+        notices = []
+        if previous_df is not None and previous_df is not processed_df:
+            task.report(0.6, "Updating the previous version's tables")
+            notices += cls._apply_dataset_update(previous_df, processed_df)
+        task.report(0.85, "Recording the snapshot")
+        # The snapshot store identifies an export by its content alone, whatever date it was loaded for.
+        notices += cls._record_snapshot(processed_df, compute_content_hash(raw_bytes), snapshot_date, series, replace)
+        return dataset_key, processed_df, series, notices
+
+    def _on_dataset_ingested(self, file_name: str, file_id: str, result):
+        """Installs a parsed dataset in the session (delivered on the rerun after the ingest finished)."""
+        dataset_key, processed_df, series, notices = result
+        st.session_state.full_df = processed_df
+        st.session_state.dataset_key = dataset_key
+        st.session_state.snapshot_series = series
+        st.session_state.data_loaded = True
+        st.session_state.messages = []
+        st.session_state.context_manager = ContextManager()
+        clear_spill(self._session_id())
+        st.session_state.raw_df_history = []
+        st.session_state.uploaded_file_name = file_name
+        st.session_state.uploaded_file_id = file_id
+        st.session_state.active_archetype = None 
+        st.session_state.current_analyst_note = None
+        st.session_state.selected_player_for_note = None
+        with st.sidebar:
+            for element, text in notices:
+                getattr(st, element)(text)
+            st.success("Data processed successfully!")
+            st.info("You can now chat with the Copilot in the main window.")
+
+    @staticmethod
+    def _on_dataset_failed(file_id: str, error: Exception):
+        """Reports a failed ingest; the same file is not retried until it is uploaded again."""
+        st.sidebar.error(f"File Processing Error: {error}")
+        st.session_state.failed_file_id = file_id
+        if st.session_state.full_df is None:
+            st.session_state.data_loaded = False
+            st.session_state.uploaded_file_name = None
+            st.session_state.uploaded_file_id = None
+
+    @staticmethod
+    def _on_logbook_loaded(file_name: str, file_key, result):
+        register_logbook(*result)
+        st.session_state.processed_logbooks.add(file_key)
+        st.sidebar.success(f"Successfully loaded and integrated logbook: '{file_name}'")
+
+    @staticmethod
+    def _on_logbook_failed(file_name: str, file_key, error: Exception):
+        st.session_state.processed_logbooks.add(file_key)
+        st.sidebar.error(f"Error loading logbook '{file_name}': {error}")
+        print(f"ERROR: Failed to load logbook '{file_name}'. Details: {error}")
+
+    @staticmethod
+    def _deliver_background_results():
+        """Hands the results of this session's finished background tasks to their callbacks."""
+        for task in collect_finished(st.session_state.task_session_key):
+            task.deliver()
+
+    @st.fragment(run_every=BACKGROUND_POLL_SECONDS)
+    def _render_background_tasks(self):
+        """
+        Shows the progress of this session's background tasks, refreshing on its own while the rest
+        of the page stays interactive; once a task has finished, the app reruns to deliver its result.
+        """
+        tasks = session_tasks(st.session_state.task_session_key)
+        if any(task.done() for task in tasks):
+            st.rerun()
+        for task in tasks:
+            st.progress(task.progress, text=f"⏳ {task.label}: {task.message}")
+            if st.button("Cancel", key=f"cancel_task_{task.name}"):
+                cancel_tasks(st.session_state.task_session_key, task.name)
+                st.rerun()
+
     def _render_sidebar(self):
         """Renders the sidebar for file uploading and the new creator wizard."""
         with st.sidebar:
@@ -122,27 +294,41 @@ class WebUI:
                 type="csv",
                 help="The file should contain player statistics with one player per row."
             )
+            snapshot_date = st.date_input(
+                "Data as of",
+                value=datetime.date.today(),
+                key="snapshot_date",
+                help="The date this export represents. Each upload is kept as a dated snapshot for trend questions."
+            )
+            snapshot_series = st.text_input(
+                "Data series",
+                key="snapshot_series_name",
+                placeholder="Defaults to the file name",
+                help="Uploads of the same series (e.g. one provider's weekly export) form one player history. "
+                     "Leave empty to use the file name without its dates, e.g. 'players' for 'players_2025-03-01.csv'."
+            )
+            replace_snapshot = st.checkbox(
+                "Replace a snapshot of the same date",
+                key="snapshot_replace",
+                help="Overwrites a different export already stored for this date in the series."
+            )
             
-            if uploaded_file is not None and uploaded_file.name != st.session_state.uploaded_file_name:
-                with st.spinner(f"Processing '{uploaded_file.name}'..."):
-                    try:
-                        # (Existing logic remains unchanged)
-                        processed_df = process_uploaded_csv(uploaded_file, SYNONYM_LIBRARY)
-                        st.session_state.full_df = processed_df
-                        st.session_state.data_loaded = True
-                        st.session_state.messages = []
-                        st.session_state.raw_df_history = []
-                        st.session_state.uploaded_file_name = uploaded_file.name
-                        st.session_state.active_archetype = None 
-                        st.session_state.current_analyst_note = None
-                        st.session_state.selected_player_for_note = None
-                        st.success("Data processed successfully!")
-                        st.info("You can now chat with the Copilot in the main window.")
-                        
-                    except ValueError as e:
-                        st.error(f"File Processing Error: {e}")
-                        st.session_state.data_loaded = False
-                        st.session_state.uploaded_file_name = None
+            # Re-uploading a new version of the same file (e.g. the next matchday's export) also triggers processing.
+            # Parsing runs in the background; the dataset is installed on the rerun after it finished.
+            task_session_key = st.session_state.task_session_key
+            if (uploaded_file is not None and uploaded_file.file_id not in (st.session_state.uploaded_file_id, st.session_state.failed_file_id)
+                    and getattr(get_task(task_session_key, "dataset_ingest"), "tag", None) != uploaded_file.file_id):
+                # A new dataset supersedes any note still being written for the previous one.
+                cancel_tasks(task_session_key, "analyst_note")
+                file_name, file_id = uploaded_file.name, uploaded_file.file_id
+                submit_task(
+                    task_session_key, "dataset_ingest", f"Processing '{file_name}'",
+                    self._ingest_dataset, uploaded_file.getvalue(), st.session_state.full_df, snapshot_date,
+                    snapshot_series.strip() or default_series(file_name), replace_snapshot,
+                    on_done=lambda result: self._on_dataset_ingested(file_name, file_id, result),
+                    on_error=lambda error: self._on_dataset_failed(file_id, error),
+                    tag=file_id
+                )
 
             # --- RENDER THE NEW WIZARD IN THE SIDEBAR ---
             st.divider()
@@ -157,31 +343,90 @@ class WebUI:
 
             if uploaded_logbooks:
                 for logbook_file in uploaded_logbooks:
-                    # Use the file's unique ID to prevent reprocessing the same file on reruns
-                    if (logbook_file.name, logbook_file.size) not in st.session_state.get('processed_logbooks', set()):
-                        with st.spinner(f"Loading logbook '{logbook_file.name}'..."):
-                            load_logbook(logbook_file) # This function will add it to st.session_state['logbooks']
-                        
-                        # Add the ID to a set of processed files
-                        if 'processed_logbooks' not in st.session_state:
-                         st.session_state['processed_logbooks'] = set()
-                         st.session_state.processed_logbooks.add((logbook_file.name, logbook_file.size))
+                    # The file's name and size prevent reprocessing the same file on reruns
+                    file_key = (logbook_file.name, logbook_file.size)
+                    if file_key in st.session_state.processed_logbooks or getattr(get_task(task_session_key, f"logbook:{logbook_file.name}"), "tag", None) == file_key:
+                        continue
+                    file_name, raw_bytes = logbook_file.name, logbook_file.getvalue()
+                    submit_task(
+                        task_session_key, f"logbook:{file_name}", f"Loading logbook '{file_name}'",
+                        lambda task, name=file_name, raw=raw_bytes: parse_logbook(name, raw),
+                        on_done=lambda result, name=file_name, key=file_key: self._on_logbook_loaded(name, key, result),
+                        on_error=lambda error, name=file_name, key=file_key: self._on_logbook_failed(name, key, error),
+                        tag=file_key
+                    )
 
             # Move the creator wizard to be the third item
             st.divider()
             st.subheader("3. Create a New Logbook Template")
             self._render_creator_wizard()
 
+    @staticmethod
+    def _compact_message(role: str, content: str, dataframe: pd.DataFrame = None, plotly_fig=None, tool_calls: list = None) -> dict:
+        """
+        Builds the compact form of a chat message that is kept in st.session_state.messages.
+
+        Tables are truncated to the page that is actually displayed and Plotly figures are
+        serialized to JSON once, so that long sessions do not keep every full DataFrame
+        and live figure object alive (and re-serialize them) on every rerun. The executed tool calls
+        are kept so older turns can later be compacted into a conversation state summary.
+        """
+        msg = {"role": role, "content": content}
+        if tool_calls:
+            msg["tool_calls"] = tool_calls
+        if dataframe is not None and not dataframe.empty:
+            msg["dataframe"] = dataframe.head(CHAT_TABLE_PAGE_ROWS).reset_index(drop=True)
+            msg["total_rows"] = len(dataframe)
+        if plotly_fig is not None:
+            msg["plotly_fig_json"] = plotly_fig.to_json()
+        return msg
+
+    @staticmethod
+    def _render_message_payload(msg: dict):
+        """Renders the table and/or chart attached to a stored (compact) chat message."""
+        if msg.get("payload_evicted"):
+            st.caption("The table/chart of this message was discarded to stay within the session's memory budget.")
+            return
+        if msg.get("spilled_payload"):
+            # Evicted to disk by the memory accountant; read back only when the message is opened.
+            msg = {**msg, **(load_spilled(msg["spilled_payload"]) or {})}
+        if msg.get("dataframe") is not None:
+            st.dataframe(msg["dataframe"], use_container_width=True, hide_index=True)
+            total_rows = msg.get("total_rows", len(msg["dataframe"]))
+            if total_rows > len(msg["dataframe"]):
+                st.caption(f"Showing the top {len(msg['dataframe'])} of {total_rows} players.")
+        if msg.get("plotly_fig_json"):
+            st.plotly_chart(json.loads(msg["plotly_fig_json"]), use_container_width=True)
+
+    def _render_history(self):
+        """
+        Renders the stored chat history with a fixed-size render window.
+
+        Only the most recent CHAT_RENDER_WINDOW messages are rendered in full. Older messages
+        collapse to a one-line summary; their text, table and chart are only rendered when the
+        user expands them, which keeps rerun time flat as the conversation grows.
+        """
+        messages = st.session_state.messages
+        window_start = max(0, len(messages) - CHAT_RENDER_WINDOW)
+
+        for i, msg in enumerate(messages):
+            with st.chat_message(msg["role"]):
+                if i >= window_start:
+                    st.markdown(msg["content"])
+                    self._render_message_payload(msg)
+                    continue
+
+                first_line = msg["content"].strip().splitlines()[0] if msg["content"].strip() else ""
+                summary = first_line if len(first_line) <= 120 else first_line[:117] + "..."
+                has_payload = msg.get("dataframe") is not None or bool(msg.get("plotly_fig_json") or msg.get("spilled_payload"))
+                st.caption(summary + (" 📊" if has_payload else ""))
+                if st.toggle("Show full message", key=f"expand_message_{i}"):
+                    st.markdown(msg["content"])
+                    self._render_message_payload(msg)
+
     def _render_chat(self):
         """Renders the main chat interface for user interaction."""
-        # This part of the function remains the same, rendering previous messages.
-        for msg in st.session_state.messages:
-            with st.chat_message(msg["role"]):
-                st.markdown(msg["content"])
-                if "dataframe" in msg and msg["dataframe"] is not None:
-                    st.dataframe(msg["dataframe"], use_container_width=True, hide_index=True)
-                if "plotly_fig" in msg and msg["plotly_fig"] is not None:
-                    st.plotly_chart(msg["plotly_fig"], use_container_width=True)
+        self._render_history()
 
         if st.session_state.get('logbooks'):
             with st.expander("✅ View Loaded Logbooks"):
@@ -199,30 +444,36 @@ class WebUI:
                 with st.spinner("Analyzing..."):
                     last_result_df = st.session_state.raw_df_history[-1] if st.session_state.raw_df_history else None
                     
-                    chat_history_for_agent = [
-                        {"role": msg["role"], "content": msg["content"]}
-                        for msg in st.session_state.messages[:-1]
-                    ]
+                    # Only the recent turns are sent verbatim; older ones are compacted into a state summary.
+                    chat_history_for_agent = st.session_state.context_manager.build(
+                        st.session_state.messages[:-1],
+                        current_columns=list(last_result_df.columns) if last_result_df is not None else None
+                    )
 
                     agent_response = self.agent.process_query(
                         query=prompt,
                         chat_history=chat_history_for_agent,
                         full_df=st.session_state.full_df,
                         last_result_df=last_result_df,
-                        active_archetype=st.session_state.active_archetype
+                        active_archetype=st.session_state.active_archetype,
+                        snapshot_series=st.session_state.snapshot_series
                     )
 
-                    tool_call = agent_response.get("tool_call")
-                    if tool_call:
+                    tool_calls = agent_response.get("tool_calls") or []
+                    # A plan of several tool calls is applied step by step, in order.
+                    for tool_call in tool_calls:
                         tool_name = tool_call.get("name")
                         tool_args = tool_call.get("arguments", {})
 
                         if tool_name == 'new_search':
                             st.session_state.active_archetype = tool_args.get('archetype_name')
-                            # Clear any previous note when starting a new search
+                            # Clear any previous note (and stop one being written) when starting a new search
                             st.session_state.current_analyst_note = None
+                            cancel_tasks(st.session_state.task_session_key, "analyst_note")
                         elif tool_name == 'filter_and_sort' and tool_args.get('add_archetype_as_column'):
                             st.session_state.active_archetype = tool_args.get('add_archetype_as_column')
+                        elif tool_name == 'find_similar_players' and tool_args.get('archetype_name'):
+                            st.session_state.active_archetype = tool_args.get('archetype_name')
 
                     st.markdown(agent_response["summary_text"])
                     if agent_response.get("dataframe") is not None and not agent_response.get("dataframe").empty:
@@ -232,17 +483,25 @@ class WebUI:
 
                     if agent_response.get("raw_dataframe") is not None and not agent_response.get("raw_dataframe").empty:
                         st.session_state.raw_df_history.append(agent_response["raw_dataframe"])
-                    elif tool_call and tool_call.get("name") == "create_plot" and last_result_df is not None:
+                    elif any(call.get("name") == "create_plot" for call in tool_calls) and last_result_df is not None:
                         st.session_state.raw_df_history.append(last_result_df)
+
+                    # While the scout reads a new shortlist, the notes of its top players are generated in the background.
+                    new_result = agent_response.get("raw_dataframe")
+                    if any(call.get("name") == "new_search" for call in tool_calls) and new_result is not None and not new_result.empty:
+                        self.agent.prewarm_analyst_notes(
+                            new_result, st.session_state.full_df, st.session_state.active_archetype,
+                            cohort=NOTE_COHORT_OPTIONS.get(st.session_state.get("note_cohort"), "all")
+                        )
                     
-                    # Store the main response without the analyst note
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": agent_response["summary_text"],
-                        "dataframe": agent_response.get("dataframe"),
-                        "plotly_fig": agent_response.get("plotly_fig"),
-                        # Note: 'analyst_note' is no longer part of this message object
-                    })
+                    # Store the main response (compacted) without the analyst note
+                    st.session_state.messages.append(self._compact_message(
+                        role="assistant",
+                        content=agent_response["summary_text"],
+                        dataframe=agent_response.get("dataframe"),
+                        plotly_fig=agent_response.get("plotly_fig"),
+                        tool_calls=tool_calls,
+                    ))
 
         # --- ON-DEMAND INSIGHTS UI SECTION ---
         # This entire block is new. It runs outside the main chat input loop,
@@ -259,28 +518,39 @@ class WebUI:
 
                 # ---------------------- CHANGE 2.2: ADDITION START ---------------------
                 # This renders the dropdown and button, giving the user control.
-                player_list = latest_results['full_name'].tolist()
+                player_options, player_names = self._note_player_options(latest_results)
                 st.selectbox(
                     "Select a player to analyze:",
-                    options=player_list,
+                    options=player_options,
+                    format_func=lambda option: player_names.get(option, str(option)),
                     key="selected_player_for_note" # Links this widget to our session state variable
                 )
 
+                cohort_label = st.selectbox("Compare percentiles against:", options=list(NOTE_COHORT_OPTIONS), key="note_cohort")
+
                 generate_button = st.button("Generate Analyst's Note")
                 # ---------------------- CHANGE 2.2: ADDITION END -----------------------
                 
                 # ---------------------- CHANGE 2.3: ADDITION START ---------------------
                 # This implements the on-click logic for the button.
                 if generate_button:
-                    with st.spinner(f"Generating note for {st.session_state.selected_player_for_note}..."):
-                        # Retrieve all necessary context from the session state
-                        note = self.agent.generate_on_demand_insight(
-                            player_name=st.session_state.selected_player_for_note,
-                            full_df=st.session_state.full_df,
-                            active_archetype=st.session_state.active_archetype
-                        )
-                        # Store the generated note in the session state
-                        st.session_state.current_analyst_note = note
+                    # Retrieve all necessary context from the session state; the note is written in the
+                    # background and stored in the session state when it is ready.
+                    player_ref = st.session_state.selected_player_for_note
+                    full_df = st.session_state.full_df
+                    active_archetype = st.session_state.active_archetype
+                    cohort = NOTE_COHORT_OPTIONS[cohort_label]
+                    st.session_state.current_analyst_note = None
+                    task = submit_task(
+                        st.session_state.task_session_key, "analyst_note", f"Generating note for {player_names.get(player_ref)}",
+                        lambda task: self.agent.generate_on_demand_insight(
+                            player_name=player_ref, full_df=full_df, active_archetype=active_archetype, cohort=cohort
+                        ),
+                        on_done=lambda note: st.session_state.update(current_analyst_note=note)
+                    )
+                    # Cached notes are ready almost at once and are shown in this run.
+                    wait([task.future], timeout=BACKGROUND_INLINE_WAIT_SECONDS)
+                    self._deliver_background_results()
                 # ---------------------- CHANGE 2.3: ADDITION END -----------------------
 
                 # ---------------------- CHANGE 2.4: ADDITION START ---------------------
@@ -289,12 +559,65 @@ class WebUI:
                     with st.container(border=True):
                         st.markdown(st.session_state.current_analyst_note)
 
+    @staticmethod
+    def _note_player_options(latest_results: pd.DataFrame):
+        """
+        Returns the Analyst's Note player options of a result (player ids, or names if the dataset has
+        no ids) and their display names, built once per result rather than on every rerun.
+        """
+        cached = st.session_state.get("note_player_options")
+        if cached is None or cached[0] is not latest_results:
+            names = latest_results['full_name'].astype(str)
+            options = latest_results['player_id'].tolist() if 'player_id' in latest_results.columns else names.tolist()
+            cached = (latest_results, options, dict(zip(options, names)))
+            st.session_state.note_player_options = cached
+        return cached[1], cached[2]
+
+    @staticmethod
+    def _session_id() -> str:
+        """Returns the id of the current browser session ('local' outside a Streamlit server)."""
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx is not None else "local"
+
+    def _account_memory(self):
+        """
+        Measures this session's state, enforces the per-session and per-process memory budgets
+        and renders the memory diagnostics panel in the sidebar.
+        """
+        session_id = self._session_id()
+        sizes = measure_session(st.session_state)
+        usage = record_session_usage(session_id, sum(sizes.values()))
+        evicted = enforce_budget(st.session_state, session_id, usage["session_budget_bytes"], sizes)
+        if evicted:
+            sizes = measure_session(st.session_state)
+            usage = record_session_usage(session_id, sum(sizes.values()))
+
+        mb = 1024 * 1024
+        with st.sidebar:
+            with st.expander("🧠 Memory diagnostics"):
+                session_total = sum(sizes.values())
+                st.metric("This session", f"{session_total / mb:.1f} MB", help=f"Budget: {usage['session_budget_bytes'] / mb:.0f} MB")
+                st.metric("Whole server", f"{usage['process_bytes'] / mb:.1f} MB",
+                          help=f"{usage['active_sessions']} active session(s); shared datasets: {usage['shared_bytes'] / mb:.1f} MB")
+                entries = pd.DataFrame({"entry": list(sizes), "MB": [size / mb for size in sizes.values()]})
+                st.dataframe(entries.sort_values("MB", ascending=False).round(3), use_container_width=True, hide_index=True)
+                for item in evicted:
+                    st.caption(f"Evicted: {item}")
+
     def run(self):
         """The main execution method that renders the entire UI."""
         self._initialize_session_state()
+        self._deliver_background_results()
         self._render_sidebar()
         
         if st.session_state.data_loaded:
             self._render_chat() # This part will be enhanced in later sprints
         else:
             st.info("👋 Welcome to the 1stScout Demo! Please upload a CSV file or create a new logbook template to get started.")
+
+        # Rendered last, so it also tracks the tasks started anywhere in this run.
+        if session_tasks(st.session_state.task_session_key):
+            with st.sidebar:
+                self._render_background_tasks()
+
+        self._account_memory()
@@ -0,0 +1,191 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config.settings import BACKGROUND_THREAD_WORKERS, BACKGROUND_PROCESS_WORKERS
+
+
+class TaskCancelled(Exception):
+    """Raised inside a background job that was cancelled, to stop it early."""
+
+
+class BackgroundTask:
+    """
+    One long-running job of a session (e.g. a dataset ingest or an Analyst's Note), run off the
+    Streamlit script thread.
+
+    The job receives its task as first argument and may report its progress and check for
+    cancellation through it. When the job finishes, its result is handed to `on_done` (or its
+    exception to `on_error`) on the session's next rerun, in the script thread, so the callbacks
+    can update session state and render messages.
+    """
+
+    def __init__(self, name: str, label: str, on_done: Callable[[Any], None] = None,
+                 on_error: Callable[[Exception], None] = None, tag: Any = None):
+        self.name = name
+        self.label = label
+        self.on_done = on_done
+        self.on_error = on_error
+        # Identifies what the task is working on (e.g. the uploaded file), so it is not started twice.
+        self.tag = tag
+        self.progress = 0.0
+        self.message = "Queued"
+        self.started_at = time.time()
+        self.future: Optional[Future] = None
+        self._cancel_event = threading.Event()
+
+    def report(self, progress: float, message: str = None) -> None:
+        """Records the job's progress (0-1) and what it is currently doing; stops it if it was cancelled."""
+        self.raise_if_cancelled()
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        if message:
+            self.message = message
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._cancel_event.is_set():
+            raise TaskCancelled(self.name)
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def deliver(self) -> None:
+        """Hands the finished job's result (or error) to its callbacks. Must be called from the script thread."""
+        error = self.future.exception()
+        if error is None:
+            if self.on_done:
+                self.on_done(self.future.result())
+        elif self.on_error:
+            self.on_error(error)
+        else:
+            print(f"ERROR: Background task '{self.label}' failed. Details: {error}")
+
+
+# --- Process-level pools and registry ---
+# I/O-bound jobs (LLM calls, small files) run on the thread pool; CPU-bound steps of a job
+# (parsing a large dataset) are shipped to the process pool with run_cpu_bound.
+_THREAD_POOL = ThreadPoolExecutor(max_workers=BACKGROUND_THREAD_WORKERS, thread_name_prefix="background-task")
+_PROCESS_POOL: Optional[ProcessPoolExecutor] = None
+_LOCK = threading.Lock()
+# {(session key, task name): task}; a task stays here until delivered or cancelled.
+_TASKS: Dict[Tuple[str, str], BackgroundTask] = {}
+
+
+def _process_pool() -> Optional[ProcessPoolExecutor]:
+    """Returns the shared process pool, starting it on first use (None if disabled)."""
+    global _PROCESS_POOL
+    if BACKGROUND_PROCESS_WORKERS <= 0:
+        return None
+    with _LOCK:
+        if _PROCESS_POOL is None:
+            # 'spawn' rather than 'fork': the server process runs many threads, which forking does not support safely.
+            _PROCESS_POOL = ProcessPoolExecutor(max_workers=BACKGROUND_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _PROCESS_POOL
+
+
+def run_cpu_bound(task: BackgroundTask, fn: Callable, *args: Any) -> Any:
+    """
+    Runs a CPU-bound function in the process pool from inside a background job and returns its result.
+
+    `fn` and its arguments must be picklable (a module-level function). The call is abandoned as
+    soon as the task is cancelled. If the process pool is disabled or unavailable, `fn` runs in
+    the calling thread.
+
+    Raises:
+        TaskCancelled: If the task is cancelled while waiting.
+    """
+    global _PROCESS_POOL
+    pool = _process_pool()
+    if pool is None:
+        return fn(*args)
+    try:
+        future = pool.submit(fn, *args)
+        while True:
+            try:
+                return future.result(timeout=0.1)
+            except TimeoutError:
+                if task.cancelled:
+                    future.cancel()
+                    raise TaskCancelled(task.name)
+    except BrokenProcessPool as e:
+        print(f"DIAGNOSTIC: Process pool unavailable ({e}); running '{task.label}' in its thread instead.")
+        with _LOCK:
+            _PROCESS_POOL = None
+        return fn(*args)
+
+
+def _run(task: BackgroundTask, fn: Callable, args: tuple, kwargs: dict) -> Any:
+    task.raise_if_cancelled()
+    task.message = "Running"
+    return fn(task, *args, **kwargs)
+
+
+def submit_task(session_key: str, name: str, label: str, fn: Callable, *args: Any,
+                on_done: Callable[[Any], None] = None, on_error: Callable[[Exception], None] = None,
+                tag: Any = None, **kwargs: Any) -> BackgroundTask:
+    """
+    Starts a job in the background for a session, replacing (cancelling) its previous task of the same name.
+
+    Args:
+        session_key: Identifies the session that receives the result.
+        name: The kind of task, e.g. 'dataset_ingest'; a session runs at most one task per name.
+        label: What the task does, as shown to the user.
+        fn: The job, called as fn(task, *args, **kwargs) on the thread pool.
+        on_done: Called with the job's result on the session's next rerun.
+        on_error: Called with the job's exception on the session's next rerun.
+        tag: Identifies what the task works on (see BackgroundTask).
+
+    Returns:
+        The started task.
+    """
+    task = BackgroundTask(name, label, on_done=on_done, on_error=on_error, tag=tag)
+    with _LOCK:
+        previous = _TASKS.get((session_key, name))
+        _TASKS[(session_key, name)] = task
+    if previous is not None:
+        previous.cancel()
+        print(f"DIAGNOSTIC: Cancelled background task '{previous.label}' (superseded).")
+    task.future = _THREAD_POOL.submit(_run, task, fn, args, kwargs)
+    return task
+
+
+def get_task(session_key: str, name: str) -> Optional[BackgroundTask]:
+    """Returns the session's running or undelivered task of that name, if any."""
+    with _LOCK:
+        return _TASKS.get((session_key, name))
+
+
+def session_tasks(session_key: str) -> List[BackgroundTask]:
+    """Returns all running and undelivered tasks of a session, oldest first."""
+    with _LOCK:
+        tasks = [task for (key, _), task in _TASKS.items() if key == session_key]
+    return sorted(tasks, key=lambda task: task.started_at)
+
+
+def cancel_tasks(session_key: str, name: str = None) -> int:
+    """Cancels a session's task of the given name, or all of its tasks. Their results are never delivered."""
+    with _LOCK:
+        keys = [key for key in _TASKS if key[0] == session_key and (name is None or key[1] == name)]
+        cancelled = [_TASKS.pop(key) for key in keys]
+    for task in cancelled:
+        task.cancel()
+    return len(cancelled)
+
+
+def collect_finished(session_key: str) -> List[BackgroundTask]:
+    """Removes and returns a session's finished tasks, ready to be delivered."""
+    with _LOCK:
+        keys = [key for key, task in _TASKS.items() if key[0] == session_key and task.done()]
+        finished = [_TASKS.pop(key) for key in keys]
+    return [task for task in finished if not task.future.cancelled()]
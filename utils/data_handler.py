@@ -1,6 +1,89 @@
+import numpy as np
 import pandas as pd
 import io
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+
+# Object columns whose distinct values are at most this share of their non-null values are stored as 'category'.
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def build_reverse_synonym_map(synonym_library: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Creates a reverse mapping from any possible synonym to its single canonical name.
+
+    The keys are standardized (lowercase, stripped space) to handle variations in user CSV files.
+
+    Args:
+        synonym_library: The loaded JSON from nlu_synonym_library.json.
+
+    Returns:
+        A dictionary {standardized synonym: canonical column name}.
+    """
+    reverse_synonym_map = {}
+    for canonical_name, synonyms in synonym_library.get("synonym_library", {}).items():
+        for synonym in synonyms:
+            reverse_synonym_map[synonym.strip().lower()] = canonical_name
+    return reverse_synonym_map
+
+
+def map_columns_to_canonical(columns: List[str], reverse_synonym_map: Dict[str, str]) -> Tuple[List[str], Dict[str, str], List[str]]:
+    """
+    Maps raw column headers to their canonical names.
+
+    Args:
+        columns: The headers as found in the file.
+        reverse_synonym_map: The map returned by build_reverse_synonym_map.
+
+    Returns:
+        A tuple of (new column names, {original: canonical} for mapped columns, [unmapped originals]).
+        Columns without a mapping keep their original name.
+    """
+    new_columns = []
+    mapped_cols_report = {}
+    unmapped_cols_report = []
+    for original_col_name in columns:
+        canonical_col = reverse_synonym_map.get(str(original_col_name).strip().lower())
+        if canonical_col is not None:
+            new_columns.append(canonical_col)
+            mapped_cols_report[original_col_name] = canonical_col
+        else:
+            new_columns.append(original_col_name)
+            unmapped_cols_report.append(original_col_name)
+    return new_columns, mapped_cols_report, unmapped_cols_report
+
+
+def suggest_compact_dtype(series: pd.Series) -> str:
+    """
+    Returns the smallest dtype that holds a column's values without loss.
+
+    Integers are downcast to the narrowest signed type covering their range (nullable 'Int' types
+    if they have missing values), floats to float32, and repetitive text to 'category'.
+
+    Args:
+        series: The column (or a representative sample of it).
+
+    Returns:
+        The name of the suggested dtype, e.g. 'int16', 'Int32', 'float32', 'category' or 'bool'.
+    """
+    values = series.dropna()
+    if pd.api.types.is_bool_dtype(series):
+        return 'bool' if len(values) == len(series) else 'boolean'
+    if pd.api.types.is_numeric_dtype(series):
+        if values.empty:
+            return 'float32'
+        is_integral = pd.api.types.is_integer_dtype(series) or bool(np.all(np.mod(values.to_numpy(dtype='float64'), 1) == 0))
+        if not is_integral:
+            return 'float32'
+        low, high = values.min(), values.max()
+        for int_type in ('int8', 'int16', 'int32', 'int64'):
+            info = np.iinfo(int_type)
+            if info.min <= low and high <= info.max:
+                return int_type if len(values) == len(series) else int_type.capitalize()
+        return 'float64'
+    if len(values) and values.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(values):
+        return 'category'
+    return str(series.dtype)
+
 
 def process_uploaded_csv(uploaded_file: Any, synonym_library: Dict[str, Any]) -> pd.DataFrame:
     """
@@ -32,32 +115,9 @@ def process_uploaded_csv(uploaded_file: Any, synonym_library: Dict[str, Any]) ->
         # If pandas cannot read the file, raise an error to be caught by the UI
         raise ValueError(f"Could not parse the uploaded file. Please ensure it is a valid CSV. Error: {e}")
 
-    # Create a reverse mapping from any possible synonym to its single canonical name.
-    # This allows for fast lookups. The keys are standardized (lowercase, stripped space)
-    # to handle variations in user CSV files.
-    reverse_synonym_map = {}
-    for canonical_name, synonyms in synonym_library.get("synonym_library", {}).items():
-        for synonym in synonyms:
-            reverse_synonym_map[synonym.strip().lower()] = canonical_name
-
-    # Map the original headers to the new canonical headers.
-    new_columns = []
-    mapped_cols_report = {}
-    unmapped_cols_report = []
-
-    for original_col_name in df.columns:
-        standardized_col_name = original_col_name.strip().lower()
-        
-        if standardized_col_name in reverse_synonym_map:
-            # A mapping was found; use the canonical name.
-            canonical_col = reverse_synonym_map[standardized_col_name]
-            new_columns.append(canonical_col)
-            mapped_cols_report[original_col_name] = canonical_col
-        else:
-            # No mapping was found; retain the original column name.
-            new_columns.append(original_col_name)
-            unmapped_cols_report.append(original_col_name)
-    
+    # Map the original headers to the canonical headers through a reverse synonym lookup.
+    reverse_synonym_map = build_reverse_synonym_map(synonym_library)
+    new_columns, mapped_cols_report, unmapped_cols_report = map_columns_to_canonical(list(df.columns), reverse_synonym_map)
     df.columns = new_columns
 
     # Log a report to the console for diagnostics and debugging.
@@ -0,0 +1,92 @@
+import pandas as pd
+from typing import List, Set
+
+
+class DatasetDiff:
+    """
+    The row- and column-level difference between two versions of a player dataset, keyed on player_id.
+
+    Attributes:
+        key: The identifier column the versions were aligned on.
+        added_ids: Identifiers present only in the new version.
+        removed_ids: Identifiers present only in the old version.
+        changed_ids: Identifiers present in both versions with at least one changed value.
+        changed_columns: Columns with at least one changed value, plus columns added or removed.
+        rows_aligned: True if both versions hold the same identifiers in the same row order.
+    """
+
+    def __init__(self, key: str, added_ids: List, removed_ids: List, changed_ids: List, changed_columns: Set[str], rows_aligned: bool):
+        self.key = key
+        self.added_ids = added_ids
+        self.removed_ids = removed_ids
+        self.changed_ids = changed_ids
+        self.changed_columns = changed_columns
+        self.rows_aligned = rows_aligned
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added_ids or self.removed_ids or self.changed_ids or self.changed_columns)
+
+    @property
+    def touched_ids(self) -> List:
+        """Identifiers whose rows must be (re)computed in the new version: changed plus added."""
+        return self.changed_ids + self.added_ids
+
+    def summary(self) -> str:
+        """A one-line, human-readable description of the update."""
+        if self.is_empty:
+            return "No changes compared to the previous version of the dataset."
+        columns = sorted(self.changed_columns)
+        column_text = f" across {len(columns)} column(s): {', '.join(columns[:8])}{'...' if len(columns) > 8 else ''}" if columns else ""
+        return (f"{len(self.changed_ids)} player(s) changed, {len(self.added_ids)} added and "
+                f"{len(self.removed_ids)} removed{column_text}.")
+
+
+def diff_datasets(old_df: pd.DataFrame, new_df: pd.DataFrame, key: str = 'player_id') -> DatasetDiff:
+    """
+    Compares two versions of a dataset row-by-row on an identifier column.
+
+    The comparison is fully vectorized: both versions are aligned on `key` and compared
+    column-wise, treating two missing values as equal.
+
+    Args:
+        old_df: The previous version of the dataset.
+        new_df: The newly uploaded version of the dataset.
+        key: The identifier column. Must be present and unique in both versions.
+
+    Returns:
+        A DatasetDiff describing added, removed and changed players and the changed columns.
+
+    Raises:
+        ValueError: If the key column is missing or not unique in either version.
+    """
+    for name, df in (("previous", old_df), ("new", new_df)):
+        if key not in df.columns:
+            raise ValueError(f"The {name} dataset has no '{key}' column; an incremental update is not possible.")
+        if not df[key].is_unique:
+            raise ValueError(f"The '{key}' column of the {name} dataset is not unique; an incremental update is not possible.")
+
+    old_ids = pd.Index(old_df[key])
+    new_ids = pd.Index(new_df[key])
+    added_ids = new_ids.difference(old_ids).tolist()
+    removed_ids = old_ids.difference(new_ids).tolist()
+    common_ids = new_ids.intersection(old_ids, sort=False)
+
+    shared_columns = [c for c in new_df.columns if c in old_df.columns and c != key]
+    changed_columns = set(new_df.columns).symmetric_difference(old_df.columns) - {key}
+
+    old_common = old_df.set_index(key).loc[common_ids, shared_columns]
+    new_common = new_df.set_index(key).loc[common_ids, shared_columns]
+    differs = (old_common != new_common) & ~(old_common.isna() & new_common.isna())
+
+    changed_ids = common_ids[differs.any(axis=1).to_numpy()].tolist()
+    changed_columns |= set(differs.columns[differs.any(axis=0).to_numpy()])
+
+    return DatasetDiff(
+        key=key,
+        added_ids=added_ids,
+        removed_ids=removed_ids,
+        changed_ids=changed_ids,
+        changed_columns=changed_columns,
+        rows_aligned=old_ids.equals(new_ids),
+    )
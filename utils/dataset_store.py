@@ -0,0 +1,157 @@
+import hashlib
+import threading
+import weakref
+import pandas as pd
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Shared frames are handed out to many sessions at once, so every derived frame must be
+# copy-on-write: adding a column or filtering in one session can never write through to
+# the shared data. This is always the case from pandas 3.0 onwards.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# --- Process-level registries ---
+# Datasets are held weakly: an entry lives exactly as long as at least one session
+# (st.session_state.full_df) still references it, and is freed with the last one.
+_LOCK = threading.Lock()
+_DATASETS: "weakref.WeakValueDictionary[str, pd.DataFrame]" = weakref.WeakValueDictionary()
+
+# Per-dataset derived artifacts (indexes, lookup tables, ...), keyed by id() of the
+# dataset they were built from and dropped automatically when that dataset is freed.
+_ARTIFACTS: Dict[int, Dict[str, Any]] = {}
+
+
+def compute_content_hash(raw_bytes: bytes) -> str:
+    """Returns the hex SHA-256 digest used as the registry key for a dataset's raw bytes."""
+    return hashlib.sha256(raw_bytes).hexdigest()
+
+
+def get_or_register_dataset(raw_bytes: bytes, loader: Callable[[bytes], pd.DataFrame], variant: str = None) -> Tuple[str, pd.DataFrame]:
+    """
+    Returns the shared, read-only DataFrame for an uploaded dataset, loading it only once per process.
+
+    Every session that uploads the same provider export (byte-for-byte) receives a reference
+    to the same DataFrame instead of its own parsed copy, so the memory cost of each additional
+    scout is close to zero. Sessions must treat the returned frame as immutable; all per-session
+    columns and filters are layered on top of it via copy-on-write.
+
+    Args:
+        raw_bytes: The raw content of the uploaded file.
+        loader: A callable that parses the raw bytes into a canonical DataFrame. It is only
+                invoked on a cache miss.
+        variant: Set when the loader's result also depends on something other than the bytes
+                 (e.g. the reference date of time-dependent columns); it becomes part of the key,
+                 so the same bytes loaded for another variant are a separate dataset.
+
+    Returns:
+        A tuple of (dataset key, shared_dataframe). The key is the content hash, followed by
+        ':<variant>' if a variant is given.
+
+    Raises:
+        ValueError: Propagated from the loader if the bytes cannot be parsed.
+    """
+    key = compute_content_hash(raw_bytes)
+    if variant:
+        key = f"{key}:{variant}"
+
+    with _LOCK:
+        df = _DATASETS.get(key)
+    if df is not None:
+        print(f"DIAGNOSTIC: Reusing shared dataset '{key[:12]}' ({len(df)} rows) from the process-level store.")
+        return key, df
+
+    # Parse outside the lock so a slow upload does not block other sessions.
+    df = loader(raw_bytes)
+
+    with _LOCK:
+        # Another session may have registered the same content while we were parsing.
+        existing = _DATASETS.get(key)
+        if existing is not None:
+            return key, existing
+        _DATASETS[key] = df
+
+    print(f"DIAGNOSTIC: Registered shared dataset '{key[:12]}' ({len(df)} rows).")
+    return key, df
+
+
+def registered_datasets() -> List[pd.DataFrame]:
+    """Returns the shared datasets currently alive in the process (held by at least one session)."""
+    with _LOCK:
+        return list(_DATASETS.values())
+
+
+def dataset_key_of(df: pd.DataFrame) -> Optional[str]:
+    """Returns the content hash a shared dataset was registered under, or None for an unregistered frame."""
+    with _LOCK:
+        return next((key for key, registered in _DATASETS.items() if registered is df), None)
+
+
+def get_dataset_artifact(df: pd.DataFrame, name: str, builder: Callable[[pd.DataFrame], Any]) -> Any:
+    """
+    Returns a derived artifact (index, lookup table, statistics) for a dataset, building it once.
+
+    Artifacts are cached per dataset object and shared by every session that holds that dataset.
+    They are released automatically when the dataset itself is garbage-collected.
+
+    Args:
+        df: The (shared) dataset the artifact is derived from.
+        name: A unique name for the artifact, e.g. 'similarity_index:Winger'.
+        builder: A callable that builds the artifact from the dataset on a cache miss.
+
+    Returns:
+        The cached or newly built artifact.
+    """
+    with _LOCK:
+        artifacts = _artifacts_for(df)
+        if name in artifacts:
+            return artifacts[name]
+
+    artifact = builder(df)
+
+    with _LOCK:
+        return artifacts.setdefault(name, artifact)
+
+
+def carry_over_artifacts(old_df: pd.DataFrame, new_df: pd.DataFrame, diff: Any) -> Dict[str, str]:
+    """
+    Moves the derived artifacts of a previous dataset version onto its new version.
+
+    Every artifact that implements `refresh(old_df, new_df, diff)` is asked to update itself
+    incrementally from the diff (so the cost is proportional to what changed); it may return
+    None if the change invalidates it. Artifacts without a refresh hook, or that return None,
+    are not carried over and are rebuilt lazily on first use.
+
+    Args:
+        old_df: The previous version of the dataset.
+        new_df: The newly registered version of the dataset.
+        diff: The DatasetDiff between the two versions (see utils.dataset_diff).
+
+    Returns:
+        A dictionary mapping each artifact name to 'refreshed' or 'dropped'.
+    """
+    with _LOCK:
+        old_artifacts = dict(_ARTIFACTS.get(id(old_df), {}))
+
+    report = {}
+    for name, artifact in old_artifacts.items():
+        refresh = getattr(artifact, 'refresh', None)
+        refreshed = refresh(old_df, new_df, diff) if refresh else None
+        if refreshed is None:
+            report[name] = 'dropped'
+            continue
+        with _LOCK:
+            _artifacts_for(new_df).setdefault(name, refreshed)
+        report[name] = 'refreshed'
+
+    print(f"DIAGNOSTIC: Carried over dataset artifacts: {report}")
+    return report
+
+
+def _artifacts_for(df: pd.DataFrame) -> Dict[str, Any]:
+    """Returns (creating if needed) the artifact dictionary of a dataset. Must be called with _LOCK held."""
+    dataset_id = id(df)
+    artifacts = _ARTIFACTS.get(dataset_id)
+    if artifacts is None:
+        artifacts = _ARTIFACTS[dataset_id] = {}
+        weakref.finalize(df, _ARTIFACTS.pop, dataset_id, None)
+    return artifacts
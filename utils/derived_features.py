@@ -0,0 +1,156 @@
+import datetime
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.dataset_store import get_dataset_artifact
+
+
+class DerivedFeature:
+    """
+    A column computed from other columns of the dataset, materialized once per dataset at ingest.
+
+    Attributes:
+        name: The derived column's name.
+        inputs: The columns it is computed from (raw columns or earlier derived features).
+        compute: Called as compute(df, context) and returns the column as a vectorized Series.
+        description: What the column holds, as shown to the agent.
+        time_dependent: True if the value also depends on the dataset's reference date, so it is
+                        never carried over from a previous version of the dataset.
+    """
+
+    def __init__(self, name: str, inputs: List[str], compute: Callable[[pd.DataFrame, Dict[str, Any]], pd.Series],
+                 description: str, time_dependent: bool = False):
+        self.name = name
+        self.inputs = inputs
+        self.compute = compute
+        self.description = description
+        self.time_dependent = time_dependent
+
+
+def _contract_months_left(df: pd.DataFrame, context: Dict[str, Any]) -> pd.Series:
+    expires = pd.to_datetime(df['contract_expires_on'], errors='coerce')
+    as_of = context['reference_date']
+    months = (expires.dt.year - as_of.year) * 12 + (expires.dt.month - as_of.month) - (expires.dt.day < as_of.day).astype(int)
+    # An expired contract has no months left.
+    return months.clip(lower=0).astype('float32')
+
+
+def _value_per_goal(df: pd.DataFrame, context: Dict[str, Any]) -> pd.Series:
+    goals = pd.to_numeric(df['goals'], errors='coerce')
+    value = pd.to_numeric(df['market_value_eur'], errors='coerce') / goals.where(goals > 0)
+    return value.astype('float32')
+
+
+def _position_category(df: pd.DataFrame, context: Dict[str, Any]) -> pd.Series:
+    position_to_category = {}
+    for category, positions in context['position_groupings'].items():
+        for position in positions:
+            # A position listed in several categories belongs to the first one (as in the percentile cohorts).
+            position_to_category.setdefault(position, category)
+    categories = pd.Categorical(df['primary_position'].map(position_to_category), categories=list(context['position_groupings']))
+    return pd.Series(categories, index=df.index)
+
+
+# The registry: materialized in this order, so a feature may use the features listed before it.
+DERIVED_FEATURES: List[DerivedFeature] = [
+    DerivedFeature(
+        'contract_months_left', ['contract_expires_on'], _contract_months_left,
+        "whole months until the player's contract expires, as of the data's date (0 if expired)",
+        time_dependent=True,
+    ),
+    DerivedFeature(
+        'value_per_goal', ['market_value_eur', 'goals'], _value_per_goal,
+        "market value in EUR per goal scored (empty for players without goals)",
+    ),
+    DerivedFeature(
+        'position_category', ['primary_position'], _position_category,
+        "'Forward', 'Midfielder', 'Defender' or 'Goalkeeper', from primary_position",
+    ),
+]
+
+
+def _rows_aligned(old_df: pd.DataFrame, new_df: pd.DataFrame, key: str = 'player_id') -> bool:
+    """True if both versions hold the same players in the same row order, so a column can be carried over as is."""
+    if len(old_df) != len(new_df):
+        return False
+    if key in old_df.columns and key in new_df.columns:
+        return old_df[key].equals(new_df[key])
+    return old_df.index.equals(new_df.index)
+
+
+def materialize_derived_features(df: pd.DataFrame, position_groupings: Dict[str, List[str]],
+                                 previous_df: Optional[pd.DataFrame] = None,
+                                 reference_date: Optional[datetime.date] = None) -> pd.DataFrame:
+    """
+    Adds every derived feature of the registry whose inputs are present as a compact column.
+
+    Called once per dataset, before it is shared, so queries filter and sort on the columns
+    directly instead of deriving them per call. If the previous version of the dataset is given
+    and holds the same players in the same order, a feature whose inputs are unchanged is carried
+    over from it instead of being recomputed.
+
+    Args:
+        df: The freshly parsed dataset.
+        position_groupings: Maps each position category to its positions (POSITION_GROUPINGS).
+        previous_df: The previous version of the dataset, if this upload replaces one.
+        reference_date: The date the data represents (the upload's "Data as of" date), which
+                        time-dependent features are computed against. Defaults to today.
+
+    Returns:
+        The dataset with the derived columns added. A column already supplied by the provider
+        export is left as is.
+    """
+    df = df.copy(deep=False)
+    context = {'reference_date': reference_date or datetime.date.today(), 'position_groupings': position_groupings}
+    aligned = previous_df is not None and _rows_aligned(previous_df, df)
+    computed, reused = [], []
+    for feature in DERIVED_FEATURES:
+        if feature.name in df.columns or not all(column in df.columns for column in feature.inputs):
+            continue
+        if (aligned and not feature.time_dependent and feature.name in previous_df.columns
+                and all(column in previous_df.columns and previous_df[column].equals(df[column]) for column in feature.inputs)):
+            df[feature.name] = previous_df[feature.name].to_numpy()
+            reused.append(feature.name)
+        else:
+            df[feature.name] = feature.compute(df, context)
+            computed.append(feature.name)
+    print(f"DIAGNOSTIC: Derived features computed: {computed or 'none'}; carried over from the previous version: {reused or 'none'}.")
+    return df
+
+
+def derived_feature_columns(df: pd.DataFrame) -> List[str]:
+    """Returns the derived feature columns present in a dataset, in registry order."""
+    return [feature.name for feature in DERIVED_FEATURES if feature.name in df.columns]
+
+
+def describe_derived_features(df: pd.DataFrame) -> str:
+    """Returns a description of the derived columns of a dataset ("'name': description; ..."), for the agent's prompt."""
+    return "; ".join(f"'{feature.name}': {feature.description}" for feature in DERIVED_FEATURES if feature.name in df.columns)
+
+
+class PositionRows:
+    """
+    The row positions of every position category's players, for selecting a search's candidates
+    without an `isin` scan of primary_position per query. As in POSITION_GROUPINGS, a position
+    may belong to several categories (e.g. Attacking Midfielder to Forward and Midfielder).
+    """
+
+    def __init__(self, df: pd.DataFrame, position_groupings: Dict[str, List[str]]):
+        codes, positions = pd.factorize(df['primary_position'])
+        self.rows = {
+            category: np.flatnonzero(np.isin(codes, np.flatnonzero(positions.isin(members))))
+            for category, members in position_groupings.items()
+        }
+
+    def refresh(self, old_df: pd.DataFrame, new_df: pd.DataFrame, diff) -> Optional["PositionRows"]:
+        """Carries the rows over if players and their positions are unchanged; otherwise they are rebuilt on next use."""
+        if diff.rows_aligned and 'primary_position' not in diff.changed_columns:
+            return self
+        return None
+
+
+def get_position_rows(df: pd.DataFrame, category: str, position_groupings: Dict[str, List[str]]) -> np.ndarray:
+    """Returns the row positions of a position category's players in a dataset, computed once per dataset."""
+    position_rows = get_dataset_artifact(df, "position_rows", lambda d: PositionRows(d, position_groupings))
+    return position_rows.rows.get(category, np.empty(0, dtype=np.int64))
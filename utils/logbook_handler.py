@@ -1,31 +1,214 @@
 import pandas as pd
 import streamlit as st
 from io import BytesIO, StringIO
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+from utils.data_handler import suggest_compact_dtype
+
+# A logbook template's first line declares the type of every column, e.g.
+# "#1stscout-schema date:date;sleep_hours:number;notes:text". It has no commas or quotes,
+# so it survives a round trip through a spreadsheet (which may only append empty cells).
+LOGBOOK_SCHEMA_PREFIX = '#1stscout-schema'
+# The creator wizard's data types and the logbook column type each one declares.
+LOGBOOK_COLUMN_TYPES = {'Number': 'number', 'Text': 'text', 'Date': 'date'}
+# Characters a metric name may not contain: they separate the schema line's items (';') or would
+# make the CSV quote or split it (',', '"').
+LOGBOOK_RESERVED_CHARACTERS = ';,"'
+
+
+def _column_name(metric_name: str) -> str:
+    return metric_name.strip().lower().replace(' ', '_')
+
+def build_logbook_schema(metrics: List[Dict[str, str]]) -> Dict[str, str]:
+    """
+    Returns the schema of a new logbook: its columns, in order, mapped to 'number', 'text' or 'date'.
+
+    Args:
+        metrics: The metrics defined in the creator wizard, each with a 'name' and a 'type'
+                 ('Number', 'Text' or 'Date'). A 'date' column is added first if missing.
+
+    Raises:
+        ValueError: If a metric name contains one of LOGBOOK_RESERVED_CHARACTERS.
+    """
+    for metric in metrics:
+        if any(character in metric['name'] for character in LOGBOOK_RESERVED_CHARACTERS):
+            raise ValueError(f"Metric name '{metric['name']}' may not contain any of: {' '.join(LOGBOOK_RESERVED_CHARACTERS)}")
+    schema = {_column_name(metric['name']): LOGBOOK_COLUMN_TYPES.get(metric.get('type'), 'text') for metric in metrics}
+    if 'date' not in schema:
+        schema = {'date': 'date', **schema}
+    return schema
+
+def format_schema_line(schema: Dict[str, str]) -> str:
+    """Returns the schema line that starts a logbook file."""
+    return f"{LOGBOOK_SCHEMA_PREFIX} " + ";".join(f"{column}:{column_type}" for column, column_type in schema.items())
+
+def read_schema_line(line: str) -> Optional[Dict[str, str]]:
+    """Returns the schema declared by a logbook's first line, or None if the line is not a valid schema line."""
+    line = line.strip().rstrip(',').strip('"')
+    if not line.startswith(LOGBOOK_SCHEMA_PREFIX):
+        return None
+    schema = {}
+    for item in line[len(LOGBOOK_SCHEMA_PREFIX):].strip().split(';'):
+        column, _, column_type = item.rpartition(':')
+        if not column or column_type not in LOGBOOK_COLUMN_TYPES.values():
+            return None
+        schema[column] = column_type
+    return schema or None
+
+def infer_logbook_schema(df: pd.DataFrame) -> Dict[str, str]:
+    """
+    Infers the schema of a logbook without a schema line from its parsed (or raw text) columns.
+
+    A 'date' or '*_date' column is a date. Other columns are typed from their values, so a column
+    without any value (e.g. every column of a header-only template) is left out of the schema;
+    it is typed once it holds values (see get_logbook_schema).
+    """
+    schema = {}
+    for column in df.columns:
+        values = df[column]
+        if column == 'date' or column.endswith('_date'):
+            schema[column] = 'date'
+        elif values.isna().all():
+            continue
+        elif pd.api.types.is_numeric_dtype(values) or pd.to_numeric(values, errors='coerce').notna().equals(values.notna()):
+            schema[column] = 'number'
+        else:
+            schema[column] = 'text'
+    return schema
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    # Templates and the agent write ISO dates; other formats (e.g. re-saved by a spreadsheet) take the slower path.
+    parsed = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    if (parsed.isna() & values.notna()).any():
+        parsed = pd.to_datetime(values, errors='coerce', format='mixed')
+    return parsed
+
+def apply_logbook_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    Converts a logbook's columns to their declared types, stored in the most compact dtype.
+
+    Numbers become the narrowest integer or float32 dtype holding them, dates are parsed once
+    into datetime64, and repetitive text becomes a category. It is applied on load and after
+    every appended entry, so the logbook never needs to be coerced again when it is queried.
+
+    Args:
+        df: The logbook, with columns in any dtype (e.g. all text, as read from the CSV).
+        schema: The logbook's schema. Columns missing from it are left unchanged.
+
+    Returns:
+        A new DataFrame with typed columns.
+    """
+    typed = {}
+    for column in df.columns:
+        column_type = schema.get(column)
+        values = df[column]
+        if column_type == 'number':
+            values = pd.to_numeric(values, errors='coerce')
+            typed[column] = values.astype(suggest_compact_dtype(values))
+        elif column_type == 'date':
+            typed[column] = _parse_dates(values)
+        elif column_type == 'text':
+            typed[column] = values.astype(suggest_compact_dtype(values))
+        else:
+            typed[column] = values
+    return pd.DataFrame(typed, index=df.index)
 
-# (The create_logbook_template function from Sprint 1 remains unchanged)
 def create_logbook_template(logbook_name: str, metrics: List[Dict[str, str]]) -> bytes:
     """
     Creates an empty pandas DataFrame based on user-defined metrics, adds a default
     'date' column, and converts the DataFrame to a CSV formatted byte stream for downloading.
+    The file starts with a schema line declaring each column's type, so the logbook is
+    loaded with explicit types instead of inferring them from text.
     """
-    column_names = [metric['name'].strip().lower().replace(' ', '_') for metric in metrics]
-    if 'date' not in column_names:
-        column_names.insert(0, 'date')
-    df = pd.DataFrame(columns=column_names)
+    schema = build_logbook_schema(metrics)
+    df = pd.DataFrame(columns=list(schema))
     output_buffer = BytesIO()
+    output_buffer.write((format_schema_line(schema) + "\n").encode('utf-8'))
     df.to_csv(output_buffer, index=False, encoding='utf-8')
     processed_data = output_buffer.getvalue()
     return processed_data
 
+def parse_logbook(file_name: str, raw_bytes: bytes) -> Tuple[str, pd.DataFrame, Dict[str, str]]:
+    """
+    Parses an uploaded CSV logbook. It has no Streamlit dependencies, so it can run off the script thread.
+
+    If the file starts with a schema line, the CSV parser is told each column's type (text
+    columns are not inspected, dates are parsed as ISO dates) and the columns are then stored
+    in compact dtypes; otherwise the types are inferred once and returned as the logbook's schema.
+
+    Args:
+        file_name: The uploaded file's name, e.g. "U19 Wellness Log.csv".
+        raw_bytes: The file's content.
+
+    Returns:
+        A tuple of (logbook key, typed DataFrame, schema). The key is the sanitized file name,
+        e.g. "U19 Wellness Log.csv" -> "u19_wellness_log".
+
+    Raises:
+        ValueError: If the file cannot be decoded or parsed as a CSV.
+    """
+    logbook_key = file_name.lower().replace('.csv', '').replace(' ', '_')
+    try:
+        text = raw_bytes.decode('utf-8-sig')
+        first_line, _, rest = text.partition('\n')
+        schema = read_schema_line(first_line)
+        if schema is not None:
+            date_columns = [c for c, t in schema.items() if t == 'date']
+            header = pd.read_csv(StringIO(rest), nrows=0).columns
+            df = pd.read_csv(
+                StringIO(rest),
+                dtype={c: str for c, t in schema.items() if t == 'text'},
+                parse_dates=[c for c in date_columns if c in header], date_format='ISO8601',
+                keep_default_na=False, na_values=[''],
+            )
+            # Columns added by hand after the template was made are inferred like an untyped logbook.
+            extra_columns = [c for c in df.columns if c not in schema]
+            if extra_columns:
+                inferred = infer_logbook_schema(df[extra_columns])
+                schema = {**{c: t for c, t in schema.items() if c in df.columns}, **inferred}
+            else:
+                schema = {c: t for c, t in schema.items() if c in df.columns}
+        else:
+            df = pd.read_csv(StringIO(text))
+            schema = infer_logbook_schema(df)
+        df = apply_logbook_schema(df, schema)
+    except Exception as e:
+        raise ValueError(f"Could not parse logbook '{file_name}': {e}")
+    print(f"DIAGNOSTIC: Loaded logbook '{logbook_key}' with columns: {df.columns.tolist()}")
+    return logbook_key, df, schema
+
+def register_logbook(logbook_key: str, df: pd.DataFrame, schema: Dict[str, str]) -> None:
+    """Stores a loaded logbook and its schema in the session state."""
+    st.session_state.setdefault('logbooks', {})[logbook_key] = df
+    st.session_state.setdefault('logbook_schemas', {})[logbook_key] = schema
+
+def get_logbook_schema(logbook_key: str, df: Optional[pd.DataFrame] = None) -> Dict[str, str]:
+    """
+    Returns the cached schema of a loaded logbook. A logbook stored without one is inferred
+    once and its schema cached; columns left untyped while they were empty are inferred (and
+    cached) once they hold values.
+
+    Args:
+        logbook_key: The logbook's key.
+        df: The logbook's current content, if it is newer than the stored one (e.g. with a new entry).
+    """
+    schemas = st.session_state.setdefault('logbook_schemas', {})
+    df = st.session_state['logbooks'][logbook_key] if df is None else df
+    schema = schemas.get(logbook_key)
+    untyped = [column for column in df.columns if schema is None or column not in schema]
+    if schema is None or untyped:
+        schema = schemas[logbook_key] = {**(schema or {}), **infer_logbook_schema(df[untyped])}
+    return schema
+
 # --- NEW FUNCTION 1: load_logbook ---
 def load_logbook(uploaded_file: Any) -> None:
     """
     Loads a user-uploaded CSV logbook into the session state.
 
-    This function takes a Streamlit UploadedFile object, reads it into a pandas
-    DataFrame, creates a sanitized, machine-readable key from the filename,
-    and stores the DataFrame in a dedicated dictionary within st.session_state.
+    This function takes a Streamlit UploadedFile object, parses it with parse_logbook
+    and stores the DataFrame and its schema in dedicated dictionaries within st.session_state.
 
     Args:
         uploaded_file: The file object from a Streamlit file_uploader widget.
@@ -33,20 +216,13 @@ def load_logbook(uploaded_file: Any) -> None:
     if uploaded_file is None:
         return
 
-    # Sanitize the filename to use as a dictionary key.
-    # e.g., "U19 Wellness Log.csv" -> "u19_wellness_log"
     file_name = uploaded_file.name
-    logbook_key = file_name.lower().replace('.csv', '').replace(' ', '_')
-
     try:
-        # Read the CSV data into a pandas DataFrame.
-        string_data = StringIO(uploaded_file.getvalue().decode('utf-8'))
-        df = pd.read_csv(string_data)
+        logbook_key, df, schema = parse_logbook(file_name, uploaded_file.getvalue())
 
-        # Store the loaded DataFrame in the session state dictionary.
-        st.session_state['logbooks'][logbook_key] = df
+        # Store the loaded DataFrame and its schema in the session state.
+        register_logbook(logbook_key, df, schema)
         st.success(f"Successfully loaded and integrated logbook: '{file_name}'")
-        print(f"DIAGNOSTIC: Loaded logbook '{logbook_key}' with columns: {df.columns.tolist()}")
 
     except Exception as e:
         st.error(f"Error loading logbook '{file_name}': {e}")
@@ -56,7 +232,8 @@ def load_logbook(uploaded_file: Any) -> None:
 def get_all_logbook_schemas() -> str:
     """
     Inspects all loaded logbooks in the session state and generates a
-    formatted string describing their schemas (name and columns).
+    formatted string describing their schemas (name, columns and column types),
+    read from the schemas cached when each logbook was loaded.
 
     This function is critical for dynamic prompt engineering. It provides the
     agent with the necessary "world knowledge" of what custom databases are
@@ -71,8 +248,9 @@ def get_all_logbook_schemas() -> str:
         return ""
 
     schema_descriptions = []
-    for logbook_name, df in st.session_state['logbooks'].items():
-        columns = ", ".join(df.columns.tolist())
+    for logbook_name in st.session_state['logbooks']:
+        schema = get_logbook_schema(logbook_name)
+        columns = ", ".join(f"{column} ({schema.get(column, 'empty')})" for column in st.session_state['logbooks'][logbook_name].columns)
         description = (
             f"<logbook>\n"
             f"  <name>{logbook_name}</name>\n"
@@ -0,0 +1,214 @@
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import (
+    SESSION_MEMORY_BUDGET_MB, PROCESS_MEMORY_BUDGET_MB, MEMORY_EVICTION_MODE, MEMORY_SPILL_DIR,
+    MEMORY_SESSION_IDLE_SECONDS, CHAT_RENDER_WINDOW
+)
+from utils.dataset_store import get_dataset_artifact, registered_datasets
+
+_MB = 1024 * 1024
+
+# Latest measured footprint of every live session in this process: {session_id: (bytes, last_seen)}.
+_LOCK = threading.Lock()
+_SESSION_USAGE: Dict[str, Tuple[int, float]] = {}
+
+
+# --- Measuring ---
+def _root_buffer(values: np.ndarray) -> np.ndarray:
+    """Returns the array that owns the memory of a (possibly nested) numpy view."""
+    while isinstance(values.base, np.ndarray):
+        values = values.base
+    return values
+
+
+def _frame_size(frame: Any, seen: set) -> int:
+    """
+    Returns the bytes held by a DataFrame or Series that have not been counted yet.
+
+    Numeric columns of frames derived with copy-on-write share their buffers with the frame they
+    came from, so buffers are counted once, by the array that owns them. Object and extension
+    columns are measured with pandas' deep memory usage.
+    """
+    frame = frame.to_frame() if isinstance(frame, pd.Series) else frame
+    size = int(frame.index.memory_usage(deep=True))
+    for _, column in frame.items():
+        if isinstance(column.dtype, np.dtype) and column.dtype != object:
+            root = _root_buffer(column.to_numpy(copy=False))
+            if id(root) not in seen:
+                seen.add(id(root))
+                size += root.nbytes
+        else:
+            size += int(column.memory_usage(deep=True, index=False))
+    return size
+
+
+def deep_size(obj: Any, seen: Optional[set] = None) -> int:
+    """
+    Returns the approximate deep size in bytes of a session-state value.
+
+    Containers and plain objects are walked recursively; objects (and numpy buffers) already in
+    `seen` are not counted again, so shared data is only charged once per measurement.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return _frame_size(obj, seen)
+    if isinstance(obj, np.ndarray):
+        # An array that owns its data includes it in getsizeof; a view is charged for its owner once.
+        root = _root_buffer(obj)
+        if root is obj or id(root) in seen:
+            return sys.getsizeof(obj)
+        seen.add(id(root))
+        return sys.getsizeof(obj) + root.nbytes
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, 'to_plotly_json'):
+        return sys.getsizeof(obj) + deep_size(obj.to_plotly_json(), seen)
+    if hasattr(obj, '__dict__'):
+        return sys.getsizeof(obj) + deep_size(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+
+def _dataset_footprint(df: pd.DataFrame) -> int:
+    """Returns the size of a shared dataset, measured once per dataset."""
+    return get_dataset_artifact(df, "memory_footprint", lambda d: _frame_size(d, set()))
+
+
+def measure_session(session_state: Any) -> Dict[str, int]:
+    """
+    Measures the deep size of every entry of a session's state.
+
+    The shared dataset ('full_df') is reported separately: it is held once per process by the
+    dataset store, whatever the number of sessions using it, and frames derived from it are only
+    charged for the buffers they do not share with it.
+
+    Returns:
+        A dictionary {key: bytes} of the session's own entries.
+    """
+    seen = set()
+    full_df = session_state.get("full_df") if hasattr(session_state, "get") else None
+    if isinstance(full_df, pd.DataFrame):
+        # Mark the shared buffers as counted without re-measuring the (large) dataset on every rerun.
+        seen.add(id(full_df))
+        seen.update(id(_root_buffer(column.to_numpy(copy=False))) for _, column in full_df.items()
+                    if isinstance(column.dtype, np.dtype) and column.dtype != object)
+    return {str(key): deep_size(session_state[key], seen) for key in list(session_state.keys()) if key != "full_df"}
+
+
+# --- Budgets ---
+def record_session_usage(session_id: str, used_bytes: int) -> Dict[str, float]:
+    """
+    Records a session's footprint and returns the process-wide picture.
+
+    Returns:
+        A dictionary with 'process_bytes' (all live sessions plus shared datasets),
+        'shared_bytes', 'active_sessions' and 'session_budget_bytes': the budget this session
+        must respect, i.e. the per-session budget, or its fair share of the per-process budget
+        if that is smaller.
+    """
+    now = time.time()
+    with _LOCK:
+        _SESSION_USAGE[session_id] = (used_bytes, now)
+        for sid, (_, last_seen) in list(_SESSION_USAGE.items()):
+            if now - last_seen > MEMORY_SESSION_IDLE_SECONDS:
+                del _SESSION_USAGE[sid]
+        sessions_bytes = sum(used for used, _ in _SESSION_USAGE.values())
+        active_sessions = len(_SESSION_USAGE)
+
+    shared_bytes = sum(_dataset_footprint(df) for df in registered_datasets())
+    fair_share = max(PROCESS_MEMORY_BUDGET_MB * _MB - shared_bytes, 0) / active_sessions
+    return {
+        "process_bytes": sessions_bytes + shared_bytes,
+        "shared_bytes": shared_bytes,
+        "active_sessions": active_sessions,
+        "session_budget_bytes": min(SESSION_MEMORY_BUDGET_MB * _MB, fair_share),
+    }
+
+
+# --- Eviction ---
+def _spill(obj: Any, session_id: str) -> str:
+    """Writes an evicted object to the session's spill directory and returns its path."""
+    spill_dir = os.path.join(MEMORY_SPILL_DIR, session_id)
+    os.makedirs(spill_dir, exist_ok=True)
+    path = os.path.join(spill_dir, f"{uuid.uuid4().hex}.pkl")
+    pd.to_pickle(obj, path)
+    return path
+
+
+def clear_spill(session_id: str) -> None:
+    """Deletes everything a session has spilled to disk (e.g. when its history is reset)."""
+    shutil.rmtree(os.path.join(MEMORY_SPILL_DIR, session_id), ignore_errors=True)
+
+
+def load_spilled(path: str) -> Optional[Any]:
+    """Reads back an object spilled to disk, or None if the spill file is gone."""
+    try:
+        return pd.read_pickle(path)
+    except (FileNotFoundError, OSError) as e:
+        print(f"DIAGNOSTIC: Spilled payload '{path}' could not be read: {e}")
+        return None
+
+
+def enforce_budget(session_state: Any, session_id: str, budget_bytes: float, sizes: Dict[str, int],
+                   mode: str = MEMORY_EVICTION_MODE) -> List[str]:
+    """
+    Evicts the oldest history from a session until it fits its budget.
+
+    Candidates are evicted oldest first: earlier result frames in 'raw_df_history' are dropped
+    (only the latest one is ever read, refinements work on it), then the tables and figures of
+    chat messages outside the render window (their text is always kept). In 'spill' mode those
+    are written to disk and can still be opened from the chat; in 'drop' mode they are discarded.
+
+    Args:
+        session_state: The session's state (st.session_state).
+        session_id: Identifies the session's spill directory.
+        budget_bytes: The number of bytes the session may hold.
+        sizes: The session's current entry sizes, as returned by measure_session.
+        mode: 'spill' or 'drop'.
+
+    Returns:
+        A description of every evicted item.
+    """
+    excess = sum(sizes.values()) - budget_bytes
+    evicted = []
+    if excess <= 0:
+        return evicted
+
+    history = session_state.get("raw_df_history") or []
+    while excess > 0 and len(history) > 1:
+        frame = history.pop(0)
+        excess -= deep_size(frame)
+        evicted.append(f"earlier result table ({len(frame)} rows)")
+
+    messages = session_state.get("messages") or []
+    for msg in messages[:max(0, len(messages) - CHAT_RENDER_WINDOW)]:
+        if excess <= 0:
+            break
+        payload = {k: msg.pop(k) for k in ("dataframe", "total_rows", "plotly_fig_json") if k in msg}
+        if not payload:
+            continue
+        excess -= deep_size(payload)
+        if mode == 'spill':
+            msg["spilled_payload"] = _spill(payload, session_id)
+        else:
+            msg["payload_evicted"] = True
+        evicted.append(f"chat attachment ('{msg['content'][:40]}'){' spilled to disk' if mode == 'spill' else ''}")
+
+    if evicted:
+        print(f"DIAGNOSTIC: Session over its memory budget; evicted {len(evicted)} item(s) ({mode}).")
+    return evicted
@@ -0,0 +1,130 @@
+import bisect
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+from utils.dataset_store import get_dataset_artifact
+
+# Columns the index is built from; a new dataset version that changes none of them reuses the index.
+INDEXED_COLUMNS = {'player_id', 'full_name', 'short_name'}
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(name: Any) -> str:
+    """
+    Returns the matching form of a player name: accents removed, case-folded, punctuation and
+    repeated whitespace collapsed. e.g. 'Kylian  Mbappé-Lottin' -> 'kylian mbappe lottin'.
+    """
+    if name is None or (isinstance(name, float) and np.isnan(name)):
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(name))
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", stripped.casefold()).strip()
+
+
+class PlayerIndex:
+    """
+    Per-dataset lookup tables for resolving player references in O(1) time.
+
+    Covers player_id, exact full_name, and normalized full_name and short_name (so 'mbappe',
+    'MBAPPÉ' and 'K. Mbappé' all resolve). A sorted list of normalized name keys, including
+    every surname suffix of a full name, backs prefix autocomplete with binary search.
+    Positions (not index labels) are stored so the index survives a dataset refresh that only
+    changes the labels.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.labels = df.index
+        self.by_id: Dict[str, int] = {}
+        self.by_full_name: Dict[str, int] = {}
+        self.by_normalized: Dict[str, List[int]] = {}
+        positions = np.arange(len(df))
+
+        if 'player_id' in df.columns:
+            ids = df['player_id'].astype(str).str.strip().to_numpy()
+            # Keep the first occurrence of every id/name, like a boolean scan followed by .iloc[0].
+            self.by_id = dict(zip(ids[::-1], positions[::-1]))
+        full_names = df['full_name'] if 'full_name' in df.columns else pd.Series(dtype=object)
+        self.by_full_name = dict(zip(full_names.astype(str).to_numpy()[::-1], positions[::-1]))
+
+        prefix_keys = []
+        for column in ('full_name', 'short_name'):
+            if column not in df.columns:
+                continue
+            for position, name in zip(positions, df[column].to_numpy()):
+                key = normalize_name(name)
+                if not key:
+                    continue
+                self.by_normalized.setdefault(key, []).append(position)
+                if column == 'full_name':
+                    # 'kylian mbappe lottin' is also found by typing 'mbappe' or 'lottin'.
+                    words = key.split(" ")
+                    prefix_keys += [(" ".join(words[i:]), position) for i in range(len(words))]
+                else:
+                    prefix_keys.append((key, position))
+        prefix_keys = sorted(set(prefix_keys))
+        self.prefix_keys = [key for key, _ in prefix_keys]
+        self.prefix_positions = [position for _, position in prefix_keys]
+        self.display_names = full_names.astype(str).to_numpy() if len(full_names) else np.array([], dtype=object)
+
+    def resolve(self, player_ref: Any) -> Optional[Any]:
+        """
+        Resolves a player reference to the row label of that player, or None if there is no match.
+
+        The reference may be a player_id, an exact or normalized full name, a short name, or an
+        unambiguous name prefix (e.g. 'mbapp').
+        """
+        ref = str(player_ref).strip()
+        position = self.by_id.get(ref) if ref.isdigit() else None
+        if position is None:
+            position = self.by_full_name.get(ref)
+        if position is None:
+            candidates = self.by_normalized.get(normalize_name(ref))
+            position = candidates[0] if candidates else None
+        if position is None:
+            matches = self._prefix_positions(normalize_name(ref))
+            position = matches[0] if len(matches) == 1 else None
+        return None if position is None else self.labels[position]
+
+    def _prefix_positions(self, prefix: str, limit: int = None) -> List[int]:
+        """Returns the distinct positions whose name keys start with `prefix`, in key order."""
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.prefix_keys, prefix)
+        end = bisect.bisect_left(self.prefix_keys, prefix + "\uffff")
+        positions = list(dict.fromkeys(self.prefix_positions[start:end]))
+        return positions[:limit] if limit else positions
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Returns up to `limit` full names matching a typed prefix of any part of a player's name."""
+        return [self.display_names[p] for p in self._prefix_positions(normalize_name(prefix), limit)]
+
+    def refresh(self, old_df: pd.DataFrame, new_df: pd.DataFrame, diff) -> Optional["PlayerIndex"]:
+        """Reuses the index for a new dataset version with the same rows and unchanged names and ids."""
+        if not diff.rows_aligned or diff.changed_columns & INDEXED_COLUMNS:
+            return None
+        refreshed = object.__new__(PlayerIndex)
+        refreshed.__dict__.update(self.__dict__)
+        refreshed.labels = new_df.index
+        return refreshed
+
+
+def get_player_index(df: pd.DataFrame) -> PlayerIndex:
+    """Returns the player lookup index of a dataset, built once per dataset."""
+    return get_dataset_artifact(df, "player_index", PlayerIndex)
+
+
+def resolve_player(df: pd.DataFrame, player_ref: Any) -> Any:
+    """
+    Returns the row label of a referenced player in a dataset.
+
+    Raises:
+        ValueError: If the reference matches no player.
+    """
+    row_label = get_player_index(df).resolve(player_ref)
+    if row_label is None:
+        raise ValueError(f"Could not find player '{player_ref}' in the dataset.")
+    return row_label
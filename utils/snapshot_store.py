@@ -0,0 +1,320 @@
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import SNAPSHOT_STORE_DIR, TREND_ROLLING_WINDOW
+
+# Trend columns are requested by name, e.g. 'delta_progressive_passes_p90' or 'rolling_avg_goals_p90'.
+TREND_PREFIXES = ('delta_', 'rolling_avg_')
+
+# Columns that identify a player rather than describe them; they are never versioned.
+_IDENTIFIER_COLUMNS = {'player_id', 'current_club_id'}
+
+
+def _changed_cells(current: pd.DataFrame, previous: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the long-format (player_id, metric, value) cells of a wide (player x metric) frame that
+    differ from the previous values; a value that became missing is stored as NaN.
+    """
+    values = current.to_numpy()
+    previous = previous.reindex(index=current.index, columns=current.columns).to_numpy()
+    changed = (values != previous) & ~(np.isnan(values) & np.isnan(previous))
+    rows, cols = np.nonzero(changed)
+    return pd.DataFrame({
+        'player_id': current.index.to_numpy()[rows],
+        'metric': np.asarray(current.columns, dtype=object)[cols],
+        'value': values[rows, cols],
+    })
+
+
+def _carry_forward(values: np.ndarray, stored: np.ndarray) -> np.ndarray:
+    """
+    Carries each row's last stored value forward (along axis 1) over the cells where nothing was stored.
+
+    Unlike ffill, a stored NaN ("the value became missing") is carried as NaN rather than filled over.
+    """
+    positions = np.where(stored, np.arange(values.shape[1]), -1)
+    np.maximum.accumulate(positions, axis=1, out=positions)
+    carried = np.take_along_axis(values, np.maximum(positions, 0), axis=1)
+    carried[positions < 0] = np.nan
+    return carried
+
+
+class SnapshotStore:
+    """
+    A local, versioned store of the snapshots of one data series (one per matchday/upload), keyed by player_id and date.
+
+    A series is one source of exports, e.g. one provider's weekly player file; unrelated uploads
+    belong to different series and never share a history (see get_snapshot_store).
+
+    Only numeric metric values are versioned. Each snapshot is persisted as a delta: the long-format
+    (player_id, metric, value) cells that differ from the player's value in the previous snapshot,
+    plus the lists of players and metrics present. Unchanged values are therefore stored once, however
+    many snapshots are taken. In memory, all deltas are kept as one long table sorted by player, which
+    makes per-player history a single index lookup and trend metrics a single vectorized pivot.
+    """
+
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self, store_dir: str, series: str = None):
+        self.store_dir = store_dir
+        self.series = series or os.path.basename(store_dir)
+        self._lock = threading.Lock()
+        self.snapshots: List[Dict] = []
+        self.presence: Dict[str, np.ndarray] = {}
+        self.metrics: Dict[str, Optional[List[str]]] = {}
+        self.cells = pd.DataFrame({'player_id': pd.Series(dtype='int64'), 'metric': pd.Series(dtype='object'),
+                                   'value': pd.Series(dtype='float64'), 'snapshot_date': pd.Series(dtype='object')})
+        # Trend columns by (name, store version); the version changes with every write.
+        self._version = 0
+        self._trend_cache: Dict[Tuple[str, int], pd.Series] = {}
+        self._load()
+
+    # --- Persistence ---
+    def _path(self, name: str) -> str:
+        return os.path.join(self.store_dir, name)
+
+    def _load(self) -> None:
+        manifest_path = self._path(self.MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return
+        try:
+            with open(manifest_path, 'r') as f:
+                self.snapshots = sorted(json.load(f), key=lambda s: s['snapshot_date'])
+            parts = []
+            for snapshot in self.snapshots:
+                payload = pd.read_pickle(self._path(snapshot['file']), compression='gzip')
+                self.presence[snapshot['snapshot_date']] = payload['player_ids']
+                self.metrics[snapshot['snapshot_date']] = payload.get('metrics')
+                parts.append(payload['cells'].assign(snapshot_date=snapshot['snapshot_date']))
+            if parts:
+                self._set_cells(pd.concat(parts, ignore_index=True))
+            print(f"DIAGNOSTIC: Loaded {len(self.snapshots)} snapshot(s) of series '{self.series}' from '{self.store_dir}'.")
+        except Exception as e:
+            print(f"ERROR: Could not load the snapshot store at '{self.store_dir}'. Starting empty. Details: {e}")
+            self.snapshots, self.presence, self.metrics = [], {}, {}
+
+    def _set_cells(self, cells: pd.DataFrame) -> None:
+        cells['metric'] = cells['metric'].astype('category')
+        self.cells = cells.sort_values(['player_id', 'metric', 'snapshot_date'], kind='stable').set_index('player_id', drop=False)
+
+    def _write_snapshot(self, entry: Dict, cells: pd.DataFrame) -> None:
+        entry['stored_cells'] = int(len(cells))
+        payload = {'cells': cells, 'player_ids': self.presence[entry['snapshot_date']], 'metrics': self.metrics[entry['snapshot_date']]}
+        pd.to_pickle(payload, self._path(entry['file']), compression='gzip')
+
+    def _write_manifest(self) -> None:
+        with open(self._path(self.MANIFEST_NAME), 'w') as f:
+            json.dump(self.snapshots, f, indent=2)
+
+    # --- Writing ---
+    def _values_as_of(self, snapshot_date: str, inclusive: bool) -> pd.DataFrame:
+        """Returns the last value stored up to a date (inclusive or not) of every (player, metric) as a wide frame."""
+        dates = self.cells['snapshot_date']
+        cells = self.cells[dates <= snapshot_date] if inclusive else self.cells[dates < snapshot_date]
+        if cells.empty:
+            return pd.DataFrame()
+        latest = cells.drop_duplicates(['player_id', 'metric'], keep='last')
+        latest = latest.pivot(index='player_id', columns='metric', values='value')
+        latest.columns = latest.columns.astype(object)
+        return latest
+
+    def _snapshot_values(self, entry: Dict) -> pd.DataFrame:
+        """Reconstructs the full (player x metric) values of a stored snapshot."""
+        snapshot_date = entry['snapshot_date']
+        values = self._values_as_of(snapshot_date, inclusive=True)
+        metrics = self.metrics.get(snapshot_date) or list(values.columns)
+        return values.reindex(index=self.presence[snapshot_date], columns=metrics).astype(np.float64)
+
+    def _replace_cells(self, snapshot_date: str, cells: pd.DataFrame) -> None:
+        kept = self.cells[self.cells['snapshot_date'] != snapshot_date].reset_index(drop=True)
+        self._set_cells(pd.concat([kept, cells.assign(snapshot_date=snapshot_date)], ignore_index=True))
+
+    def record_snapshot(self, df: pd.DataFrame, dataset_hash: str, snapshot_date: datetime.date = None,
+                        replace: bool = False) -> Optional[Dict]:
+        """
+        Stores a dataset as a snapshot of the series, persisting only the values that changed.
+
+        Snapshots may be recorded in any order: a back-dated upload is inserted at its date, and the
+        delta of the snapshot that follows it is re-derived.
+
+        Args:
+            df: The dataset to store. Must have a unique 'player_id' column.
+            dataset_hash: The content hash of the dataset; re-recording an identical dataset is a no-op.
+            snapshot_date: The date the snapshot represents (defaults to today).
+            replace: Confirms that a different dataset already stored for the same date is to be replaced.
+
+        Returns:
+            The manifest entry of the new snapshot, or None if nothing was recorded.
+
+        Raises:
+            ValueError: If the dataset has no unique player_id, or another dataset is stored for the
+                        date and `replace` is not set.
+        """
+        if 'player_id' not in df.columns or not df['player_id'].is_unique:
+            raise ValueError("Snapshots require a unique 'player_id' column.")
+        snapshot_date = (snapshot_date or datetime.date.today()).isoformat()
+
+        with self._lock:
+            if any(s['dataset_hash'] == dataset_hash for s in self.snapshots):
+                return None
+            existing = next((s for s in self.snapshots if s['snapshot_date'] == snapshot_date), None)
+            if existing is not None and not replace:
+                raise ValueError(f"a different export is already stored for {snapshot_date} in the '{self.series}' series. "
+                                 f"Tick 'Replace a snapshot of the same date' to overwrite it, or upload it under another series.")
+            following = next((s for s in self.snapshots if s['snapshot_date'] > snapshot_date), None)
+            # The following snapshot's values are reconstructed before its predecessor changes.
+            following_values = self._snapshot_values(following) if following is not None else None
+
+            metric_cols = [c for c in df.select_dtypes(include='number').columns if c not in _IDENTIFIER_COLUMNS]
+            current = df.set_index('player_id')[metric_cols].astype(np.float64)
+            cells = _changed_cells(current, self._values_as_of(snapshot_date, inclusive=False))
+
+            os.makedirs(self.store_dir, exist_ok=True)
+            if existing is not None:
+                self.snapshots.remove(existing)
+            entry = {
+                'snapshot_date': snapshot_date,
+                'dataset_hash': dataset_hash,
+                'file': f"snapshot_{snapshot_date}.pkl.gz",
+                'players': int(len(current)),
+            }
+            self.presence[snapshot_date] = current.index.to_numpy()
+            self.metrics[snapshot_date] = metric_cols
+            self._write_snapshot(entry, cells)
+            self.snapshots = sorted(self.snapshots + [entry], key=lambda s: s['snapshot_date'])
+            self._replace_cells(snapshot_date, cells)
+
+            if following is not None:
+                following_cells = _changed_cells(following_values, self._values_as_of(following['snapshot_date'], inclusive=False))
+                self._write_snapshot(following, following_cells)
+                self._replace_cells(following['snapshot_date'], following_cells)
+            self._write_manifest()
+            self._version += 1
+            self._trend_cache.clear()
+
+        action = "Replaced" if existing is not None else "Recorded"
+        print(f"DIAGNOSTIC: {action} snapshot {snapshot_date} of series '{self.series}': {entry['stored_cells']} changed value(s) stored "
+              f"out of {current.size} ({len(self.snapshots)} snapshot(s) in the series).")
+        return entry
+
+    # --- Reading ---
+    @property
+    def snapshot_dates(self) -> List[str]:
+        return [s['snapshot_date'] for s in self.snapshots]
+
+    def player_history(self, player_id, metrics: List[str] = None) -> pd.DataFrame:
+        """
+        Returns one player's full history as a (snapshot_date x metric) frame.
+
+        Args:
+            player_id: The player's identifier.
+            metrics: Optional subset of metrics to return.
+
+        Returns:
+            A DataFrame indexed by snapshot date (only dates the player was present), one column per metric.
+        """
+        if self.cells.empty or player_id not in self.cells.index:
+            return pd.DataFrame()
+        rows = self.cells.loc[[player_id]]
+        if metrics:
+            rows = rows[rows['metric'].isin(metrics)]
+        history = rows.pivot(index='snapshot_date', columns='metric', values='value').reindex(self.snapshot_dates)
+        stored = rows.assign(stored=1.0).pivot(index='snapshot_date', columns='metric', values='stored').reindex(self.snapshot_dates).notna()
+        history = pd.DataFrame(_carry_forward(history.to_numpy().T, stored.to_numpy().T).T, index=history.index, columns=history.columns)
+        present = [d for d in self.snapshot_dates if player_id in set(self.presence.get(d, []))]
+        return history.loc[present]
+
+    def metric_matrix(self, metric: str) -> pd.DataFrame:
+        """Returns the (player_id x snapshot_date) value matrix of one metric, carried forward and masked to presence."""
+        rows = self.cells[self.cells['metric'] == metric]
+        if rows.empty:
+            return pd.DataFrame(columns=self.snapshot_dates, dtype=np.float64)
+        dates = self.snapshot_dates
+        matrix = rows.pivot(index='player_id', columns='snapshot_date', values='value').reindex(columns=dates)
+        # Only cells without a stored value are carried forward; a stored NaN stays missing.
+        stored = rows.assign(stored=1.0).pivot(index='player_id', columns='snapshot_date', values='stored').reindex(columns=dates).notna()
+        matrix = pd.DataFrame(_carry_forward(matrix.to_numpy(), stored.to_numpy()), index=matrix.index, columns=dates)
+        presence = pd.DataFrame({d: matrix.index.isin(self.presence.get(d, [])) for d in dates}, index=matrix.index)
+        return matrix.where(presence)
+
+    def trend_column(self, column_name: str) -> pd.Series:
+        """
+        Computes a trend column for every player, indexed by player_id.
+
+        Supported names:
+            'delta_<metric>': the change between the player's earliest and latest stored value.
+            'rolling_avg_<metric>': the mean over the player's last TREND_ROLLING_WINDOW snapshots.
+
+        Trend columns are cached until the next snapshot is recorded; callers must not modify them.
+
+        Raises:
+            ValueError: If the name is not a trend column or the store has no history for the metric.
+        """
+        for prefix in TREND_PREFIXES:
+            if column_name.startswith(prefix):
+                metric = column_name[len(prefix):]
+                break
+        else:
+            raise ValueError(f"'{column_name}' is not a trend column. Trend columns start with {TREND_PREFIXES}.")
+
+        cache_key = (column_name, self._version)
+        cached = self._trend_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        matrix = self.metric_matrix(metric)
+        if matrix.empty:
+            raise ValueError(f"No stored history for '{metric}'. Upload at least two dataset snapshots to compute trends.")
+
+        values = matrix.to_numpy()
+        if prefix == 'delta_':
+            valid = ~np.isnan(values)
+            has_any = valid.any(axis=1)
+            first_idx = valid.argmax(axis=1)
+            last_idx = values.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+            rows = np.arange(len(values))
+            result = np.where(has_any, values[rows, last_idx] - values[rows, first_idx], np.nan)
+        else:
+            result = matrix.T.rolling(TREND_ROLLING_WINDOW, min_periods=1).mean().T.iloc[:, -1].to_numpy()
+        trend = pd.Series(result, index=matrix.index, name=column_name)
+        self._trend_cache[cache_key] = trend
+        return trend
+
+
+def default_series(file_name: str) -> str:
+    """
+    Returns the default series of an upload: its file name without the extension and the date or
+    number parts that change between exports, e.g. 'players_2025-03-01.csv' -> 'players'.
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    return re.sub(r'[\s_.-]*\d[\d\s_.-]*', ' ', stem).strip() or stem
+
+
+def _series_dir_name(series: str) -> str:
+    """A file-system safe, collision-free directory name for a series."""
+    slug = re.sub(r'[^a-z0-9]+', '_', series.lower()).strip('_')[:40] or "series"
+    return f"{slug}_{hashlib.sha1(series.encode('utf-8')).hexdigest()[:6]}"
+
+
+_STORES: Dict[str, SnapshotStore] = {}
+_STORE_LOCK = threading.Lock()
+
+
+def get_snapshot_store(series: str) -> SnapshotStore:
+    """Returns the process-wide snapshot store of a data series, loading it from disk on first use."""
+    with _STORE_LOCK:
+        store = _STORES.get(series)
+        if store is None:
+            store = _STORES[series] = SnapshotStore(os.path.join(SNAPSHOT_STORE_DIR, _series_dir_name(series)), series)
+        return store
+
+
+def is_trend_column(column_name: str) -> bool:
+    return isinstance(column_name, str) and column_name.startswith(TREND_PREFIXES)